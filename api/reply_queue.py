@@ -0,0 +1,117 @@
+# api/reply_queue.py
+"""
+Deferred replies for the WhatsApp webhook.
+
+The webhook acknowledges Twilio immediately and puts the question on a bounded
+queue; a small worker pool answers it with the RAG pipeline, opens a ticket when
+confidence is low, and sends the reply through a pluggable outbound sender.
+"""
+
+import os
+import time
+import queue
+import threading
+from typing import Callable, Dict, List, Optional
+
+from rag.metrics import WEBHOOK_QUEUE_DEPTH, WEBHOOK_JOBS, WEBHOOK_JOB_LATENCY
+
+
+class OutboundSender:
+    def send(self, to: str, body: str):
+        raise NotImplementedError
+
+
+class TwilioSender(OutboundSender):
+    """Sends WhatsApp messages via the Twilio REST API."""
+
+    def __init__(self, account_sid: str = None, auth_token: str = None, from_number: str = None):
+        from twilio.rest import Client
+        self.client = Client(account_sid or os.environ["TWILIO_ACCOUNT_SID"],
+                             auth_token or os.environ["TWILIO_AUTH_TOKEN"])
+        self.from_number = from_number or os.environ["TWILIO_WHATSAPP_FROM"]  # e.g. "whatsapp:+14155238886"
+
+    def send(self, to: str, body: str):
+        self.client.messages.create(from_=self.from_number, to=to, body=body)
+
+
+class RecordingSender(OutboundSender):
+    """Local stand-in: keeps sent messages in memory (and prints them) instead of calling Twilio."""
+
+    def __init__(self, echo: bool = True):
+        self.sent: List[Dict] = []
+        self.echo = echo
+        self._lock = threading.Lock()
+
+    def send(self, to: str, body: str):
+        with self._lock:
+            self.sent.append({"to": to, "body": body, "ts": time.time()})
+        if self.echo:
+            print(f"[outbound] to={to}: {body[:200]}")
+
+
+def sender_from_env() -> OutboundSender:
+    kind = os.getenv("OUTBOUND_SENDER", "twilio").lower()
+    return TwilioSender() if kind == "twilio" else RecordingSender()
+
+
+class ReplyQueue:
+    def __init__(self, handle: Callable[[Dict], str], sender: OutboundSender,
+                 workers: int = 4, maxsize: int = 200):
+        """
+        handle(job) -> reply text. job is {"to", "question", "enqueued_at", ...}.
+        submit() returns False when the queue is full so the caller can push back.
+        """
+        self.handle = handle
+        self.sender = sender
+        self._queue: "queue.Queue" = queue.Queue(maxsize=maxsize)
+        self._stopping = threading.Event()
+        WEBHOOK_QUEUE_DEPTH.set_function(self._queue.qsize)
+        self._threads = [threading.Thread(target=self._run, name=f"reply-worker-{i}", daemon=True)
+                         for i in range(workers)]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, to: str, question: str, **extra) -> bool:
+        job = dict(extra, to=to, question=question, enqueued_at=time.time())
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            WEBHOOK_JOBS.labels(outcome="rejected").inc()
+            return False
+        WEBHOOK_JOBS.labels(outcome="queued").inc()
+        return True
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                job = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                reply = self.handle(job)
+                self.sender.send(job["to"], reply)
+                WEBHOOK_JOBS.labels(outcome="sent").inc()
+            except Exception as e:
+                WEBHOOK_JOBS.labels(outcome="failed").inc()
+                print(f"⚠️ Deferred reply to {job.get('to')} failed: {e}")
+            finally:
+                WEBHOOK_JOB_LATENCY.observe(time.time() - job["enqueued_at"])
+                self._queue.task_done()
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued job has been processed. Returns False on timeout."""
+        deadline = None if timeout is None else time.time() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.time() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self, timeout: float = 10.0):
+        self.drain(timeout)
+        self._stopping.set()
+        for t in self._threads:
+            t.join(timeout=1.0)
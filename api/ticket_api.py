@@ -1,55 +1,203 @@
 # api/ticket_api.py
-from flask import Flask, request, jsonify
-import sqlite3, os
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from flask import Flask, request, jsonify, g
+import sqlite3, threading, queue
+from contextlib import contextmanager
 from datetime import datetime
+from rag.metrics import init_metrics
+from rag.tracing import instrument_flask, span
 
 DB = os.environ.get("TICKET_DB", "tickets.db")
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_BATCH_SIZE = 5000
+DB_POOL_SIZE = int(os.environ.get("TICKET_DB_POOL_SIZE", 8))
+DB_POOL_TIMEOUT = float(os.environ.get("TICKET_DB_POOL_TIMEOUT", 5))  # seconds to wait for a free connection
+
+class ConnectionPool:
+    """
+    At most `size` sqlite connections, opened on demand and reused across requests.
+    A request borrows one (get_conn) and returns it on teardown, whichever thread
+    serves it, so a threaded server doesn't open a connection per request.
+    """
+
+    def __init__(self, db, size=DB_POOL_SIZE):
+        self.db = db
+        self.size = size
+        self.opened = 0
+        self._idle = queue.LifoQueue()  # most recently used first: its pages are warm
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # borrowed by different request threads, one at a time
+        conn = sqlite3.connect(self.db, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    def acquire(self, timeout=DB_POOL_TIMEOUT):
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"no free ticket DB connection after {timeout}s")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                return self._connect()
+            except Exception:
+                self._slots.release()
+                raise
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()  # a failed request must not leave its transaction open for the next one
+        self._idle.put(conn)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+pool = ConnectionPool(DB)
+
+def get_conn():
+    """The connection borrowed by the current request (returned in _release_conn)."""
+    if "ticket_conn" not in g:
+        g.ticket_conn = pool.acquire()
+    return g.ticket_conn
 
 def init_db():
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS tickets (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        ts TEXT,
-        user TEXT,
-        channel TEXT,
-        question TEXT,
-        status TEXT,
-        metadata TEXT
-    )
-    """)
-    conn.commit(); conn.close()
-
-app = Flask(__name__)
+    with pool.connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS tickets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts TEXT,
+            user TEXT,
+            channel TEXT,
+            question TEXT,
+            status TEXT,
+            metadata TEXT
+        )
+        """)
+        # (column, id) indexes serve "filter + ORDER BY id DESC" keyset pages without sorting
+        c.execute("CREATE INDEX IF NOT EXISTS idx_tickets_status ON tickets (status, id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_tickets_channel ON tickets (channel, id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_tickets_user ON tickets (user, id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_tickets_ts ON tickets (ts)")
+        conn.commit()
+
+app = instrument_flask(Flask(__name__))
 init_db()
+init_metrics()
+
+@app.teardown_appcontext
+def _release_conn(exc=None):
+    conn = g.pop("ticket_conn", None)
+    if conn is not None:
+        pool.release(conn)
+
+@app.errorhandler(TimeoutError)
+def _pool_exhausted(e):
+    return jsonify({"error": "server busy, try again"}), 503
+
+def _ticket_row(data, ts):
+    return (ts, data.get("user", "unknown"), data.get("channel", "web"), data.get("question", ""),
+            "open", str(data.get("metadata", "")))
+
+INSERT_SQL = "INSERT INTO tickets (ts,user,channel,question,status,metadata) VALUES (?,?,?,?,?,?)"
 
 @app.route("/ticket", methods=["POST"])
 def create_ticket():
     data = request.json or {}
-    user = data.get("user", "unknown")
-    channel = data.get("channel", "web")
-    question = data.get("question", "")
-    metadata = data.get("metadata", "")
     ts = datetime.utcnow().isoformat()
-    conn = sqlite3.connect(DB)
+    conn = get_conn()
     c = conn.cursor()
-    c.execute("INSERT INTO tickets (ts,user,channel,question,status,metadata) VALUES (?,?,?,?,?,?)",
-              (ts, user, channel, question, "open", str(metadata)))
-    conn.commit()
+    with span("ticket"):
+        c.execute(INSERT_SQL, _ticket_row(data, ts))
+        conn.commit()
     ticket_id = c.lastrowid
-    conn.close()
     return jsonify({"ticket_id": ticket_id}), 201
 
+@app.route("/tickets/batch", methods=["POST"])
+def create_tickets_batch():
+    """Body: a JSON list of ticket objects (or {"tickets": [...]}); inserted in one transaction."""
+    data = request.json or []
+    if isinstance(data, dict):
+        data = data.get("tickets", [])
+    if not isinstance(data, list) or not data:
+        return jsonify({"error": "expected a non-empty list of tickets"}), 400
+    if len(data) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"at most {MAX_BATCH_SIZE} tickets per batch"}), 400
+    bad = next((i for i, item in enumerate(data) if not isinstance(item, dict)), None)
+    if bad is not None:
+        return jsonify({"error": f"ticket {bad} is not an object"}), 400
+    ts = datetime.utcnow().isoformat()
+    conn = get_conn()
+    c = conn.cursor()
+    ids = []
+    with span("ticket"), conn:  # single commit for the whole batch
+        for item in data:
+            c.execute(INSERT_SQL, _ticket_row(item, ts))
+            ids.append(c.lastrowid)
+    return jsonify({"ticket_ids": ids}), 201
+
 @app.route("/tickets", methods=["GET"])
 def list_tickets():
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("SELECT id, ts, user, channel, question, status FROM tickets ORDER BY id DESC")
-    rows = c.fetchall()
-    conn.close()
+    """
+    Newest-first keyset pagination.
+    Query params: limit, before_id (cursor), status, channel, user, since / until (ISO ts).
+    The cursor for the next page is returned in the X-Next-Before-Id header (absent on the last page).
+    """
+    try:
+        limit = min(max(int(request.args.get("limit", DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        raw_before = request.args.get("before_id")  # not get(type=int): that turns "abc" into None (first page)
+        before_id = int(raw_before) if raw_before is not None else None
+    except ValueError:
+        return jsonify({"error": "limit and before_id must be integers"}), 400
+
+    where, params = [], []
+    if before_id is not None:
+        where.append("id < ?"); params.append(before_id)
+    for col in ("status", "channel", "user"):
+        val = request.args.get(col)
+        if val:
+            where.append(f"{col} = ?"); params.append(val)
+    if request.args.get("since"):
+        where.append("ts >= ?"); params.append(request.args["since"])
+    if request.args.get("until"):
+        where.append("ts < ?"); params.append(request.args["until"])
+
+    sql = "SELECT id, ts, user, channel, question, status FROM tickets"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY id DESC LIMIT ?"
+    params.append(limit + 1)  # one extra row tells us whether there is a next page
+
+    with span("ticket_query"):
+        rows = get_conn().execute(sql, params).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
     data = [{"id": r[0], "ts": r[1], "user": r[2], "channel": r[3], "question": r[4], "status": r[5]} for r in rows]
-    return jsonify(data)
+    resp = jsonify(data)
+    if has_more:
+        resp.headers["X-Next-Before-Id"] = str(rows[-1][0])
+    return resp
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5001)))
+    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5001)), threaded=True)
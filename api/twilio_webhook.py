@@ -1,37 +1,101 @@
 # api/twilio_webhook.py
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
 from flask import Flask, request, Response
 from twilio.twiml.messaging_response import MessagingResponse
-import sqlite3, json, os
+import sqlite3, json, threading
 from datetime import datetime
-from rag.qa_pinecone import answer_query
+from rag import config
+from rag.pipeline import get_pipeline, start_warmup
+from api.reply_queue import ReplyQueue, sender_from_env
+from rag.metrics import init_metrics
+from rag.tracing import instrument_flask, trace, span, current_request_id
 
 DB = os.environ.get("TICKET_DB", "tickets.db")
-app = Flask(__name__)
+# "sync": answer inside the request (original behaviour)
+# "async": ack immediately, answer on a worker pool and send the reply via OUTBOUND_SENDER
+WEBHOOK_MODE = os.environ.get("WEBHOOK_MODE", "sync").lower()
+ACK_MESSAGE = os.environ.get("WEBHOOK_ACK_MESSAGE", "")  # optional "looking that up…" reply in async mode
+BUSY_MESSAGE = "We're receiving a lot of messages right now — please try again in a minute."
+app = instrument_flask(Flask(__name__))
+init_metrics()
+
+_warmup_lock = threading.Lock()
+_warmup_thread = None
+
+def ensure_warmup():
+    """Start the background warm-up once (WARMUP=true); importing this module has no side effects on models."""
+    global _warmup_thread
+    if not config.WARMUP or _warmup_thread is not None:
+        return
+    with _warmup_lock:
+        if _warmup_thread is None:
+            # models load in the background; the server accepts requests right away
+            _warmup_thread = start_warmup()
+
+@app.before_request
+def _warmup_on_first_request():
+    # WSGI servers import `app` without running __main__; the first request starts the warm-up there
+    ensure_warmup()
 
 def create_ticket_in_db(user, channel, question, metadata=None):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    ts = datetime.utcnow().isoformat()
-    c.execute("INSERT INTO tickets (ts, user, channel, question, status, metadata) VALUES (?, ?, ?, ?, ?, ?)",
-              (ts, user, channel, question, "open", json.dumps(metadata or [])))
-    conn.commit()
-    ticket_id = c.lastrowid
-    conn.close()
+    with span("ticket"):
+        conn = sqlite3.connect(DB)
+        c = conn.cursor()
+        ts = datetime.utcnow().isoformat()
+        c.execute("INSERT INTO tickets (ts, user, channel, question, status, metadata) VALUES (?, ?, ?, ?, ?, ?)",
+                  (ts, user, channel, question, "open", json.dumps(metadata or [])))
+        conn.commit()
+        ticket_id = c.lastrowid
+        conn.close()
     return ticket_id
 
-@app.route("/twilio_whatsapp", methods=["POST"])
-def twilio_whatsapp():
-    incoming_msg = request.values.get('Body', '').strip()
-    from_number = request.values.get('From', '')
-    res = answer_query(incoming_msg, top_k=4)
+def answer_message(question: str, from_number: str) -> str:
+    """Run the RAG pipeline and open a ticket when the answer is not confident."""
+    # backend/reader selected by RETRIEVER_BACKEND / READER (see rag/config.py)
+    res = get_pipeline().answer(question, top_k=4)
     answer = res.get("answer", "I don't know — please contact support.")
     score = res.get("score", 0.0)
     # create ticket if low confidence or explicit fallback
     if score < 0.2 or "i don't know" in answer.lower():
-        create_ticket_in_db(user=from_number, channel="whatsapp", question=incoming_msg, metadata=res.get("sources"))
+        create_ticket_in_db(user=from_number, channel="whatsapp", question=question, metadata=res.get("sources"))
+    return answer
+
+def _answer_job(job) -> str:
+    # deferred replies keep the request id of the webhook call that queued them
+    with trace("whatsapp_reply", request_id=job.get("request_id")):
+        return answer_message(job["question"], job["to"])
+
+reply_queue = None
+if WEBHOOK_MODE == "async":
+    reply_queue = ReplyQueue(
+        handle=lambda job: _answer_job(job),
+        sender=sender_from_env(),
+        workers=int(os.environ.get("WEBHOOK_WORKERS", 4)),
+        maxsize=int(os.environ.get("WEBHOOK_QUEUE_SIZE", 200)),
+    )
+
+@app.route("/twilio_whatsapp", methods=["POST"])
+def twilio_whatsapp():
+    incoming_msg = request.values.get('Body', '').strip()
+    from_number = request.values.get('From', '')
     resp = MessagingResponse()
-    resp.message(answer)
+    if reply_queue is not None:
+        # deferred: the answer is sent later through the outbound sender
+        if not reply_queue.submit(from_number, incoming_msg, request_id=current_request_id()):
+            resp.message(BUSY_MESSAGE)
+        elif ACK_MESSAGE:
+            resp.message(ACK_MESSAGE)
+        return Response(str(resp), mimetype="application/xml")
+
+    resp.message(answer_message(incoming_msg, from_number))
     return Response(str(resp), mimetype="application/xml")
 
+@app.route("/queue", methods=["GET"])
+def queue_status():
+    return {"mode": WEBHOOK_MODE, "depth": reply_queue.depth() if reply_queue is not None else 0}
+
 if __name__ == "__main__":
+    ensure_warmup()
     app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
@@ -8,12 +8,21 @@ def load_txt(path: str) -> str:
 def load_documents(folder: str = "docs") -> str:
     """Load all .txt files and join into one context string."""
     docs = []
-    for fname in os.listdir(folder):
+    for fname in sorted(os.listdir(folder)):
         if fname.lower().endswith(".txt"):
             path = os.path.join(folder, fname)
             docs.append(load_txt(path))
     return "\n".join(docs)
 
+def docs_signature(folder: str = "docs") -> tuple:
+    """(name, mtime, size) of every .txt file; changes whenever load_documents() would return something new."""
+    sig = []
+    for fname in sorted(os.listdir(folder)):
+        if fname.lower().endswith(".txt"):
+            st = os.stat(os.path.join(folder, fname))
+            sig.append((fname, st.st_mtime_ns, st.st_size))
+    return tuple(sig)
+
 if __name__ == "__main__":
     context = load_documents("docs")
     print("Loaded context:")
@@ -1,20 +1,200 @@
 # qa_chain.py
-from transformers import pipeline
-from data_prep import load_documents
+"""
+Legacy (non-RAG) QA over the whole docs/ folder with deepset/roberta-base-squad2.
+
+QAEngine loads the model once, tokenizes the docs/ context once (again only when
+a file in docs/ changes) into overlapping windows, and answers questions by
+scoring (question, window) pairs in batches - the context is never re-tokenized
+per question. When the corpus grows past QA_CHAIN_MAX_CONTEXT_TOKENS, only the
+QA_CHAIN_TOP_WINDOWS windows most similar to the question are read.
+"""
+
+import os
+import threading
+from typing import Dict, List, Optional
+
+from data_prep import load_documents, docs_signature
+from rag.model_registry import get_pipeline, get_embedder, get_or_load
+
+QA_MODEL_NAME = "deepset/roberta-base-squad2"
+QA_CHAIN_MAX_SEQ_LEN = int(os.getenv("QA_CHAIN_MAX_SEQ_LEN", 384))
+QA_CHAIN_MAX_QUESTION_TOKENS = int(os.getenv("QA_CHAIN_MAX_QUESTION_TOKENS", 64))
+QA_CHAIN_DOC_STRIDE = int(os.getenv("QA_CHAIN_DOC_STRIDE", 128))
+QA_CHAIN_MAX_ANSWER_TOKENS = int(os.getenv("QA_CHAIN_MAX_ANSWER_TOKENS", 30))
+QA_CHAIN_BATCH_SIZE = int(os.getenv("QA_CHAIN_BATCH_SIZE", 16))
+# above this many context tokens, read only the windows closest to the question
+QA_CHAIN_MAX_CONTEXT_TOKENS = int(os.getenv("QA_CHAIN_MAX_CONTEXT_TOKENS", 4096))
+QA_CHAIN_TOP_WINDOWS = int(os.getenv("QA_CHAIN_TOP_WINDOWS", 4))
+EMBED_MODEL_NAME = os.getenv("EMBED_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
 
 def make_qa_pipeline():
-    # Hugging Face free model
-    qa_pipeline = pipeline("question-answering", model="deepset/roberta-base-squad2")
-    return qa_pipeline
+    # Hugging Face free model, loaded once per process via the shared registry
+    return get_pipeline("question-answering", QA_MODEL_NAME)
 
 def ask_question(question: str, context: str):
     qa = make_qa_pipeline()
     result = qa(question=question, context=context)
     return result["answer"]
 
+
+class QAEngine:
+    def __init__(self, docs_dir: str = "docs", model_name: str = QA_MODEL_NAME,
+                 max_context_tokens: int = QA_CHAIN_MAX_CONTEXT_TOKENS, top_windows: int = QA_CHAIN_TOP_WINDOWS):
+        self.docs_dir = docs_dir
+        self.model_name = model_name
+        self.max_context_tokens = max_context_tokens
+        self.top_windows = top_windows
+        self._lock = threading.Lock()
+        self._signature = None
+        self.context = ""
+        self.windows: List[Dict] = []  # {"ids": [...], "offsets": [(start, end), ...], "text": str}
+        self.n_tokens = 0
+        self._window_vectors = None
+
+    @property
+    def pipeline(self):
+        return get_pipeline("question-answering", self.model_name)
+
+    @property
+    def narrowed(self) -> bool:
+        """True when the corpus is too large to read in full and retrieval picks the windows."""
+        return self.n_tokens > self.max_context_tokens
+
+    def refresh(self, force: bool = False) -> bool:
+        """Re-load and re-tokenize docs/ if any file changed. Returns True when the context was rebuilt."""
+        sig = docs_signature(self.docs_dir)
+        if not force and sig == self._signature:
+            return False
+        with self._lock:
+            if not force and sig == self._signature:
+                return False
+            context = load_documents(self.docs_dir)
+            tok = self.pipeline.tokenizer
+            enc = tok(context, add_special_tokens=False, return_offsets_mapping=True)
+            ids, offsets = enc["input_ids"], enc["offset_mapping"]
+            size = QA_CHAIN_MAX_SEQ_LEN - QA_CHAIN_MAX_QUESTION_TOKENS - 4  # room for the special tokens
+            step = max(size - QA_CHAIN_DOC_STRIDE, 1)
+            windows = []
+            for start in range(0, max(len(ids), 1), step):
+                w_ids, w_off = ids[start:start + size], offsets[start:start + size]
+                if w_ids:
+                    windows.append({"ids": w_ids, "offsets": w_off, "text": context[w_off[0][0]:w_off[-1][1]]})
+                if start + size >= len(ids):
+                    break
+            self.context, self.windows, self.n_tokens = context, windows, len(ids)
+            self._window_vectors = None
+            self._signature = sig
+        print(f"[qa_chain] context: {len(ids)} tokens in {len(windows)} windows"
+              + (" (retrieval-narrowed)" if len(ids) > self.max_context_tokens else ""))
+        return True
+
+    def _snapshot(self):
+        """(context, windows, n_tokens, window vectors) of one refresh, read together under the lock."""
+        with self._lock:
+            return self.context, self.windows, self.n_tokens, self._window_vectors
+
+    def _vectors_for(self, windows: List[Dict], embedder):
+        """Window embeddings for this windows list, computed once and kept if no refresh replaced it."""
+        vectors = embedder.encode([w["text"] for w in windows], convert_to_numpy=True, normalize_embeddings=True)
+        with self._lock:
+            if self.windows is windows:
+                if self._window_vectors is None:
+                    self._window_vectors = vectors
+                return self._window_vectors
+        return vectors
+
+    def _candidate_windows(self, questions: List[str], windows: List[Dict], n_tokens: int,
+                           vectors=None) -> List[List[int]]:
+        """Window indices to read per question: all of them, or the closest few for a large corpus."""
+        if n_tokens <= self.max_context_tokens:
+            return [list(range(len(windows)))] * len(questions)
+        k = min(self.top_windows, len(windows))
+        try:
+            import numpy as np
+            embedder = get_embedder(EMBED_MODEL_NAME)
+            if vectors is None:
+                vectors = self._vectors_for(windows, embedder)
+            q = embedder.encode(questions, convert_to_numpy=True, normalize_embeddings=True)
+            sims = q @ vectors.T
+            return [list(np.argsort(-row)[:k]) for row in sims]
+        except Exception as e:
+            # no embedder available: rank windows by word overlap with the question
+            print(f"⚠️ Embedding retrieval unavailable ({e}); narrowing context by word overlap.")
+            out = []
+            for q in questions:
+                words = set(q.lower().split())
+                scores = [len(words & set(w["text"].lower().split())) for w in windows]
+                out.append(sorted(range(len(scores)), key=lambda i: -scores[i])[:k])
+            return out
+
+    def ask_many(self, questions: List[str]) -> List[Dict]:
+        """Answer several questions in batched forward passes. Each result: {"answer", "score"}."""
+        import torch
+        self.refresh()
+        # one consistent view: a concurrent refresh swaps these, it never mutates them
+        context, windows, n_tokens, vectors = self._snapshot()
+        qa = self.pipeline
+        tok, model = qa.tokenizer, qa.model
+        candidates = self._candidate_windows(questions, windows, n_tokens, vectors)
+        best: List[Optional[Dict]] = [None] * len(questions)
+
+        pairs = []  # (question index, window, input ids, first context position, token type ids)
+        use_types = "token_type_ids" in tok.model_input_names
+        for qi, question in enumerate(questions):
+            q_ids = tok(question, add_special_tokens=False)["input_ids"][:QA_CHAIN_MAX_QUESTION_TOKENS]
+            for wi in candidates[qi]:
+                w = windows[wi]
+                input_ids = tok.build_inputs_with_special_tokens(q_ids, w["ids"])
+                types = tok.create_token_type_ids_from_sequences(q_ids, w["ids"]) if use_types else None
+                pairs.append((qi, w, input_ids, len(input_ids) - len(w["ids"]) - 1, types))
+
+        for b in range(0, len(pairs), QA_CHAIN_BATCH_SIZE):
+            batch = pairs[b:b + QA_CHAIN_BATCH_SIZE]
+            width = max(len(p[2]) for p in batch)
+            input_ids = torch.tensor([p[2] + [tok.pad_token_id] * (width - len(p[2])) for p in batch])
+            attention_mask = torch.tensor([[1] * len(p[2]) + [0] * (width - len(p[2])) for p in batch])
+            extra = {}
+            if use_types:
+                extra["token_type_ids"] = torch.tensor([p[4] + [0] * (width - len(p[4])) for p in batch])
+            with torch.no_grad():
+                out = model(input_ids=input_ids, attention_mask=attention_mask, **extra)
+            for row, (qi, w, _, ctx_start, _) in enumerate(batch):
+                span = self._best_span(out.start_logits[row], out.end_logits[row], ctx_start, len(w["ids"]))
+                if span is None:
+                    continue
+                s, e, score = span
+                if best[qi] is None or score > best[qi]["score"]:
+                    best[qi] = {"answer": context[w["offsets"][s][0]:w["offsets"][e][1]], "score": score}
+        return [b if b is not None else {"answer": "", "score": 0.0} for b in best]
+
+    def ask(self, question: str) -> Dict:
+        return self.ask_many([question])[0]
+
+    @staticmethod
+    def _best_span(start_logits, end_logits, ctx_start: int, ctx_len: int, n_best: int = 20):
+        """Best (start, end, probability) within the context tokens, like the HF pipeline's decoding."""
+        import torch
+        s_p = torch.softmax(start_logits[ctx_start:ctx_start + ctx_len], dim=-1)
+        e_p = torch.softmax(end_logits[ctx_start:ctx_start + ctx_len], dim=-1)
+        best = None
+        for s in torch.topk(s_p, min(n_best, ctx_len)).indices.tolist():
+            for e in torch.topk(e_p, min(n_best, ctx_len)).indices.tolist():
+                if e < s or e - s + 1 > QA_CHAIN_MAX_ANSWER_TOKENS:
+                    continue
+                score = float(s_p[s] * e_p[e])
+                if best is None or score > best[2]:
+                    best = (s, e, score)
+        return best
+
+
+def get_engine(docs_dir: str = "docs") -> QAEngine:
+    """Process-wide engine per docs folder (shared by Streamlit sessions)."""
+    return get_or_load(f"qa_engine:{os.path.abspath(docs_dir)}", lambda: QAEngine(docs_dir))
+
+
 if __name__ == "__main__":
-    context = load_documents("docs")
-    q = "What is your return policy?"
-    ans = ask_question(q, context)
-    print("Q:", q)
-    print("A:", ans)
+    engine = get_engine("docs")
+    qs = ["What is your return policy?", "How can I contact support?"]
+    for q, res in zip(qs, engine.ask_many(qs)):
+        print("Q:", q)
+        print("A:", res["answer"], f"({res['score']:.2f})")
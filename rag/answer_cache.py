@@ -0,0 +1,149 @@
+# rag/answer_cache.py
+"""
+End-to-end answer cache.
+
+Keys combine the normalized query, top_k, the summarize flag and the current
+index version, so rebuilding the index invalidates every cached answer.
+Tier 1 is an in-memory LRU (rag.cache.LRUCache); tier 2 is an optional SQLite
+table that survives restarts and can be shared by several processes.
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Callable, Dict, Optional
+
+from rag.cache import LRUCache
+
+_WS_RE = re.compile(r"\s+")
+_EDGE_PUNCT = " \t\n?!.,;:'\"¿¡"
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and strip surrounding punctuation."""
+    return _WS_RE.sub(" ", query.lower()).strip(_EDGE_PUNCT)
+
+
+class FileVersion:
+    """
+    Index version read from a manifest/stamp file written by the index builders.
+    Uses the file's "fingerprint" field (falling back to its mtime) and re-checks
+    the file at most every `check_interval` seconds.
+    """
+    def __init__(self, path: str, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._checked_at = 0.0
+        self._mtime = None
+        self._version = "none"
+
+    def __call__(self) -> str:
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return self._version
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            self._mtime, self._version = None, "none"
+            return self._version
+        if mtime != self._mtime:
+            self._mtime = mtime
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._version = json.load(f).get("fingerprint") or f"mtime:{mtime}"
+            except Exception:
+                self._version = f"mtime:{mtime}"
+        return self._version
+
+
+class AnswerCache:
+    def __init__(self, version_fn: Callable[[], str] = lambda: "none", max_entries: int = 2048,
+                 ttl: Optional[float] = None, sqlite_path: str = ""):
+        self.version_fn = version_fn
+        self.ttl = ttl
+        self.memory = LRUCache(max_entries=max_entries, ttl=ttl)
+        self._version = None
+        self._db = None
+        self._db_lock = threading.Lock()
+        if sqlite_path:
+            os.makedirs(os.path.dirname(os.path.abspath(sqlite_path)), exist_ok=True)
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+            CREATE TABLE IF NOT EXISTS answer_cache (
+                key TEXT PRIMARY KEY,
+                version TEXT,
+                value TEXT,
+                ts REAL
+            )
+            """)
+            self._db.commit()
+
+    def _current_version(self) -> str:
+        version = self.version_fn()
+        if version != self._version:
+            # index rebuilt (or first use): drop answers computed against the old index
+            self.memory.clear()
+            if self._db is not None:
+                with self._db_lock:
+                    self._db.execute("DELETE FROM answer_cache WHERE version != ?", (version,))
+                    self._db.commit()
+            self._version = version
+        return version
+
+    @staticmethod
+    def make_key(query: str, top_k: int, summarize: bool, version: str, variant: str = "") -> str:
+        return f"{version}|{variant}|{top_k}|{int(bool(summarize))}|{normalize_query(query)}"
+
+    def get(self, query: str, top_k: int, summarize: bool = False, variant: str = "") -> Optional[Dict]:
+        """`variant` separates entries of different pipelines (retriever/reader) sharing one cache."""
+        key = self.make_key(query, top_k, summarize, self._current_version(), variant)
+        value = self.memory.get(key)
+        if value is not None or self._db is None:
+            return value
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        with self._db_lock:
+            row = self._db.execute("SELECT value, ts FROM answer_cache WHERE key = ?", (digest,)).fetchone()
+        if row is None or (self.ttl is not None and time.time() - row[1] > self.ttl):
+            return None
+        value = json.loads(row[0])
+        self.memory.set(key, value, stored_at=row[1])
+        return value
+
+    def set(self, query: str, top_k: int, summarize: bool, value: Dict, variant: str = ""):
+        version = self._current_version()
+        key = self.make_key(query, top_k, summarize, version, variant)
+        self.memory.set(key, value)
+        if self._db is not None:
+            digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+            with self._db_lock:
+                self._db.execute("INSERT OR REPLACE INTO answer_cache (key, version, value, ts) VALUES (?, ?, ?, ?)",
+                                 (digest, version, json.dumps(value), time.time()))
+                self._db.commit()
+
+    def clear(self):
+        self.memory.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM answer_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict:
+        return dict(self.memory.stats(), version=self._version, sqlite=self._db is not None)
+
+
+def from_env(version_fn: Callable[[], str], prefix: str = "ANSWER_CACHE") -> Optional[AnswerCache]:
+    """Build an AnswerCache from <prefix>_ENABLED / _MAX_ENTRIES / _TTL / _DB env vars (None if disabled)."""
+    if os.getenv(f"{prefix}_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    return AnswerCache(
+        version_fn=version_fn,
+        max_entries=int(os.getenv(f"{prefix}_MAX_ENTRIES", 2048)),
+        ttl=float(os.getenv(f"{prefix}_TTL", 0)) or None,
+        sqlite_path=os.getenv(f"{prefix}_DB", ""),
+    )
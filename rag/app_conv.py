@@ -4,7 +4,10 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import streamlit as st
 import time
-from rag.qa_pinecone import answer_retrieval_only
+from rag.pipeline import get_pipeline, start_warmup
+from rag import config
+from rag import model_registry
+from rag.metrics import init_metrics
 
 st.set_page_config(page_title="FAQ Bot (retrieval)", layout="centered")
 st.title("🤖 FAQ Bot — Retrieval + Summarizer (fast)")
@@ -15,6 +18,17 @@ with st.sidebar:
     top_k = st.slider("Top-K retrieval", 1, 8, 4)
     summarize = st.checkbox("Use FLAN-T5 summarizer (optional)", value=True)
     st.write("Note: summarizer improves fluency but adds a small CPU cost.")
+    with st.expander("Loaded models"):
+        for key, info in model_registry.stats().items():
+            st.write(f"- `{key}`: {info['load_seconds']:.1f}s, +{info['rss_delta_bytes'] / 1e6:.0f} MB")
+
+BACKEND = config.RETRIEVER_BACKEND  # same default as the other entry points (see rag/config.py)
+
+init_metrics()  # /metrics on METRICS_PORT (scraped by prometheus.yaml); once per process across reruns
+
+# load the retriever/embedder/summarizer in the background while the page renders
+if config.WARMUP and "warmup" not in st.session_state:
+    st.session_state.warmup = start_warmup(BACKEND, "summarize" if summarize else "retrieval")
 
 # conversation history
 if "history" not in st.session_state:
@@ -43,23 +57,36 @@ if prompt:
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    # call retrieval pipeline
+    # call retrieval pipeline (backend from RETRIEVER_BACKEND)
     start = time.time()
-    res = answer_retrieval_only(prompt, top_k=top_k, summarize=summarize)
-    latency = time.time() - start
+    pipeline = get_pipeline(BACKEND, "summarize" if summarize else "retrieval")
 
-    # show answer
-    answer_text = res.get("answer", "Sorry — no answer.")
+    # stream the answer: sources as soon as retrieval is done, then the text as it is generated
+    res, streamed = {}, ""
     with st.chat_message("assistant"):
-        st.markdown(answer_text)
-        if res.get("sources"):
-            with st.expander("Sources used"):
-                for s in res["sources"]:
-                    st.write(f"- **{s.get('source')}** (chunk {s.get('chunk_index')})")
+        sources_box = st.container()
+        answer_box = st.empty()
+        for event in pipeline.answer_stream(prompt, top_k=top_k):
+            if event["type"] == "sources" and event["sources"]:
+                with sources_box.expander("Sources used"):
+                    for s in event["sources"]:
+                        st.write(f"- **{s.get('source')}** (chunk {s.get('chunk_index')})")
+            elif event["type"] == "token":
+                streamed += event["text"]
+                answer_box.markdown(streamed + "▌")
+            elif event["type"] == "done":
+                res = event
+        answer_text = res.get("answer") or streamed or "Sorry — no answer."
+        answer_box.markdown(answer_text)
+    latency = time.time() - start
     # store assistant message
     st.session_state.history.append({"role": "assistant", "text": answer_text, "sources": res.get("sources", [])})
 
     # quick debug info
-    st.sidebar.write(f"Last query latency: {latency:.2f}s")
+    st.sidebar.write(f"Last query latency: {latency:.2f}s (request {res.get('request_id')})")
+    if "ttft" in res.get("timings", {}):
+        st.sidebar.write(f"Time to first token: {res['timings']['ttft'] * 1000:.0f} ms"
+                         + (f", {res['tokens_per_second']:.1f} tokens/s" if res.get("tokens_per_second") else ""))
+    st.sidebar.write({stage: f"{sec * 1000:.1f} ms" for stage, sec in res.get("timings", {}).items()})
 
     
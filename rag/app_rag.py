@@ -1,18 +1,25 @@
 # rag/app_rag.py
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
 import streamlit as st
-from logger_db import init_db, log_conversation
-from utils_redact import redact_text
+from rag.logger_db import init_db, log_conversation
+from rag.utils_redact import redact_text
+from rag import model_registry
+from rag.metrics import init_metrics
+from rag.tracing import trace, span, exporter
 
 st.set_page_config(page_title="FAQ Bot (RAG)", page_icon="🤖")
 st.title("FAQ Bot — Multilingual RAG (PoC)")
 
 # Initialize logging DB
 init_db()
+init_metrics()
 
 # Initialize RAG once
 if "rag" not in st.session_state:
     try:
-        from qa_rag import FAQ_RAG
+        from rag.qa_rag import FAQ_RAG
         st.session_state.rag = FAQ_RAG()
         st.success("✅ RAG initialized successfully!")
     except Exception as e:
@@ -24,11 +31,10 @@ if "rag" not in st.session_state:
         )
         st.stop()
 
-# Display Chroma collection info
+# Display index info
 try:
-    coll = st.session_state.rag.collection
-    vectors = coll.get()
-    st.info(f"Collection '{coll.name}' loaded with {len(vectors['ids'])} vector(s).")
+    retriever = st.session_state.rag.retriever
+    st.info(f"Index ({retriever.name}) loaded with {retriever.count()} vector(s).")
 except Exception as e:
     st.warning(f"Could not fetch collection info: {e}")
 
@@ -37,26 +43,46 @@ top_k = st.sidebar.slider("Top-K retrieval", min_value=1, max_value=8, value=4)
 user_id = st.text_input("User ID (demo):", value="demo_user")
 channel = st.selectbox("Channel:", ["web", "whatsapp", "email"])
 
+# Shared model registry info (models are loaded once per process)
+with st.sidebar.expander("Loaded models"):
+    for key, info in model_registry.stats().items():
+        st.write(f"- `{key}`: {info['load_seconds']:.1f}s, +{info['rss_delta_bytes'] / 1e6:.0f} MB")
+    st.write(f"Process RSS: {model_registry.process_rss_bytes() / 1e6:.0f} MB")
+
 # Query input
 query = st.text_input("Ask a question:")
 
 if st.button("Ask") and query.strip():
-    # Redact query (optional)
-    redacted_q = redact_text(query)
-    
-    # Get RAG answer
-    res = st.session_state.rag.answer(query, top_k=top_k)
+    with trace("app_rag", channel=channel) as tr:
+        # Redact query (optional)
+        with span("redact"):
+            redacted_q = redact_text(query)
+
+        # Get RAG answer
+        res = st.session_state.rag.answer(query, top_k=top_k)
+
+        # Log conversation (optional)
+        log_conversation(channel, user_id, redacted_q, res["answer"], res["score"], res["sources"], escalated=0)
     
     # Display results
     st.markdown("### Answer")
     st.write(res["answer"])
     
     st.markdown("**Confidence:**")
-    st.write(f"{res['score']:.3f}")
+    st.write(f"{res['score']:.3f}" + (f" (direct FAQ match: \"{res['matched_question']}\")" if res.get("direct") else ""))
     
     st.markdown("**Sources used:**")
     for s in res["sources"]:
         st.write(f"- `{s['source']}` (chunk {s['chunk_index']})")
-    
-    # Log conversation (optional)
-    log_conversation(channel, user_id, redacted_q, res["answer"], res["score"], res["sources"], escalated=0)
+
+    with st.expander("Stage timings"):
+        st.write(f"Request `{tr.request_id}`")
+        st.write({stage: f"{sec * 1000:.1f} ms" for stage, sec in tr.breakdown().items()})
+
+with st.sidebar.expander("Stage latency (this process)"):
+    for stage, s in exporter.snapshot().items():
+        st.write(f"- {stage}: p50 {s['p50_ms']:.1f} ms, p95 {s['p95_ms']:.1f} ms (n={s['count']})")
+    faq = st.session_state.rag.pipeline.faq_stats()
+    if faq:
+        st.write(f"Direct FAQ answers: {faq['hits']}/{faq['checks']} ({faq['hit_rate']:.0%}) "
+                 f"over {faq['questions']} indexed questions")
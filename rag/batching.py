@@ -0,0 +1,113 @@
+# rag/batching.py
+"""
+Request coalescing for model calls.
+
+Concurrent callers (Streamlit sessions, webhook threads) each submit a single
+item; a worker thread collects items for up to `max_wait_ms` or until
+`max_batch_size` is reached, runs one batched call, and resolves each caller's
+future with its own result. If the batched call raises, the items are retried one
+by one, so only the callers whose own item fails get the exception. Queue depth
+and batch sizes are exported as metrics.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+
+from rag import config
+from rag.metrics import BATCH_SIZE, BATCH_WAIT, BATCH_QUEUE_DEPTH as QUEUE_DEPTH
+from rag.model_registry import get_or_load
+
+
+class MicroBatcher:
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]], name: str,
+                 max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        """batch_fn takes a list of items and must return a list of results in the same order."""
+        self.batch_fn = batch_fn
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._batch_sizes: List[int] = []
+        QUEUE_DEPTH.labels(batcher=name).set_function(self._queue.qsize)
+        self._thread = threading.Thread(target=self._run, name=f"microbatch-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, item) -> Future:
+        fut: Future = Future()
+        self._queue.put((item, fut, time.perf_counter()))
+        return fut
+
+    def __call__(self, item, timeout: Optional[float] = None):
+        return self.submit(item).result(timeout)
+
+    def map(self, items: List[Any], timeout: Optional[float] = None) -> List[Any]:
+        """Submit several items at once (they may be split across or merged with other batches)."""
+        futures = [self.submit(i) for i in items]
+        return [f.result(timeout) for f in futures]
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def batch_size_histogram(self) -> dict:
+        """{batch_size: count} over the recent batches (last 10k)."""
+        hist = {}
+        for n in self._batch_sizes:
+            hist[n] = hist.get(n, 0) + 1
+        return dict(sorted(hist.items()))
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._execute(batch)
+
+    def _execute(self, batch):
+        now = time.perf_counter()
+        for _, _, enqueued in batch:
+            BATCH_WAIT.labels(batcher=self.name).observe(now - enqueued)
+        BATCH_SIZE.labels(batcher=self.name).observe(len(batch))
+        self._batch_sizes.append(len(batch))
+        if len(self._batch_sizes) > 10000:
+            del self._batch_sizes[:5000]
+        try:
+            results = self._call([item for item, _, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            # one bad item (e.g. an input the model rejects) must not fail every caller it was
+            # batched with: retry item by item so only the failing callers see the error
+            print(f"⚠️ {self.name}: batch of {len(batch)} failed ({e}); retrying items one by one.")
+            for item, fut, _ in batch:
+                try:
+                    fut.set_result(self._call([item])[0])
+                except Exception as item_error:
+                    fut.set_exception(item_error)
+            return
+        for (_, fut, _), res in zip(batch, results):
+            fut.set_result(res)
+
+    def _call(self, items: List[Any]) -> List[Any]:
+        results = self.batch_fn(items)
+        if len(results) != len(items):
+            raise RuntimeError(f"{self.name}: batch_fn returned {len(results)} results for {len(items)} items")
+        return results
+
+
+def get_batcher(name: str, batch_fn: Callable[[List[Any]], List[Any]]) -> Optional[MicroBatcher]:
+    """Process-wide batcher for `name` configured from rag.config (None when MICROBATCH_ENABLED=false)."""
+    if not config.MICROBATCH_ENABLED:
+        return None
+    return get_or_load(f"batcher:{name}", lambda: MicroBatcher(
+        batch_fn, name, max_batch_size=config.MICROBATCH_MAX_SIZE, max_wait_ms=config.MICROBATCH_MAX_WAIT_MS))
@@ -0,0 +1,137 @@
+# rag/bm25_index.py
+"""
+BM25 inverted index over the same chunks as the local vector index.
+
+Built by build_embeddings.py next to the local index and stored as
+  <name>.bm25.postings.npy  int32 row of every posting, grouped by term
+  <name>.bm25.weights.npy   float32 BM25 weight of every posting (idf and length norm folded in)
+  <name>.bm25.json          vocabulary {term: [start, end]} into the arrays, plus each row's chunk
+                            id / source / chunk_index (no text: HybridRetriever takes it from the
+                            dense backend, so the corpus isn't stored twice)
+The arrays are memory-mapped at load, so a query only touches the postings of its
+own terms: score = sum of the precomputed weights, no per-query idf/tf maths.
+Exact tokens (order numbers, product names, policy codes) match here even when
+the dense embedding doesn't rank them.
+"""
+
+import os
+import re
+import json
+import hashlib
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+BM25_K1 = float(os.getenv("BM25_K1", 1.2))
+BM25_B = float(os.getenv("BM25_B", 0.75))
+
+# words, numbers and codes like "ORD-12345" / "v2.1"; compounds are also indexed by their parts
+_TOKEN_RE = re.compile(r"\w+(?:[-/.]\w+)*")
+_PART_RE = re.compile(r"[-/.]")
+
+
+def tokenize(text: str) -> List[str]:
+    out = []
+    for m in _TOKEN_RE.finditer(text.lower()):
+        tok = m.group(0)
+        out.append(tok)
+        if _PART_RE.search(tok):
+            out.extend(p for p in _PART_RE.split(tok) if p)
+    return out
+
+
+def bm25_paths(index_dir: str, name: str):
+    return (os.path.join(index_dir, f"{name}.bm25.postings.npy"),
+            os.path.join(index_dir, f"{name}.bm25.weights.npy"),
+            os.path.join(index_dir, f"{name}.bm25.json"))
+
+
+class BM25Index:
+    def __init__(self, postings: np.ndarray, weights: np.ndarray, vocab: Dict[str, List[int]],
+                 docs: List[Dict], fingerprint: str = ""):
+        self.postings = postings
+        self.weights = weights
+        self.vocab = vocab
+        self.docs = docs  # row -> {"id", "source", "chunk_index"}
+        self.fingerprint = fingerprint
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    # --- build / persist ---
+
+    @classmethod
+    def build(cls, chunks: Iterable[Dict], k1: float = BM25_K1, b: float = BM25_B) -> "BM25Index":
+        """chunks: dicts with "id" and "text" (source / chunk_index are kept for results, the text is not)."""
+        docs, term_rows = [], {}
+        lengths = []
+        h = hashlib.sha256(f"{k1}:{b}".encode("utf-8"))
+        for row, c in enumerate(chunks):
+            text = c.get("text", "")
+            docs.append({"id": c["id"], "source": c.get("source", c["id"]), "chunk_index": c.get("chunk_index", 0)})
+            h.update(f"\n{c['id']}\n{text}".encode("utf-8"))
+            tf = Counter(tokenize(text))
+            lengths.append(sum(tf.values()))
+            for term, n in tf.items():
+                term_rows.setdefault(term, []).append((row, n))
+
+        n_docs = len(docs)
+        avgdl = (sum(lengths) / n_docs) if n_docs else 0.0
+        norm = np.array([k1 * (1 - b + b * dl / avgdl) if avgdl else k1 for dl in lengths], dtype=np.float64)
+        vocab, postings, weights = {}, [], []
+        for term in sorted(term_rows):
+            rows = term_rows[term]
+            idf = np.log(1 + (n_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+            vocab[term] = [len(postings), len(postings) + len(rows)]
+            for row, tf in rows:
+                postings.append(row)
+                weights.append(idf * tf * (k1 + 1) / (tf + norm[row]))
+
+        return cls(np.asarray(postings, dtype=np.int32), np.asarray(weights, dtype=np.float32), vocab, docs,
+                   fingerprint=h.hexdigest())
+
+    def save(self, index_dir: str, name: str):
+        os.makedirs(index_dir, exist_ok=True)
+        post_path, weight_path, meta_path = bm25_paths(index_dir, name)
+        # temp files + rename, like LocalIndex.save, so readers never see a half-written index
+        np.save(post_path + ".tmp.npy", np.ascontiguousarray(self.postings))
+        np.save(weight_path + ".tmp.npy", np.ascontiguousarray(self.weights))
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": self.fingerprint, "vocab": self.vocab, "docs": self.docs}, f)
+        os.replace(post_path + ".tmp.npy", post_path)
+        os.replace(weight_path + ".tmp.npy", weight_path)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    @classmethod
+    def load(cls, index_dir: str, name: str, mmap: bool = True) -> "BM25Index":
+        post_path, weight_path, meta_path = bm25_paths(index_dir, name)
+        if not all(os.path.exists(p) for p in (post_path, weight_path, meta_path)):
+            raise FileNotFoundError(f"BM25 index '{name}' not found in {index_dir}. Run build_embeddings.py first.")
+        mode = "r" if mmap else None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(np.load(post_path, mmap_mode=mode), np.load(weight_path, mmap_mode=mode), meta["vocab"],
+                   meta["docs"], fingerprint=meta.get("fingerprint", ""))
+
+    # --- lookup ---
+
+    def scores(self, text: str) -> np.ndarray:
+        out = np.zeros(len(self.docs), dtype=np.float32)
+        for term in set(tokenize(text)):
+            span = self.vocab.get(term)
+            if span is not None:
+                # a term lists each row once, so fancy-index += is safe
+                out[self.postings[span[0]:span[1]]] += self.weights[span[0]:span[1]]
+        return out
+
+    def search(self, text: str, top_k: int = 20) -> List[Tuple[int, float]]:
+        """(row, score) for rows sharing at least one term with text, best first."""
+        scores = self.scores(text)
+        hit = np.flatnonzero(scores)
+        if not len(hit):
+            return []
+        k = min(top_k, len(hit))
+        top = hit[np.argpartition(-scores[hit], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(int(r), float(scores[r])) for r in top]
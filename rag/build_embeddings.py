@@ -1,53 +1,323 @@
 # rag/build_embeddings.py
 import os
+import json
+import time
+import hashlib
+import argparse
+from itertools import islice
 import chromadb
-from chromadb.errors import NotFoundError
 from sentence_transformers import SentenceTransformer
-from data_prep_rag import create_chunks_from_docs
+from data_prep_rag import (INGEST_WORKERS, iter_chunks_from_docs, iter_doc_files, file_signature,
+                           format_ingest_stats, qa_entries)
+from local_index import LocalIndex, index_paths
+from bm25_index import BM25Index
 
 EMBED_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
 PERSIST_DIR = "chromadb_store"
 COLLECTION_NAME = "faq_collection"
+LOCAL_INDEX_DIR = "local_index"
+DOCS_DIR = "docs"
+UPSERT_BATCH_SIZE = 1000  # stay well below Chroma's max batch size
+ENCODE_BATCH_SIZE = 256   # chunks encoded + upserted per step of the ingestion stream
+# cosine distance, so ChromaRetriever's 1 - distance is the cosine similarity the reader thresholds assume
+CHROMA_METADATA = {"hnsw:space": "cosine"}
 
-def build_chroma_collection(collection_name: str = COLLECTION_NAME, persist_dir: str = PERSIST_DIR):
-    print("Initializing Chroma PersistentClient at", persist_dir)
-    client = chromadb.PersistentClient(path=persist_dir)
-
-    # If the collection exists, delete and recreate (clean state for PoC)
-    try:
-        existing = client.get_collection(name=collection_name)
-        print(f"Collection '{collection_name}' already exists. Deleting and recreating for clean PoC.")
-        client.delete_collection(collection_name)
-    except Exception:
-        # Not found -> we'll create one below
-        pass
-
-    collection = client.create_collection(name=collection_name)
-    print("Loading chunks from docs/ ...")
-    chunks = create_chunks_from_docs("docs")
-    if not chunks:
-        raise ValueError("No document chunks found in docs/. Add some text/pdf files and try again.")
-
-    texts = [c["text"] for c in chunks]
-    metadatas = [{"source": c["source"], "chunk_index": c["chunk_index"], "id": c["id"]} for c in chunks]
-    ids = [c["id"] for c in chunks]
-
-    print(f"Encoding {len(texts)} chunks with {EMBED_MODEL_NAME} (this may take a minute)...")
-    encoder = SentenceTransformer(EMBED_MODEL_NAME)
-    embeddings = encoder.encode(texts, show_progress_bar=True, convert_to_numpy=True)
-    emb_list = [e.tolist() for e in embeddings]
-
-    print("Adding vectors to Chroma collection...")
-    collection.add(ids=ids, documents=texts, metadatas=metadatas, embeddings=emb_list)
-
-    # try to persist (some clients support persist)
-    try:
-        client.persist()
-    except Exception:
-        pass
-
-    print(f"Done. Added {len(ids)} vectors to collection '{collection_name}' (persist_dir={persist_dir})")
+def chunk_hash(text: str, model_name: str = EMBED_MODEL_NAME) -> str:
+    """Content hash of a chunk; changes when either the text or the embedding model changes."""
+    return hashlib.sha256(f"{model_name}\n{text}".encode("utf-8")).hexdigest()
+
+def manifest_path(collection_name: str = COLLECTION_NAME, persist_dir: str = PERSIST_DIR) -> str:
+    return os.path.join(persist_dir, f"{collection_name}.manifest.json")
+
+def load_manifest(path: str) -> dict:
+    """Manifest format: {"model": ..., "fingerprint": ..., "chunks": {chunk_id: {"hash": ..., "source": ...}},
+    "files": {source: {"mtime": ..., "size": ...}}}"""
+    if not os.path.exists(path):
+        return {"model": EMBED_MODEL_NAME, "chunks": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(path: str, manifest: dict):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+def _batches(items, size):
+    """Fixed-size batches from any iterable (lists or streaming generators)."""
+    it = iter(items)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+def qa_index_name(collection_name: str = COLLECTION_NAME) -> str:
+    """Name of the question index (one row per FAQ question/paraphrase) stored next to the chunk index."""
+    return f"{collection_name}_qa"
+
+def unchanged_sources(files: dict, manifest: dict = None, old_local: LocalIndex = None) -> set:
+    """
+    Sources whose mtime/size match what every enabled store recorded at the last build.
+    manifest / old_local are None when that store is disabled; a store that is enabled
+    but has no record of a file forces it to be re-read.
+    """
+    stores = []
+    if manifest is not None:
+        stores.append(manifest.get("files", {}))
+    if old_local is not None:
+        stores.append({m["source"]: m.get("signature") for m in old_local.metadata})
+    if not stores:
+        return set()
+    return {src for src, sig in files.items() if all(known.get(src) == sig for known in stores)}
+
+def build_chroma_collection(collection_name: str = COLLECTION_NAME, persist_dir: str = PERSIST_DIR,
+                            incremental: bool = True, local_index_dir: str = LOCAL_INDEX_DIR,
+                            local_dtype: str = "float32", chroma: bool = True, docs_dir: str = DOCS_DIR,
+                            workers: int = INGEST_WORKERS):
+    """
+    Build or update the Chroma collection (and the local mmap index) from docs/.
+
+    In incremental mode (default) files whose mtime/size are unchanged since the
+    last build are not re-read, only chunks whose content hash is not in the
+    manifest are encoded and upserted, and chunks that no longer exist in docs/
+    are deleted. With incremental=False the collection is dropped and rebuilt.
+    Chunks are streamed from the ingestion pool and encoded/upserted in batches
+    of ENCODE_BATCH_SIZE, so the Chroma path only holds the current batch.
+    The local index (rag/local_index.py) is rewritten from the same chunks,
+    reusing stored vectors for unchanged chunks. It is written as a whole at the
+    end, so with it on (the default) every chunk's vector and metadata (text
+    included) stay in memory until then; pass local_index_dir=None (--no-local)
+    for a build whose memory doesn't grow with the corpus.
+    Alongside it, Q/A-formatted documents get a question index (qa_index_name):
+    every question and paraphrase is its own vector with the answer in its metadata,
+    which the query side uses to answer near-identical questions directly, and a
+    BM25 inverted index (rag/bm25_index.py) over the chunk texts for hybrid retrieval.
+    """
+    t0 = time.time()
+    mpath = manifest_path(collection_name, persist_dir)
+    collection = None
+    manifest = None
+    indexed = {}
+    if chroma:
+        print("Initializing Chroma PersistentClient at", persist_dir)
+        client = chromadb.PersistentClient(path=persist_dir)
+
+        if not incremental:
+            try:
+                client.delete_collection(collection_name)
+                print(f"Collection '{collection_name}' deleted for a full rebuild.")
+            except Exception:
+                # Not found -> we'll create one below
+                pass
+            manifest = {"model": EMBED_MODEL_NAME, "chunks": {}}
+        else:
+            manifest = load_manifest(mpath)
+
+        collection = client.get_or_create_collection(name=collection_name, metadata=CHROMA_METADATA)
+        if (collection.metadata or {}).get("hnsw:space") != CHROMA_METADATA["hnsw:space"]:
+            # built before cosine distance: its scores don't fit the reader thresholds, and the
+            # space of an existing collection can't be changed, so rebuild it
+            print(f"Collection '{collection_name}' uses L2 distance; rebuilding it with cosine distance.")
+            client.delete_collection(collection_name)
+            collection = client.create_collection(name=collection_name, metadata=CHROMA_METADATA)
+            manifest = {"model": EMBED_MODEL_NAME, "chunks": {}}
+        indexed = manifest.get("chunks", {})
+        if incremental and not indexed and collection.count() > 0:
+            # Collection built before manifests existed: treat everything as stale
+            print("No manifest found for existing collection; re-indexing all chunks.")
+            indexed = {i: {"hash": None} for i in collection.get(include=[])["ids"]}
+
+    old_local = old_qa = None
+    if local_index_dir and incremental:
+        try:
+            old_local = LocalIndex.load(local_index_dir, collection_name, mmap=False)
+        except FileNotFoundError:
+            pass
+        try:
+            old_qa = LocalIndex.load(local_index_dir, qa_index_name(collection_name), mmap=False)
+        except FileNotFoundError:
+            pass
+
+    files = {src: file_signature(os.path.join(docs_dir, src)) for src in iter_doc_files(docs_dir)}
+    skipped = set()
+    if incremental and (chroma or local_index_dir):
+        if not local_index_dir or old_local is not None:
+            skipped = unchanged_sources(files, manifest if chroma else None, old_local)
+    to_read = [src for src in files if src not in skipped]
+    print(f"Loading chunks from {docs_dir}/: {len(to_read)} new/changed files, {len(skipped)} unchanged ...")
+
+    # chunks of unchanged files are carried over as-is
+    current = {i: e for i, e in indexed.items() if e.get("source") in skipped}
+    local_rows, local_meta = [], []
+    if local_index_dir and old_local is not None:
+        for row, m in enumerate(old_local.metadata):
+            if m["source"] in skipped:
+                local_rows.append(old_local.vectors[row])
+                local_meta.append(m)
+    carried = len(local_rows)
+    qa_rows, qa_meta, qa_new = [], [], []
+    if old_qa is not None:
+        for row, m in enumerate(old_qa.metadata):
+            if m["source"] in skipped:
+                qa_rows.append(old_qa.vectors[row])
+                qa_meta.append(m)
+
+    encoder = None
+
+    def get_encoder():
+        nonlocal encoder
+        if encoder is None:
+            print(f"Encoding new/changed chunks with {EMBED_MODEL_NAME} (this may take a minute)...")
+            encoder = SentenceTransformer(EMBED_MODEL_NAME)
+        return encoder
+
+    added = updated = encoded = reused = 0
+    ingest_stats = {}
+    on_document = (lambda doc: qa_new.extend(qa_entries(doc))) if local_index_dir else None
+    stream = iter_chunks_from_docs(docs_dir, sources=to_read, workers=workers, stats=ingest_stats,
+                                   on_document=on_document)
+    for batch in _batches(stream, ENCODE_BATCH_SIZE):
+        changed = []
+        for c in batch:
+            c["hash"] = chunk_hash(c["text"])
+            current[c["id"]] = {"hash": c["hash"], "source": c["source"]}
+            if chroma and indexed.get(c["id"], {}).get("hash") != c["hash"]:
+                changed.append(c)
+        changed_ids = {c["id"] for c in changed}
+
+        # vectors we can reuse from the previous local index (same id and same content hash)
+        reusable = {}
+        if old_local is not None:
+            for c in batch:
+                row = old_local.row_of(c["id"])
+                if row is not None and old_local.metadata[row].get("hash") == c["hash"]:
+                    reusable[c["id"]] = row
+
+        if local_index_dir:
+            to_encode = [c for c in batch if c["id"] in changed_ids or c["id"] not in reusable]
+        else:
+            to_encode = changed
+
+        vectors = {}
+        if to_encode:
+            embeddings = get_encoder().encode([c["text"] for c in to_encode], convert_to_numpy=True)
+            vectors = {c["id"]: e for c, e in zip(to_encode, embeddings)}
+            encoded += len(to_encode)
+
+        if chroma and changed:
+            collection.upsert(
+                ids=[c["id"] for c in changed],
+                documents=[c["text"] for c in changed],
+                metadatas=[{"source": c["source"], "chunk_index": c["chunk_index"], "id": c["id"]} for c in changed],
+                embeddings=[vectors[c["id"]].tolist() for c in changed],
+            )
+            new = sum(1 for c in changed if c["id"] not in indexed)
+            added += new
+            updated += len(changed) - new
+
+        if local_index_dir:
+            for c in batch:
+                if c["id"] in vectors:
+                    local_rows.append(vectors[c["id"]])
+                else:
+                    local_rows.append(old_local.vectors[reusable[c["id"]]])
+                    reused += 1
+                local_meta.append({"id": c["id"], "source": c["source"], "chunk_index": c["chunk_index"],
+                                   "text": c["text"], "hash": c["hash"], "signature": c["signature"]})
+
+    print(f"Ingested {format_ingest_stats(ingest_stats)}; encoded {encoded} chunks.")
+    if not current and not local_meta:
+        raise ValueError(f"No document chunks found in {docs_dir}/. Add some text/markdown/html/pdf files and try again.")
+
+    if chroma:
+        removed_ids = [i for i in indexed if i not in current]
+        if removed_ids:
+            print(f"Removing {len(removed_ids)} stale chunks...")
+            for batch in _batches(removed_ids, UPSERT_BATCH_SIZE):
+                collection.delete(ids=batch)
+
+        # try to persist (some clients support persist)
+        try:
+            client.persist()
+        except Exception:
+            pass
+
+        # fingerprint identifies this exact index content; query-side caches key on it
+        fingerprint = hashlib.sha256("".join(f"{i}:{current[i]['hash']};" for i in sorted(current)).encode("utf-8")).hexdigest()
+        save_manifest(mpath, {"model": EMBED_MODEL_NAME, "fingerprint": fingerprint, "chunks": current, "files": files})
+
+        unchanged = len(current) - added - updated
+        print(f"Chroma collection '{collection_name}' (persist_dir={persist_dir}): "
+              f"{added} added, {updated} updated, {unchanged} unchanged, {len(removed_ids)} removed.")
+
+    if local_index_dir:
+        import numpy as np
+        # stable row order (by source, then chunk) so an unchanged corpus keeps its fingerprint
+        order = sorted(range(len(local_meta)), key=lambda r: (local_meta[r]["source"], local_meta[r]["chunk_index"]))
+        local = LocalIndex.build(np.stack([local_rows[r] for r in order]), [local_meta[r] for r in order],
+                                 model=EMBED_MODEL_NAME, dtype=local_dtype)
+        local.save(local_index_dir, collection_name)
+        print(f"Local index '{collection_name}' ({local_dtype}, {len(local)} vectors, {carried} carried over, "
+              f"{reused} reused) written to {local_index_dir}/")
+        # rebuilt from all chunk texts every time: tokenizing is cheap next to encoding
+        bm25 = BM25Index.build(local.metadata)
+        bm25.save(local_index_dir, collection_name)
+        print(f"BM25 index '{collection_name}' ({len(bm25.vocab)} terms, {len(bm25.postings)} postings) "
+              f"written to {local_index_dir}/")
+        build_qa_index(qa_rows, qa_meta, qa_new, old_qa, get_encoder, local_index_dir,
+                       qa_index_name(collection_name), local_dtype)
+
+    print(f"Done in {time.time() - t0:.2f}s.")
     return collection
 
+def build_qa_index(rows, meta, new_entries, old_qa, get_encoder, index_dir, name, dtype="float32"):
+    """
+    Write the question index: carried-over rows (unchanged files) plus the questions of
+    re-read Q/A documents, encoding only questions whose text is not already indexed.
+    The question is the embedded text; the stored answer is returned verbatim on a match.
+    """
+    import numpy as np
+    rows, meta = list(rows), list(meta)
+    to_encode = []
+    for e in new_entries:
+        m = {"id": e["id"], "question": e["question"], "answer": e["answer"], "source": e["source"],
+             "pair_index": e["pair_index"], "text": e["question"], "hash": chunk_hash(e["question"]),
+             "signature": e["signature"]}
+        row = old_qa.row_of(e["id"]) if old_qa is not None else None
+        if row is not None and old_qa.metadata[row].get("hash") == m["hash"]:
+            rows.append(old_qa.vectors[row])
+        else:
+            rows.append(None)
+            to_encode.append(len(rows) - 1)
+        meta.append(m)
+    if to_encode:
+        vectors = get_encoder().encode([meta[r]["text"] for r in to_encode], convert_to_numpy=True)
+        for r, v in zip(to_encode, vectors):
+            rows[r] = v
+    if not meta:
+        # no Q/A documents: drop a stale index so the query side doesn't answer from it
+        for path in index_paths(index_dir, name):
+            if os.path.exists(path):
+                os.remove(path)
+        return None
+    order = sorted(range(len(meta)), key=lambda r: (meta[r]["source"], meta[r]["id"]))
+    qa = LocalIndex.build(np.stack([rows[r] for r in order]), [meta[r] for r in order],
+                          model=EMBED_MODEL_NAME, dtype=dtype)
+    qa.save(index_dir, name)
+    print(f"FAQ question index '{name}' ({len(qa)} questions, {len(to_encode)} encoded) written to {index_dir}/")
+    return qa
+
 if __name__ == "__main__":
-    build_chroma_collection()
+    parser = argparse.ArgumentParser(description="Build the Chroma FAQ collection and local index from docs/")
+    parser.add_argument("--full", action="store_true", help="drop the collection and re-encode every chunk")
+    parser.add_argument("--no-chroma", action="store_true", help="only build the local index (no Chroma)")
+    parser.add_argument("--no-local", action="store_true", help="skip writing the local mmap index")
+    parser.add_argument("--local-dtype", choices=["float32", "float16"], default="float32")
+    parser.add_argument("--docs", default=DOCS_DIR, help="documents folder (walked recursively)")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="extraction processes (1 = no pool)")
+    args = parser.parse_args()
+    build_chroma_collection(incremental=not args.full, chroma=not args.no_chroma,
+                            local_index_dir=None if args.no_local else LOCAL_INDEX_DIR,
+                            local_dtype=args.local_dtype, docs_dir=args.docs, workers=args.workers)
@@ -1,62 +1,191 @@
 # rag/build_embeddings_pinecone.py
+import os
 import json
-from sentence_transformers import SentenceTransformer
-from pinecone import Pinecone, ServerlessSpec
+import time
+import hashlib
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, ALL_COMPLETED
 from data_prep_rag import create_chunks_from_docs
 
-# ---- Load secrets.json ----
-with open("secrets.json") as f:
-    secrets = json.load(f)
-
-PINECONE_API_KEY = secrets["PINECONE_API_KEY"]
-INDEX_NAME = secrets.get("PINECONE_INDEX_NAME", "faq-index")
-
 # ---- Embedding model ----
 EMBED_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
 EMBED_DIM = 384  # model dimension
 
-# ---- Initialize Pinecone client ----
-pc = Pinecone(api_key=PINECONE_API_KEY)
+# ---- Batching / concurrency ----
+ENCODE_BATCH_SIZE = 256    # chunks encoded per model call
+UPSERT_BATCH_SIZE = 100    # vectors per Pinecone upsert request
+UPSERT_WORKERS = 4         # concurrent upsert requests
+MAX_RETRIES = 5
+RETRY_BACKOFF = 0.5        # seconds, doubled on each retry
+
+# Written after a successful build; qa_pinecone keys its answer cache on the fingerprint
+VERSION_PATH = os.getenv("PINECONE_VERSION_PATH", "pinecone_index.version.json")
+
+_secrets = None
+_pc = None
+
+def load_secrets(path: str = "secrets.json") -> dict:
+    global _secrets
+    if _secrets is None:
+        with open(path) as f:
+            _secrets = json.load(f)
+    return _secrets
+
+def get_index_name() -> str:
+    return load_secrets().get("PINECONE_INDEX_NAME", "faq-index")
+
+def get_client():
+    """Pinecone client, created on first use so importing this module has no side effects."""
+    global _pc
+    if _pc is None:
+        from pinecone import Pinecone
+        _pc = Pinecone(api_key=load_secrets()["PINECONE_API_KEY"])
+    return _pc
 
 def init_index():
     """Create index if it doesn't exist."""
+    from pinecone import ServerlessSpec
+    pc = get_client()
+    index_name = get_index_name()
     existing = pc.list_indexes().names()
-    if INDEX_NAME not in existing:
-        print(f"Creating Pinecone index '{INDEX_NAME}' ...")
+    if index_name not in existing:
+        print(f"Creating Pinecone index '{index_name}' ...")
         pc.create_index(
-            name=INDEX_NAME,
+            name=index_name,
             dimension=EMBED_DIM,
             metric="cosine",
             spec=ServerlessSpec(cloud="aws", region="us-east-1")
         )
-    return pc.Index(INDEX_NAME)
+    return pc.Index(index_name)
 
-def build_index(batch_size=32):
-    index = init_index()
-    encoder = SentenceTransformer(EMBED_MODEL)
-    chunks = create_chunks_from_docs("docs")
-    if not chunks:
-        raise ValueError("No chunks found in docs/")
+class RecordingIndex:
+    """
+    Local stand-in for a Pinecone Index: records every upsert instead of sending it.
+    `fail_first` makes the first N upsert calls raise, to exercise the retry path.
+    """
+    def __init__(self, fail_first: int = 0, latency: float = 0.0):
+        self.upserts = []
+        self.vectors = {}
+        self.calls = 0
+        self._fail_first = fail_first
+        self._latency = latency
+        self._lock = threading.Lock()
 
-    to_upsert = []
-    for i, c in enumerate(chunks):
-        vec = encoder.encode(c["text"]).tolist()
+    def upsert(self, vectors):
+        with self._lock:
+            self.calls += 1
+            should_fail = self.calls <= self._fail_first
+        if self._latency:
+            time.sleep(self._latency)
+        if should_fail:
+            raise ConnectionError("simulated upsert failure")
+        with self._lock:
+            self.upserts.append(list(vectors))
+            for v in vectors:
+                self.vectors[v["id"]] = v
+        return {"upserted_count": len(vectors)}
+
+def _upsert_with_retry(index, vectors, max_retries: int = MAX_RETRIES, backoff: float = RETRY_BACKOFF):
+    for attempt in range(max_retries + 1):
+        try:
+            index.upsert(vectors=vectors)
+            return len(vectors)
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff * (2 ** attempt) * (1 + random.random() * 0.1)
+            print(f"⚠️ Upsert of {len(vectors)} vectors failed ({e}); retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+def _to_vectors(chunks, embeddings):
+    out = []
+    for c, vec in zip(chunks, embeddings):
         metadata = {
             "source": c["source"],
             "chunk_index": c["chunk_index"],
             "id": c["id"],
             "text": c["text"][:1000]  # truncate long text
         }
-        to_upsert.append({"id": c["id"], "values": vec, "metadata": metadata})
+        out.append({"id": c["id"], "values": vec.tolist(), "metadata": metadata})
+    return out
+
+def write_version(chunks, path: str = VERSION_PATH) -> str:
+    """Record a fingerprint of the indexed content (ids + text + model)."""
+    h = hashlib.sha256(EMBED_MODEL.encode("utf-8"))
+    for c in sorted(chunks, key=lambda c: c["id"]):
+        h.update(f"\n{c['id']}\n{c['text']}".encode("utf-8"))
+    fingerprint = h.hexdigest()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"model": EMBED_MODEL, "fingerprint": fingerprint, "chunks": len(chunks), "built_at": time.time()}, f)
+    return fingerprint
+
+def build_index(batch_size: int = UPSERT_BATCH_SIZE, index=None, encoder=None, chunks=None,
+                encode_batch_size: int = ENCODE_BATCH_SIZE, max_workers: int = UPSERT_WORKERS,
+                max_retries: int = MAX_RETRIES, backoff: float = RETRY_BACKOFF,
+                version_path: str = VERSION_PATH) -> dict:
+    """
+    Encode chunks in large batches and upsert them from a bounded thread pool,
+    so network upserts overlap with encoding the next batch.
+    `index`, `encoder` and `chunks` can be injected (e.g. a RecordingIndex).
+    Pass version_path=None to skip writing the index version stamp.
+    Returns {"chunks", "upserted", "seconds", "chunks_per_sec"}.
+    """
+    if index is None:
+        index = init_index()
+    if encoder is None:
+        from sentence_transformers import SentenceTransformer
+        encoder = SentenceTransformer(EMBED_MODEL)
+    if chunks is None:
+        chunks = create_chunks_from_docs("docs")
+    if not chunks:
+        raise ValueError("No chunks found in docs/")
+
+    t0 = time.time()
+    upserted = 0
+    max_in_flight = max_workers * 2  # bounds memory held by queued upserts
+    pending = set()
+
+    def _drain(return_when):
+        nonlocal pending, upserted
+        done, pending = wait(pending, return_when=return_when)
+        for fut in done:
+            upserted += fut.result()  # re-raises after retries are exhausted
 
-        if len(to_upsert) >= batch_size:
-            index.upsert(vectors=to_upsert)
-            to_upsert = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for start in range(0, len(chunks), encode_batch_size):
+            batch = chunks[start:start + encode_batch_size]
+            embeddings = encoder.encode([c["text"] for c in batch], batch_size=64, convert_to_numpy=True)
+            vectors = _to_vectors(batch, embeddings)
+            for i in range(0, len(vectors), batch_size):
+                while len(pending) >= max_in_flight:
+                    _drain(FIRST_COMPLETED)
+                pending.add(pool.submit(_upsert_with_retry, index, vectors[i:i + batch_size], max_retries, backoff))
+        if pending:
+            _drain(ALL_COMPLETED)
 
-    if to_upsert:
-        index.upsert(vectors=to_upsert)
+    if version_path:
+        write_version(chunks, version_path)
 
-    print(f"✅ Upserted {len(chunks)} chunks into Pinecone index '{INDEX_NAME}'")
+    elapsed = time.time() - t0
+    stats = {
+        "chunks": len(chunks),
+        "upserted": upserted,
+        "seconds": elapsed,
+        "chunks_per_sec": len(chunks) / elapsed if elapsed > 0 else float("inf"),
+    }
+    print(f"✅ Upserted {upserted} chunks in {elapsed:.2f}s ({stats['chunks_per_sec']:.1f} chunks/s)")
+    return stats
 
 if __name__ == "__main__":
-    build_index()
+    parser = argparse.ArgumentParser(description="Encode docs/ and upsert them into Pinecone")
+    parser.add_argument("--dry-run", action="store_true", help="record upserts locally instead of calling Pinecone")
+    parser.add_argument("--workers", type=int, default=UPSERT_WORKERS)
+    parser.add_argument("--encode-batch-size", type=int, default=ENCODE_BATCH_SIZE)
+    args = parser.parse_args()
+    idx = RecordingIndex() if args.dry_run else None
+    build_index(index=idx, max_workers=args.workers, encode_batch_size=args.encode_batch_size,
+                version_path=None if args.dry_run else VERSION_PATH)
+    if args.dry_run:
+        print(f"Dry run: {len(idx.vectors)} vectors recorded in {len(idx.upserts)} upserts")
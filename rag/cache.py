@@ -0,0 +1,165 @@
+# rag/cache.py
+"""
+Bounded, thread-safe LRU cache with optional TTL and byte budget.
+
+Used for query embeddings (qa_pinecone) and other small hot-path caches.
+Eviction/hit/miss events can be forwarded to metrics via `on_event`, and the
+contents can be saved to / loaded from a JSON file so a restart is not cold.
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+def approx_sizeof(value: Any) -> int:
+    """Rough byte size of a value (recurses into lists/tuples/dicts of scalars)."""
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(approx_sizeof(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approx_sizeof(k) + approx_sizeof(v) for k, v in value.items())
+    nbytes = getattr(value, "nbytes", None)  # numpy arrays
+    if nbytes is not None:
+        return int(nbytes) + 112
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    def __init__(self, max_entries: int = 10000, max_bytes: Optional[int] = None, ttl: Optional[float] = None,
+                 sizeof: Callable[[Any], int] = approx_sizeof,
+                 on_event: Optional[Callable[[str], None]] = None):
+        """
+        max_entries: maximum number of items (LRU eviction beyond that)
+        max_bytes:   optional budget for the approximate size of keys + values
+        ttl:         optional time-to-live in seconds
+        on_event:    callback receiving "hit", "miss", "evict" or "expire"
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._sizeof = sizeof
+        self._on_event = on_event
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (value, size, stored_at)
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _emit(self, event: str):
+        if self._on_event is not None:
+            try:
+                self._on_event(event)
+            except Exception:
+                pass
+
+    def _expired(self, stored_at: float, now: float) -> bool:
+        return self.ttl is not None and now - stored_at > self.ttl
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and self._expired(item[2], time.time()):
+                self._remove(key)
+                item = None
+                self._emit("expire")
+            if item is None:
+                self.misses += 1
+                self._emit("miss")
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+        self._emit("hit")
+        return item[0]
+
+    def set(self, key, value, stored_at: Optional[float] = None):
+        size = self._sizeof(key) + self._sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return  # never cache something bigger than the whole budget
+            self._data[key] = (value, size, time.time() if stored_at is None else stored_at)
+            self._bytes += size
+            evicted = 0
+            while len(self._data) > self.max_entries or (self.max_bytes is not None and self._bytes > self.max_bytes):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                evicted += 1
+            self.evictions += evicted
+        for _ in range(evicted):
+            self._emit("evict")
+
+    def get_or_compute(self, key, compute: Callable[[], Any]):
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            item = self._data.get(key)
+            return item is not None and not self._expired(item[2], time.time())
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    # --- persistence (JSON; keys and values must be JSON-serializable) ---
+
+    def save(self, path: str):
+        with self._lock:
+            items = [[k, v, ts] for k, (v, _, ts) in self._data.items()]
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(items, f)
+        os.replace(tmp, path)
+
+    def load(self, path: str) -> int:
+        """Load entries saved by save(); expired entries are skipped. Returns the number loaded."""
+        if not os.path.exists(path):
+            return 0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                items = json.load(f)
+        except Exception as e:
+            print(f"⚠️ Could not load cache file {path}: {e}")
+            return 0
+        now = time.time()
+        loaded = 0
+        for key, value, ts in items:  # saved oldest -> newest, so LRU order is preserved
+            if self._expired(ts, now):
+                continue
+            self.set(key, value, stored_at=ts)
+            loaded += 1
+        return loaded
@@ -0,0 +1,100 @@
+# rag/config.py
+"""
+Runtime configuration shared by the RAG pipeline, apps and services.
+Everything is read from environment variables; API keys fall back to secrets.json.
+"""
+
+import os
+import json
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SECRETS_PATH = os.getenv("SECRETS_PATH", os.path.join(ROOT_DIR, "secrets.json"))
+
+secrets = {}
+if os.path.exists(SECRETS_PATH):
+    with open(SECRETS_PATH, "r", encoding="utf-8") as f:
+        secrets = json.load(f)
+
+
+def env_flag(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes")
+
+
+# --- Models ---
+EMBED_MODEL = os.getenv("EMBED_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+QA_MODEL = os.getenv("QA_MODEL", "distilbert-base-uncased-distilled-squad")  # CPU-friendly extractive reader
+SUMMARIZER_MODEL = os.getenv("SUMMARIZER_MODEL", "google/flan-t5-small")
+LANGCHAIN_LLM_MODEL = os.getenv("LANGCHAIN_LLM_MODEL", "google/flan-t5-base")
+# "torch", "onnx" or "onnx-int8" (rag/onnx_backend.py); ONNX falls back to torch if it can't load
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch").lower()
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", os.path.join(ROOT_DIR, "onnx_models"))
+
+# --- Pipeline selection ---
+# retriever backend: "chroma", "local", "pinecone" or "langchain"
+RETRIEVER_BACKEND = os.getenv("RETRIEVER_BACKEND", "chroma").lower()
+# reader: "extractive" (QA span), "summarize" (FLAN-T5) or "retrieval" (joined snippets)
+READER = os.getenv("READER", "extractive").lower()
+TOP_K = int(os.getenv("TOP_K", 4))
+# load models on a background thread at startup instead of on the first query
+WARMUP = env_flag("WARMUP", True)
+
+# --- Extractive reader ---
+# score each retrieved chunk separately (True) or the old concatenated context (False)
+QA_PER_CHUNK = env_flag("QA_PER_CHUNK", True)
+# chunks below this retrieval score are not read (the top chunk always is); scores are cosine similarities
+# (local / pinecone / chroma collections built with hnsw:space=cosine)
+QA_MIN_RETRIEVAL_SCORE = float(os.getenv("QA_MIN_RETRIEVAL_SCORE", 0.3))
+# when the top chunk scores at least this, read it alone first and stop if it yields a short answer
+QA_EARLY_EXIT_SCORE = float(os.getenv("QA_EARLY_EXIT_SCORE", 0.85))
+QA_SHORT_ANSWER_WORDS = int(os.getenv("QA_SHORT_ANSWER_WORDS", 30))
+
+# --- Hybrid retrieval (BM25 index written next to the local index by build_embeddings.py) ---
+# fuse BM25 with the dense retriever whenever the BM25 index exists
+HYBRID_ENABLED = env_flag("HYBRID_ENABLED", True)
+HYBRID_FUSION = os.getenv("HYBRID_FUSION", "rrf").lower()  # "rrf" or "weighted"
+HYBRID_ALPHA = float(os.getenv("HYBRID_ALPHA", 0.5))  # dense weight for "weighted" fusion
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", 60))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 20))  # hits taken from each side before fusing
+
+# --- Reranking (cross-encoder between retrieval and the reader) ---
+RERANK_ENABLED = env_flag("RERANK_ENABLED", False)
+# small English model; "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1" is a multilingual alternative
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", 12))  # chunks retrieved for the reranker to score
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", 2))  # chunks passed on to the reader
+RERANK_CACHE_MAX_ENTRIES = int(os.getenv("RERANK_CACHE_MAX_ENTRIES", 50000))
+
+# --- Direct FAQ answers (question index built from Q/A-formatted docs) ---
+# a query whose nearest indexed question is at least this similar gets the stored answer, no reader
+FAQ_DIRECT_ENABLED = env_flag("FAQ_DIRECT_ENABLED", True)
+FAQ_DIRECT_THRESHOLD = float(os.getenv("FAQ_DIRECT_THRESHOLD", 0.9))
+
+# --- Index locations (relative paths resolve against the working directory, like the builders) ---
+COLLECTION_NAME = os.getenv("COLLECTION_NAME", "faq_collection")
+CHROMA_DIR = os.getenv("CHROMA_DIR", "chromadb_store")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "local_index")
+FAQ_QA_INDEX_NAME = os.getenv("FAQ_QA_INDEX_NAME", f"{COLLECTION_NAME}_qa")
+PINECONE_API_KEY = os.getenv("PINECONE_API_KEY") or secrets.get("PINECONE_API_KEY")
+PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME") or secrets.get("PINECONE_INDEX_NAME", "faq-index")
+PINECONE_VERSION_PATH = os.getenv("PINECONE_VERSION_PATH", "pinecone_index.version.json")
+
+# --- Query-embedding cache (bounded LRU, optional TTL and disk persistence) ---
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", 10000))
+EMBED_CACHE_MAX_BYTES = int(os.getenv("EMBED_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+EMBED_CACHE_TTL = float(os.getenv("EMBED_CACHE_TTL", 0)) or None  # seconds, 0 = no expiry
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "")  # e.g. "cache/embed_cache.json" to survive restarts
+
+# --- Micro-batching of concurrent model calls (rag/batching.py) ---
+MICROBATCH_ENABLED = env_flag("MICROBATCH_ENABLED", True)
+MICROBATCH_MAX_WAIT_MS = float(os.getenv("MICROBATCH_MAX_WAIT_MS", 3))
+MICROBATCH_MAX_SIZE = int(os.getenv("MICROBATCH_MAX_SIZE", 32))
+
+# --- Metrics ---
+ENABLE_METRICS = env_flag("ENABLE_METRICS", True)
+METRICS_PORT = int(os.getenv("METRICS_PORT", 8000))
+
+# --- Tracing (rag/tracing.py) ---
+TRACE_SLOW_QUERY_SECONDS = float(os.getenv("TRACE_SLOW_QUERY_SECONDS", 1.0))
+TRACE_SLOW_QUERY_LOG = os.getenv("TRACE_SLOW_QUERY_LOG", "slow_queries.log")  # empty = stderr
+TRACE_SAMPLES_PER_STAGE = int(os.getenv("TRACE_SAMPLES_PER_STAGE", 2000))
+TRACE_RECENT = int(os.getenv("TRACE_RECENT", 200))
@@ -1,11 +1,32 @@
 # rag/data_prep_rag.py
 """
-Load TXT/PDF docs and chunk them for RAG.
+Load TXT/Markdown/HTML/PDF docs and chunk them for RAG.
 This version robustly supports 'pypdf' or 'PyPDF2' installs.
+
+Documents are found by walking docs/ recursively and extracted in a process
+pool (INGEST_WORKERS); large PDFs are split into page ranges. Everything is
+streamed, so callers can embed chunks as they arrive.
+
+Chunking is token-aware by default (CHUNKER=tokens): chunks are built from whole
+sentences/paragraphs up to a token budget measured with the embedding model's
+tokenizer, with sentence-aligned overlap. CHUNKER=chars keeps the old
+fixed-size character windows.
 """
 
 import os
-from typing import List, Dict, Optional
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from html.parser import HTMLParser
+from typing import Callable, Iterator, List, Dict, Optional
+
+CHUNKER = os.getenv("CHUNKER", "tokens")
+TOKENIZER_MODEL = os.getenv("EMBED_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+# the embedder truncates at 128 tokens; leave room for [CLS]/[SEP]
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", 120))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", 24))
 
 # Try imports for PDF readers (support pypdf and PyPDF2)
 PdfReader = None
@@ -21,10 +42,99 @@ except Exception:
         PdfReader = None
         _pdf_lib_name = None
 
+SUPPORTED_EXTENSIONS = (".txt", ".md", ".markdown", ".html", ".htm", ".pdf")
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1))
+# PDFs with more pages than this are split into page ranges extracted in parallel
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 16))
+
 def load_txt(path: str) -> str:
     with open(path, "r", encoding="utf-8") as f:
         return f.read()
 
+_MD_FENCE_RE = re.compile(r"^\s*(```|~~~).*$", re.MULTILINE)
+_MD_IMAGE_RE = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+_MD_LINK_RE = re.compile(r"\[([^\]]+)\]\([^)]*\)")
+_MD_PREFIX_RE = re.compile(r"^\s{0,3}(#{1,6}\s+|>\s?|[-*+]\s+(?=\S)|\d+\.\s+)", re.MULTILINE)
+_MD_EMPHASIS_RE = re.compile(r"(\*\*|__|\*|_|`)(\S(?:.*?\S)?)\1")
+_MD_RULE_RE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$", re.MULTILINE)
+_HTML_TAG_RE = re.compile(r"<[^>]+>")
+
+def load_markdown(path: str) -> str:
+    """Markdown as plain text: keeps headings/list items as lines, drops markup."""
+    text = load_txt(path)
+    text = _MD_FENCE_RE.sub("", text)
+    text = _MD_RULE_RE.sub("", text)
+    text = _MD_IMAGE_RE.sub(r"\1", text)
+    text = _MD_LINK_RE.sub(r"\1", text)
+    text = _MD_PREFIX_RE.sub("", text)
+    text = _MD_EMPHASIS_RE.sub(r"\2", text)
+    return _HTML_TAG_RE.sub("", text)
+
+class _HTMLText(HTMLParser):
+    BLOCK_TAGS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6",
+                  "section", "article", "header", "footer", "blockquote", "pre", "dt", "dd"}
+    SKIP_TAGS = {"script", "style", "noscript", "template", "head"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip = max(self._skip - 1, 0)
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+    def text(self) -> str:
+        lines = (" ".join(line.split()) for line in "".join(self.parts).splitlines())
+        return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+def load_html(path: str) -> str:
+    """Visible text of an HTML page; block elements become line breaks, scripts/styles are dropped."""
+    parser = _HTMLText()
+    parser.feed(load_txt(path))
+    parser.close()
+    return parser.text()
+
+def pdf_page_count(path: str) -> int:
+    if PdfReader is None:
+        return 0
+    try:
+        return len(PdfReader(path).pages)
+    except Exception as e:
+        print(f"⚠️ Failed to read PDF {path}: {e}")
+        return 0
+
+def load_pdf_pages(path: str, start: int = 0, end: Optional[int] = None) -> List[str]:
+    """Text of pages [start, end) of a PDF; pages that fail to extract come back empty."""
+    if PdfReader is None:
+        return []
+    try:
+        reader = PdfReader(path)
+    except Exception as e:
+        print(f"⚠️ Failed to read PDF {path}: {e}")
+        return []
+    pages = reader.pages
+    out = []
+    for i in range(start, len(pages) if end is None else min(end, len(pages))):
+        try:
+            out.append(pages[i].extract_text() or "")
+        except Exception:
+            # some PDF pages might fail extract_text; skip them gracefully
+            out.append("")
+    return out
+
 def load_pdf_text(path: str) -> str:
     """
     Extract text from each page of a PDF using PdfReader (if available).
@@ -33,57 +143,127 @@ def load_pdf_text(path: str) -> str:
     if PdfReader is None:
         print(f"⚠️ PDF support not available (no pypdf/PyPDF2 installed). Skipping PDF: {path}")
         return ""
+    return "\n".join(load_pdf_pages(path))
+
+_LOADERS = {".txt": load_txt, ".md": load_markdown, ".markdown": load_markdown,
+            ".html": load_html, ".htm": load_html}
 
+def _extract(task: tuple) -> tuple:
+    """Worker entry point. task = (path, start_page, end_page); page bounds are None for non-PDF files.
+    Returns (list of page/file texts, page count)."""
+    path, start, end = task
+    ext = os.path.splitext(path)[1].lower()
     try:
-        reader = PdfReader(path)
-        pages_text = []
-        # support both old and new reader.page interfaces
-        for page in getattr(reader, "pages", getattr(reader, "pages", [])):
-            try:
-                text = page.extract_text() or ""
-            except Exception:
-                # some PDF pages might fail extract_text; skip them gracefully
-                text = ""
-            pages_text.append(text)
-        return "\n".join(pages_text)
+        if ext == ".pdf":
+            pages = load_pdf_pages(path, start, end)
+            return pages, len(pages)
+        return [_LOADERS[ext](path)], 1
     except Exception as e:
-        print(f"⚠️ Failed to read PDF {path}: {e}")
-        return ""
+        print(f"⚠️ Failed to load {path}: {e}")
+        return [], 0
 
-def load_documents(folder: str = "docs") -> List[Dict]:
-    """
-    Load TXT and PDF documents from a folder.
-    Returns list[{"id": filename, "text": content, "source": filename}]
-    """
-    docs = []
+def iter_doc_files(folder: str = "docs", recursive: bool = True) -> Iterator[str]:
+    """Relative (posix-style) paths of supported documents under folder, in sorted order."""
     if not os.path.isdir(folder):
         print(f"⚠️ docs folder not found: {folder}")
-        return docs
+        return
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(".")) if recursive else []
+        for fname in sorted(files):
+            if fname.lower().endswith(SUPPORTED_EXTENSIONS):
+                yield os.path.relpath(os.path.join(root, fname), folder).replace(os.sep, "/")
 
-    for fname in sorted(os.listdir(folder)):
-        path = os.path.join(folder, fname)
-        if not os.path.isfile(path):
-            continue
+def file_signature(path: str) -> Dict:
+    """mtime/size pair used to skip files that have not changed since the last build."""
+    st = os.stat(path)
+    return {"mtime": st.st_mtime_ns, "size": st.st_size}
 
-        content: Optional[str] = None
-        lower = fname.lower()
-        if lower.endswith(".txt"):
-            try:
-                content = load_txt(path)
-            except Exception as e:
-                print(f"⚠️ Failed to load text file {fname}: {e}")
-                continue
-        elif lower.endswith(".pdf"):
-            content = load_pdf_text(path)
-            if not content:
-                # skip PDFs we couldn't extract from
-                continue
-        else:
-            # skip other filetypes
-            continue
+def _file_tasks(folder: str, source: str) -> List[tuple]:
+    path = os.path.join(folder, source)
+    if not source.lower().endswith(".pdf"):
+        return [(path, None, None)]
+    if PdfReader is None:
+        print(f"⚠️ PDF support not available (no pypdf/PyPDF2 installed). Skipping PDF: {path}")
+        return []
+    n = pdf_page_count(path)
+    return [(path, s, min(s + PDF_PAGES_PER_TASK, n)) for s in range(0, n, PDF_PAGES_PER_TASK)]
 
-        docs.append({"id": fname, "text": content, "source": fname})
-    return docs
+def iter_documents(folder: str = "docs", sources: Optional[List[str]] = None, workers: int = INGEST_WORKERS,
+                   recursive: bool = True, stats: Optional[Dict] = None) -> Iterator[Dict]:
+    """
+    Stream {"id", "text", "source", "signature"} for each document, in file order.
+
+    Extraction runs in a process pool (workers > 1); large PDFs are split into
+    page ranges so one file can use several cores. At most 2 tasks per worker are
+    in flight, including the page ranges of a single large PDF, so memory is
+    bounded by the largest document's text (a document is joined before it is
+    yielded), not by the corpus size.
+    sources restricts loading to those relative paths (e.g. only changed files).
+    stats (optional dict) is filled with files / pages / chars / seconds / pages_per_sec.
+    """
+    if stats is None:
+        stats = {}
+    stats.update(files=0, pages=0, chars=0)
+    t0 = time.perf_counter()
+    if sources is None:
+        sources = list(iter_doc_files(folder, recursive))
+
+    def emit(source, parts):
+        # parts: (texts, page_count) results of one file's tasks, in page order
+        text = "\n".join(t for texts, _ in parts for t in texts)
+        stats["pages"] += sum(n for _, n in parts)
+        if not text.strip():
+            return None
+        stats["files"] += 1
+        stats["chars"] += len(text)
+        return {"id": source, "text": text, "source": source,
+                "signature": file_signature(os.path.join(folder, source))}
+
+    try:
+        if workers <= 1:
+            for source in sources:
+                doc = emit(source, [_extract(t) for t in _file_tasks(folder, source)])
+                if doc:
+                    yield doc
+            return
+
+        max_in_flight = workers * 2
+        # one flat stream of tasks in file order; a PDF's page ranges are submitted as slots free up
+        tasks = ((source, t) for source in sources for t in _file_tasks(folder, source))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()  # [source, futures in page order, finished parts] in file order
+            in_flight = 0
+            nxt = next(tasks, None)
+            while True:
+                while nxt is not None and in_flight < max_in_flight:
+                    source, task = nxt
+                    if not pending or pending[-1][0] != source:
+                        pending.append([source, deque(), []])
+                    pending[-1][1].append(pool.submit(_extract, task))
+                    in_flight += 1
+                    nxt = next(tasks, None)
+                if not pending:
+                    break
+                source, futures, parts = pending[0]
+                if futures:
+                    parts.append(futures.popleft().result())
+                    in_flight -= 1
+                # the head file is complete once its last task is submitted and collected
+                if not futures and (len(pending) > 1 or nxt is None or nxt[0] != source):
+                    pending.popleft()
+                    doc = emit(source, parts)
+                    if doc:
+                        yield doc
+    finally:
+        stats["seconds"] = time.perf_counter() - t0
+        stats["pages_per_sec"] = stats["pages"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+
+def load_documents(folder: str = "docs", recursive: bool = True) -> List[Dict]:
+    """
+    Load TXT, Markdown, HTML and PDF documents from a folder (recursively).
+    Returns list[{"id": relpath, "text": content, "source": relpath, "signature": {...}}]
+    """
+    return list(iter_documents(folder, recursive=recursive))
 
 def chunk_text(text: str, chunk_size: int = 800, overlap: int = 200) -> List[str]:
     """
@@ -100,25 +280,181 @@ def chunk_text(text: str, chunk_size: int = 800, overlap: int = 200) -> List[str
         start += chunk_size - overlap
     return out
 
-def create_chunks_from_docs(folder: str = "docs") -> List[Dict]:
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+# sentence ends (. ! ? followed by space) and single line breaks are both unit boundaries
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n")
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+@lru_cache(maxsize=4)
+def get_token_counter(model_name: str = TOKENIZER_MODEL) -> Callable[[str], int]:
+    """Token counter using the model's tokenizer; falls back to a word/punctuation regex."""
+    try:
+        from transformers import AutoTokenizer
+        tok = AutoTokenizer.from_pretrained(model_name)
+        return lambda text: len(tok(text, add_special_tokens=False)["input_ids"])
+    except Exception as e:
+        print(f"⚠️ Tokenizer for {model_name} unavailable ({e}); approximating token counts.")
+        return lambda text: len(_WORD_RE.findall(text))
+
+def iter_text_units(text: str) -> Iterator[tuple]:
+    """Yield (unit, separator) pairs: sentences/lines, with "\n" before a new line/paragraph and " " otherwise."""
+    first = True
+    for para in _PARAGRAPH_RE.split(text):
+        line_start = True
+        pos = 0
+        for m in _SENTENCE_RE.finditer(para):
+            unit = para[pos:m.start()].strip()
+            if unit:
+                yield unit, ("" if first else ("\n" if line_start else " "))
+                first = False
+            line_start = "\n" in m.group(0)
+            pos = m.end()
+        unit = para[pos:].strip()
+        if unit:
+            yield unit, ("" if first else ("\n" if line_start else " "))
+            first = False
+
+def _split_long_unit(unit: str, max_tokens: int, count: Callable[[str], int]) -> Iterator[str]:
+    """Hard-split a single over-long sentence on word boundaries."""
+    words, cur, cur_tokens = unit.split(), [], 0
+    for w in words:
+        n = count(w)
+        if cur and cur_tokens + n > max_tokens:
+            yield " ".join(cur)
+            cur, cur_tokens = [], 0
+        cur.append(w)
+        cur_tokens += n
+    if cur:
+        yield " ".join(cur)
+
+def chunk_text_tokens(text: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                      count_tokens: Optional[Callable[[str], int]] = None) -> Iterator[str]:
     """
-    Load documents and produce chunk dicts:
-    [{"id": "...", "text": "...", "source": "...", "chunk_index": 0}, ...]
+    Generator of chunks of at most ~max_tokens tokens built from whole sentences/paragraphs.
+    Consecutive chunks share trailing sentences worth up to overlap_tokens tokens.
     """
-    docs = load_documents(folder)
-    chunks = []
-    for doc in docs:
-        parts = chunk_text(doc["text"])
+    count = count_tokens or get_token_counter(TOKENIZER_MODEL)
+    window = []  # [(unit, sep, n_tokens)]
+    window_tokens = 0
+
+    def render(units):
+        return "".join((sep if i else "") + u for i, (u, sep, _) in enumerate(units))
+
+    for unit, sep in iter_text_units(text):
+        n = count(unit)
+        if n > max_tokens:
+            if window:
+                yield render(window)
+                window, window_tokens = [], 0
+            for piece in _split_long_unit(unit, max_tokens, count):
+                yield piece
+            continue
+        if window and window_tokens + n > max_tokens:
+            yield render(window)
+            # carry over trailing whole units that fit in the overlap budget
+            carry, carry_tokens = [], 0
+            for u in reversed(window):
+                if carry_tokens + u[2] > overlap_tokens or carry_tokens + u[2] + n > max_tokens:
+                    break
+                carry.insert(0, u)
+                carry_tokens += u[2]
+            window, window_tokens = carry, carry_tokens
+        window.append((unit, sep, n))
+        window_tokens += n
+    if window:
+        yield render(window)
+
+_QA_LINE_RE = re.compile(r"^\s*([QA])\s*[:.)]\s*(.*)$", re.IGNORECASE)
+
+def parse_qa_pairs(text: str, min_coverage: float = 0.8) -> List[Dict]:
+    """
+    Parse "Q: ... / A: ..." FAQ text into [{"questions": [...], "answer": str}, ...].
+    Consecutive Q: lines before one A: are paraphrases of the same question; answers may span
+    several lines. Returns [] unless the pairs cover at least min_coverage of the non-blank lines,
+    so ordinary prose that happens to contain a "Q:" is not treated as an FAQ.
+    """
+    pairs, questions, answer = [], [], None
+    covered = total = 0
+
+    def close():
+        if questions and answer:
+            pairs.append({"questions": list(questions), "answer": " ".join(answer).strip()})
+
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        total += 1
+        m = _QA_LINE_RE.match(line)
+        kind = m.group(1).upper() if m else None
+        if kind == "Q":
+            if answer is not None:
+                close()
+                questions, answer = [], None
+            questions.append(m.group(2).strip())
+            covered += 1
+        elif kind == "A" and questions:
+            answer = (answer or []) + [m.group(2).strip()]
+            covered += 1
+        elif answer is not None:
+            answer.append(line.strip())  # continuation of a multi-line answer
+            covered += 1
+        elif questions:
+            questions[-1] += " " + line.strip()
+            covered += 1
+    close()
+    if not pairs or covered < min_coverage * total:
+        return []
+    return pairs
+
+def format_qa_pair(pair: Dict) -> str:
+    return f"Q: {pair['questions'][0]}\nA: {pair['answer']}"
+
+def qa_entries(doc: Dict) -> List[Dict]:
+    """One entry per question/paraphrase of a Q/A document, for the direct-answer FAQ index."""
+    out = []
+    for i, pair in enumerate(parse_qa_pairs(doc["text"])):
+        for j, q in enumerate(pair["questions"]):
+            out.append({"id": f"{doc['id']}_qa_{i}_{j}", "question": q, "answer": pair["answer"],
+                        "source": doc["source"], "pair_index": i, "signature": doc["signature"]})
+    return out
+
+def iter_chunks_from_docs(folder: str = "docs", chunker: str = CHUNKER, sources: Optional[List[str]] = None,
+                          workers: int = INGEST_WORKERS, stats: Optional[Dict] = None,
+                          on_document: Optional[Callable[[Dict], None]] = None) -> Iterator[Dict]:
+    """
+    Streaming variant of create_chunks_from_docs: yields chunk dicts one at a time.
+    Q/A-formatted documents are chunked one pair per chunk so no chunk straddles two pairs.
+    on_document(doc) is called with each loaded document before its chunks are yielded.
+    """
+    split = chunk_text_tokens if chunker == "tokens" else chunk_text
+    for doc in iter_documents(folder, sources=sources, workers=workers, stats=stats):
+        if on_document is not None:
+            on_document(doc)
+        pairs = parse_qa_pairs(doc["text"])
+        parts = (format_qa_pair(p) for p in pairs) if pairs else split(doc["text"])
         for i, p in enumerate(parts):
-            chunks.append({
+            yield {
                 "id": f"{doc['id']}_chunk_{i}",
                 "text": p,
                 "source": doc["source"],
-                "chunk_index": i
-            })
-    return chunks
+                "chunk_index": i,
+                "signature": doc["signature"],
+            }
+
+def create_chunks_from_docs(folder: str = "docs", chunker: str = CHUNKER) -> List[Dict]:
+    """
+    Load documents and produce chunk dicts:
+    [{"id": "...", "text": "...", "source": "...", "chunk_index": 0, "signature": {...}}, ...]
+    chunker: "tokens" (sentence-aware, token budget) or "chars" (fixed character windows)
+    """
+    return list(iter_chunks_from_docs(folder, chunker))
+
+def format_ingest_stats(stats: Dict) -> str:
+    return (f"{stats.get('files', 0)} files, {stats.get('pages', 0)} pages, {stats.get('chars', 0):,} chars "
+            f"in {stats.get('seconds', 0.0):.2f}s ({stats.get('pages_per_sec', 0.0):.1f} pages/sec)")
 
 if __name__ == "__main__":
-    print(f"Using PDF library: {_pdf_lib_name}")
-    c = create_chunks_from_docs("docs")
-    print(f"✅ Created {len(c)} chunks from docs/")
+    print(f"Using PDF library: {_pdf_lib_name}; chunker: {CHUNKER}")
+    stats = {}
+    n = sum(1 for _ in iter_chunks_from_docs("docs", stats=stats))
+    print(f"✅ Created {n} chunks from docs/: {format_ingest_stats(stats)}")
@@ -2,14 +2,53 @@
 """
 LangChain-powered RAG assistant with memory + retrieval + source display.
 CPU-friendly (HuggingFace pipeline).
+
+LangChainRAG.ask deliberately keeps its own ConversationalRetrievalChain instead of
+going through rag.pipeline.get_pipeline(): the chain rewrites each follow-up into a
+standalone question from the chat history before retrieving, which the shared
+single-turn pipeline doesn't do. Its store and embeddings are still the ones the
+pipeline's "langchain" backend uses (self.retriever), and the LLM comes from the
+shared model registry.
 """
 
+import time
 from langchain.chains import ConversationalRetrievalChain
 from langchain.memory import ConversationBufferMemory
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_community.embeddings import SentenceTransformerEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain_community.llms import HuggingFacePipeline
-from transformers import pipeline
+from rag import config
+from rag.model_registry import get_pipeline
+from rag.retrievers import LangChainRetriever
+from rag.tracing import trace, record
+
+
+class StageTimer(BaseCallbackHandler):
+    """Records the chain's retrieval and LLM calls as "retrieve" / "summarize" tracing stages."""
+
+    def __init__(self):
+        self._started = {}
+
+    def _start(self, run_id):
+        self._started[run_id] = time.perf_counter()
+
+    def _end(self, run_id, stage):
+        t0 = self._started.pop(run_id, None)
+        if t0 is not None:
+            record(stage, time.perf_counter() - t0)
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id, "retrieve")
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id, "summarize")
 
 
 class LangChainRAG:
@@ -20,22 +59,26 @@ class LangChainRAG:
 
         print(f"🔍 Loading Chroma collection: {collection_name}")
 
-        # 1) Embeddings
+        # 1) Embeddings - must match the model build_embeddings.py indexed with
         embeddings = SentenceTransformerEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
+            model_name=config.EMBED_MODEL
         )
 
         # 2) Vectorstore
         self.vectordb = Chroma(
             persist_directory=persist_dir,
             embedding_function=embeddings,
-            collection_name=collection_name
+            collection_name=collection_name,
+            collection_metadata={"hnsw:space": "cosine"}  # same space as build_embeddings.py
         )
 
-        # 3) LLM pipeline
-        hf_pipeline = pipeline(
+        # plain retriever view for rag.pipeline (same store, no LLM)
+        self.retriever = LangChainRetriever(self.vectordb)
+
+        # 3) LLM pipeline (shared process-wide)
+        hf_pipeline = get_pipeline(
             "text2text-generation",
-            model="google/flan-t5-base",
+            config.LANGCHAIN_LLM_MODEL,
             device=-1
         )
         llm = HuggingFacePipeline(pipeline=hf_pipeline)
@@ -64,7 +107,8 @@ class LangChainRAG:
         Ask a question and return structured result.
         """
         try:
-            result = self.chain({"question": question})
+            with trace("langchain_rag") as tr:
+                result = self.chain({"question": question}, callbacks=[StageTimer()])
             answer = result.get("answer", "No answer found.")
             sources = []
 
@@ -74,7 +118,7 @@ class LangChainRAG:
                     "content": (doc.page_content or "")[:200]
                 })
 
-            return {"answer": answer, "sources": sources}
+            return {"answer": answer, "sources": sources, "request_id": tr.request_id}
 
         except Exception as e:
             return {"answer": f"❌ Error: {str(e)}", "sources": []}
@@ -0,0 +1,116 @@
+# rag/local_index.py
+"""
+In-process vector index backed by a memory-mapped .npy file.
+
+FAQ corpora fit comfortably in RAM, so instead of a Chroma query or a Pinecone
+round-trip we keep L2-normalized embeddings (float32, or float16 to halve the
+footprint) in `<name>.vectors.npy` and the chunk metadata in a JSON sidecar
+`<name>.meta.json`. Top-k is one matrix-vector product plus argpartition.
+"""
+
+import os
+import json
+import hashlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+SEARCH_BLOCK_ROWS = 65536  # rows per matmul block, bounds temporaries for float16 indexes
+
+
+def index_paths(index_dir: str, name: str):
+    return (os.path.join(index_dir, f"{name}.vectors.npy"),
+            os.path.join(index_dir, f"{name}.meta.json"))
+
+
+def normalize_rows(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float32)
+    if x.ndim == 1:
+        x = x[None, :]
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+
+class LocalIndex:
+    def __init__(self, vectors: np.ndarray, metadata: List[Dict], model: str = "", fingerprint: str = ""):
+        if len(vectors) != len(metadata):
+            raise ValueError(f"vectors ({len(vectors)}) and metadata ({len(metadata)}) length mismatch")
+        self.vectors = vectors
+        self.metadata = metadata
+        self.model = model
+        self.fingerprint = fingerprint
+        self._row_of = {m["id"]: i for i, m in enumerate(metadata)}
+
+    def __len__(self) -> int:
+        return len(self.metadata)
+
+    @property
+    def dim(self) -> int:
+        return int(self.vectors.shape[1]) if self.vectors.ndim == 2 else 0
+
+    # --- build / persist ---
+
+    @classmethod
+    def build(cls, embeddings, metadata: List[Dict], model: str = "", dtype: str = "float32") -> "LocalIndex":
+        """metadata: one dict per row with at least "id" (plus source, chunk_index, text, hash...)."""
+        vectors = normalize_rows(embeddings).astype(dtype) if len(metadata) else np.zeros((0, 0), dtype=dtype)
+        h = hashlib.sha256(model.encode("utf-8"))
+        for m in metadata:
+            h.update(f"\n{m['id']}\n{m.get('hash') or m.get('text', '')}".encode("utf-8"))
+        return cls(vectors, metadata, model=model, fingerprint=h.hexdigest())
+
+    def save(self, index_dir: str, name: str):
+        os.makedirs(index_dir, exist_ok=True)
+        vec_path, meta_path = index_paths(index_dir, name)
+        # write to temp files then rename so readers never see a half-written index
+        tmp_vec = vec_path + ".tmp.npy"
+        np.save(tmp_vec, np.ascontiguousarray(self.vectors))
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"model": self.model, "fingerprint": self.fingerprint,
+                       "dtype": str(self.vectors.dtype), "chunks": self.metadata}, f)
+        os.replace(tmp_vec, vec_path)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    @classmethod
+    def load(cls, index_dir: str, name: str, mmap: bool = True) -> "LocalIndex":
+        vec_path, meta_path = index_paths(index_dir, name)
+        if not (os.path.exists(vec_path) and os.path.exists(meta_path)):
+            raise FileNotFoundError(f"Local index '{name}' not found in {index_dir}. Run build_embeddings.py first.")
+        vectors = np.load(vec_path, mmap_mode="r" if mmap else None)
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(vectors, meta["chunks"], model=meta.get("model", ""), fingerprint=meta.get("fingerprint", ""))
+
+    # --- lookup ---
+
+    def row_of(self, chunk_id: str) -> Optional[int]:
+        return self._row_of.get(chunk_id)
+
+    def vector_of(self, chunk_id: str) -> Optional[np.ndarray]:
+        row = self._row_of.get(chunk_id)
+        return None if row is None else np.asarray(self.vectors[row], dtype=np.float32)
+
+    def scores(self, query_vectors) -> np.ndarray:
+        """Cosine similarities, shape (n_queries, n_rows)."""
+        q = normalize_rows(query_vectors)
+        if self.vectors.dtype == np.float32:
+            return q @ self.vectors.T
+        out = np.empty((q.shape[0], len(self)), dtype=np.float32)
+        for start in range(0, len(self), SEARCH_BLOCK_ROWS):
+            block = np.asarray(self.vectors[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+            out[:, start:start + len(block)] = q @ block.T
+        return out
+
+    def search(self, query_vectors, top_k: int = 4) -> List[List[tuple]]:
+        """Returns, per query, a list of (row, score) sorted by descending score."""
+        if len(self) == 0:
+            return [[] for _ in range(np.atleast_2d(query_vectors).shape[0])]
+        sims = self.scores(query_vectors)
+        k = min(top_k, sims.shape[1])
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        results = []
+        for qi in range(sims.shape[0]):
+            rows = top[qi][np.argsort(-sims[qi, top[qi]])]
+            results.append([(int(r), float(sims[qi, r])) for r in rows])
+        return results
@@ -1,9 +1,43 @@
 # rag/logger_db.py
+"""
+Conversation logging to SQLite.
+
+log_conversation() enqueues the row; a background writer keeps one WAL-mode
+connection open and inserts queued rows with executemany in batches bounded by
+size (LOG_BATCH_SIZE) and time (LOG_FLUSH_INTERVAL). Pending rows are flushed on
+shutdown. LOG_DURABILITY picks the trade-off:
+  "full"   - PRAGMA synchronous=FULL, commit after every row, and log_conversation()
+             returns only once its row is committed, raising if the write failed
+             (slowest, safest)
+  "normal" - PRAGMA synchronous=NORMAL, batched commits (default)
+  "off"    - PRAGMA synchronous=OFF, batched commits (fastest, may lose rows on power loss)
+"""
+import os
 import sqlite3
+import threading
+import queue
+import atexit
+import time
 from datetime import datetime
 import json
 
+try:
+    from rag.tracing import record as _record
+except ImportError:
+    _record = None  # run as a plain script from rag/
+
 DB = "conversations.db"
+LOG_DURABILITY = os.getenv("LOG_DURABILITY", "normal").lower()
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", 200))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", 0.5))  # seconds
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+_SYNC_PRAGMA = {"full": "FULL", "normal": "NORMAL", "off": "OFF"}
+
+INSERT_SQL = """
+    INSERT INTO conversations (ts, channel, user_id, question, answer, score, sources, escalated)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """
 
 def init_db():
     conn = sqlite3.connect(DB)
@@ -24,17 +58,145 @@ def init_db():
     conn.commit()
     conn.close()
 
+class _Waiter:
+    """Lets a "full" durability log() call wait for the commit of its own row."""
+    __slots__ = ("done", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+
+class BufferedLogger:
+    def __init__(self, db_path: str = DB, durability: str = LOG_DURABILITY, batch_size: int = LOG_BATCH_SIZE,
+                 flush_interval: float = LOG_FLUSH_INTERVAL, maxsize: int = LOG_QUEUE_SIZE):
+        if durability not in _SYNC_PRAGMA:
+            raise ValueError(f"LOG_DURABILITY must be one of {', '.join(_SYNC_PRAGMA)}")
+        self.db_path = db_path
+        self.durability = durability
+        self.batch_size = 1 if durability == "full" else batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._flushed = threading.Condition()
+        self._enqueued = 0
+        self._written = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="conversation-logger", daemon=True)
+        self._thread.start()
+
+    def log(self, row: tuple):
+        """Queue a row; in "full" durability, block until it is committed (raises if the write failed)."""
+        if self._closed:
+            raise RuntimeError("logger is closed")
+        with self._flushed:
+            self._enqueued += 1
+        waiter = _Waiter() if self.durability == "full" else None
+        self._queue.put((row, waiter))  # blocks when the queue is full (backpressure rather than dropping rows)
+        if waiter is not None:
+            waiter.done.wait()
+            if waiter.error is not None:
+                raise waiter.error
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Block until every row logged so far is committed."""
+        with self._flushed:
+            target = self._enqueued
+            return self._flushed.wait_for(lambda: self._written >= target, timeout=timeout)
+
+    def close(self, timeout: float = 10.0):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)  # sentinel: write what's left and exit
+        self._thread.join(timeout=timeout)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={_SYNC_PRAGMA[self.durability]}")
+        return conn
+
+    def _run(self):
+        conn = None  # opened by the first write, so a bad path fails writes instead of killing the thread
+        stop = False
+        while not stop:
+            batch = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(item)
+            except queue.Empty:
+                continue
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(item)
+            if batch:
+                conn = self._write(conn, batch)
+        if conn is not None:
+            conn.close()
+
+    def _write(self, conn, batch):
+        t0 = time.perf_counter()
+        error = None
+        try:
+            if conn is None:
+                conn = self._connect()
+            conn.executemany(INSERT_SQL, [row for row, _ in batch])
+            conn.commit()
+        except Exception as e:
+            error = e
+            print(f"⚠️ Failed to write {len(batch)} conversation rows: {e}")
+        for _, waiter in batch:
+            if waiter is not None:
+                waiter.error = error
+                waiter.done.set()
+        if _record is not None:
+            _record("log_write", time.perf_counter() - t0)  # background batch, outside any request trace
+        with self._flushed:
+            self._written += len(batch)
+            self._flushed.notify_all()
+        return conn
+
+_logger = None
+_logger_lock = threading.Lock()
+
+def get_logger() -> BufferedLogger:
+    global _logger
+    with _logger_lock:
+        if _logger is None:
+            _logger = BufferedLogger()
+            atexit.register(_logger.close)
+            try:
+                from rag.metrics import LOG_QUEUE_DEPTH
+                LOG_QUEUE_DEPTH.set_function(_logger.queue_depth)
+            except ImportError:
+                pass  # run as a plain script from rag/
+        return _logger
+
 def log_conversation(channel, user_id, question, answer, score, sources, escalated=0):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("""
-    INSERT INTO conversations (ts, channel, user_id, question, answer, score, sources, escalated)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (datetime.utcnow().isoformat(), channel, user_id, question, answer, score, json.dumps(sources), escalated))
-    conn.commit()
-    conn.close()
+    t0 = time.perf_counter()
+    get_logger().log((datetime.utcnow().isoformat(), channel, user_id, question, answer, score, json.dumps(sources), escalated))
+    if _record is not None:
+        _record("log", time.perf_counter() - t0)
+
+def queue_depth() -> int:
+    return _logger.queue_depth() if _logger is not None else 0
+
+def flush(timeout: float = 10.0) -> bool:
+    return _logger.flush(timeout) if _logger is not None else True
 
 if __name__ == "__main__":
     init_db()
     log_conversation("web", "testuser", "What is return policy?", "You can return in 30 days", 0.92, [{"source":"sample_faq.txt"}])
+    flush()
     print("Logged sample.")
@@ -0,0 +1,67 @@
+# rag/metrics.py
+"""
+Prometheus metrics shared across the answer path.
+Defined once here so that several modules (and repeated imports) reuse the same collectors.
+"""
+
+import threading
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from rag import config
+
+REQUESTS = Counter("faq_requests_total", "Total FAQ queries")
+LATENCY = Histogram("faq_request_latency_seconds", "Latency for FAQ queries")
+STAGE_LATENCY = Histogram("faq_stage_latency_seconds", "Latency of one stage of the answer path "
+                          "(redact, embed, faq_match, retrieve, rerank, qa, summarize, read, log, ...)", ["stage"],
+                          buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+
+EMBED_CACHE_EVENTS = Counter("faq_embed_cache_events_total", "Query-embedding cache events", ["event"])
+EMBED_CACHE_ENTRIES = Gauge("faq_embed_cache_entries", "Entries in the query-embedding cache", ["model"])
+EMBED_CACHE_BYTES = Gauge("faq_embed_cache_bytes", "Approximate bytes held by the query-embedding cache", ["model"])
+ANSWER_CACHE_EVENTS = Counter("faq_answer_cache_events_total", "End-to-end answer cache lookups", ["event"])
+SEMANTIC_CACHE_EVENTS = Counter("faq_semantic_cache_events_total", "Near-duplicate answer cache lookups", ["event"])
+RERANK_CACHE_EVENTS = Counter("faq_rerank_cache_events_total", "Cross-encoder (query, chunk) score cache events",
+                              ["event"])
+FAQ_DIRECT_EVENTS = Counter("faq_direct_answer_events_total", "Nearest-question lookups answered directly (hit) "
+                            "or passed to the reader (miss)", ["event"])
+
+GENERATION_TTFT = Histogram("faq_generation_ttft_seconds", "Time from query to the first streamed answer token",
+                            buckets=(.05, .1, .25, .5, 1, 2, 4, 8, 16))
+GENERATION_TOKENS_PER_SECOND = Histogram("faq_generation_tokens_per_second", "Streamed generation speed",
+                                         buckets=(1, 2, 5, 10, 20, 50, 100, 200))
+
+BATCH_SIZE = Histogram("faq_microbatch_size", "Items per coalesced model call", ["batcher"],
+                       buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+BATCH_WAIT = Histogram("faq_microbatch_wait_seconds", "Time an item waited before its batch ran", ["batcher"])
+BATCH_QUEUE_DEPTH = Gauge("faq_microbatch_queue_depth", "Items waiting to be batched", ["batcher"])
+
+WEBHOOK_QUEUE_DEPTH = Gauge("faq_webhook_queue_depth", "WhatsApp questions waiting for a deferred reply")
+WEBHOOK_JOBS = Counter("faq_webhook_jobs_total", "Deferred WhatsApp replies by outcome", ["outcome"])
+WEBHOOK_JOB_LATENCY = Histogram("faq_webhook_job_latency_seconds", "Time from enqueue to reply sent")
+
+LOG_QUEUE_DEPTH = Gauge("faq_log_queue_depth", "Conversation rows waiting to be written")
+
+_server_lock = threading.Lock()
+_server_port = None
+
+
+def start_metrics_server(port: int) -> bool:
+    """Start the /metrics HTTP endpoint once per process; later calls are no-ops."""
+    global _server_port
+    with _server_lock:
+        if _server_port is not None:
+            return False
+        try:
+            start_http_server(port)
+        except OSError as e:
+            # e.g. the ticket API and the webhook on one host: give each its own METRICS_PORT
+            print(f"⚠️ Metrics endpoint not started on port {port}: {e}")
+            return False
+        _server_port = port
+        return True
+
+
+def init_metrics() -> bool:
+    """Start the endpoint on METRICS_PORT when ENABLE_METRICS is set; called by every app / API entry point."""
+    if not config.ENABLE_METRICS:
+        return False
+    return start_metrics_server(config.METRICS_PORT)
@@ -0,0 +1,184 @@
+# rag/model_registry.py
+"""
+Process-wide registry for heavy models and clients.
+
+Streamlit sessions, the Flask services and the CLI scripts all ask this module
+for the embedder / transformers pipelines / Chroma client instead of building
+their own, so each object is loaded once per process and shared by reference.
+Loading is thread-safe: concurrent callers asking for the same key wait for a
+single load, while different keys can load in parallel.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+_entries: Dict[str, Any] = {}
+_stats: Dict[str, Dict] = {}
+_key_locks: Dict[str, threading.Lock] = {}
+_registry_lock = threading.Lock()
+
+
+def _rss_bytes() -> int:
+    """Current resident set size of this process (0 if it can't be read)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        pass
+    try:
+        import resource
+        # ru_maxrss is the peak RSS (KiB on Linux, bytes on macOS) - best effort fallback
+        return int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) * 1024
+    except Exception:
+        return 0
+
+
+def get_or_load(key: str, loader: Callable[[], Any]) -> Any:
+    """
+    Return the object registered under `key`, calling `loader()` the first time.
+    Records load time and the resident-memory delta observed during the load.
+    """
+    obj = _entries.get(key)
+    if obj is not None:
+        return obj
+
+    with _registry_lock:
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+
+    with key_lock:
+        obj = _entries.get(key)
+        if obj is not None:
+            return obj
+        rss_before = _rss_bytes()
+        t0 = time.perf_counter()
+        obj = loader()
+        elapsed = time.perf_counter() - t0
+        rss_after = _rss_bytes()
+        # RSS deltas are approximate when several models load at the same time
+        _stats[key] = {
+            "load_seconds": elapsed,
+            "rss_delta_bytes": max(rss_after - rss_before, 0),
+            "rss_after_bytes": rss_after,
+            "loaded_at": time.time(),
+        }
+        _entries[key] = obj
+        print(f"[model_registry] loaded {key} in {elapsed:.2f}s")
+    return obj
+
+
+_NONE = object()  # registered in place of None: the registry uses None for "not loaded yet"
+
+
+def get_or_load_optional(key: str, loader: Callable[[], Optional[Any]]) -> Optional[Any]:
+    """
+    get_or_load for loaders that may return None (a disabled cache, a missing index);
+    the None is cached too. Compared with `is`, never by truthiness: caches and indexes
+    define __len__ and are falsy while empty.
+    """
+    def _load():
+        obj = loader()
+        return _NONE if obj is None else obj
+    obj = get_or_load(key, _load)
+    return None if obj is _NONE else obj
+
+
+def get_versioned(key: str, version: str, loader: Callable[[], Optional[Any]]) -> Optional[Any]:
+    """
+    get_or_load_optional under `key@version`, for objects built from files on disk (mmap'd
+    indexes and what wraps them). When the version changes the object is loaded again, and
+    older versions are dropped from the registry so their maps are released once the last
+    in-flight caller lets go of them.
+    """
+    current = f"{key}@{version}"
+    if current not in _entries:
+        with _registry_lock:
+            for stale in [k for k in list(_entries) if k.startswith(key + "@") and k != current]:
+                _entries.pop(stale, None)
+                _stats.pop(stale, None)
+                _key_locks.pop(stale, None)
+    return get_or_load_optional(current, loader)
+
+
+def is_loaded(key: str) -> bool:
+    return key in _entries
+
+
+def stats() -> Dict[str, Dict]:
+    """Per-key load statistics: load_seconds, rss_delta_bytes, rss_after_bytes, loaded_at."""
+    return {k: dict(v) for k, v in _stats.items()}
+
+
+def process_rss_bytes() -> int:
+    return _rss_bytes()
+
+
+def clear():
+    """Drop all references (mainly for scripts that want to free memory)."""
+    with _registry_lock:
+        _entries.clear()
+        _stats.clear()
+        _key_locks.clear()
+
+
+# --- Convenience loaders for the models used across the project ---
+
+def _backend(backend: Optional[str]) -> str:
+    if backend:
+        return backend
+    from rag import config
+    return config.INFERENCE_BACKEND
+
+
+def _with_fallback(what: str, backend: str, onnx_loader: Callable[[], Any], torch_loader: Callable[[], Any]) -> Any:
+    try:
+        return onnx_loader()
+    except Exception as e:
+        print(f"⚠️ {backend} backend unavailable for {what} ({e}); falling back to PyTorch.")
+        return torch_loader()
+
+
+def get_embedder(model_name: str, backend: Optional[str] = None):
+    """backend: "torch", "onnx" or "onnx-int8" (defaults to config.INFERENCE_BACKEND)."""
+    backend = _backend(backend)
+    def _load():
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+    if backend == "torch":
+        return get_or_load(f"embedder:{model_name}", _load)
+    from rag import onnx_backend
+    return get_or_load(f"embedder:{model_name}:{backend}", lambda: _with_fallback(
+        model_name, backend, lambda: onnx_backend.load_embedder(model_name, backend), _load))
+
+
+def get_pipeline(task: str, model: str, backend: Optional[str] = None, **kwargs):
+    """Shared transformers pipeline; extra kwargs are part of the cache key."""
+    backend = _backend(backend)
+    kw_key = ",".join(f"{k}={kwargs[k]}" for k in sorted(kwargs))
+    def _load():
+        from transformers import pipeline
+        return pipeline(task, model=model, **kwargs)
+    if backend == "torch":
+        return get_or_load(f"pipeline:{task}:{model}:{kw_key}", _load)
+    from rag import onnx_backend
+    return get_or_load(f"pipeline:{task}:{model}:{kw_key}:{backend}", lambda: _with_fallback(
+        model, backend, lambda: onnx_backend.load_pipeline(task, model, backend, **kwargs), _load))
+
+
+def get_cross_encoder(model_name: str, max_length: int = 512):
+    """Shared sentence-transformers CrossEncoder (reranking); PyTorch only."""
+    def _load():
+        from sentence_transformers import CrossEncoder
+        return CrossEncoder(model_name, max_length=max_length)
+    return get_or_load(f"cross_encoder:{model_name}:{max_length}", _load)
+
+
+def get_chroma_client(persist_dir: str):
+    path = os.path.abspath(persist_dir)
+    def _load():
+        import chromadb
+        return chromadb.PersistentClient(path=path)
+    return get_or_load(f"chroma:{path}", _load)
+
@@ -0,0 +1,149 @@
+# rag/onnx_backend.py
+"""
+ONNX Runtime inference for the embedder and the transformers pipelines.
+
+INFERENCE_BACKEND selects how rag.model_registry loads models:
+  "torch"     - plain PyTorch (default)
+  "onnx"      - exported to ONNX, fp32
+  "onnx-int8" - exported to ONNX with dynamic int8 quantization
+Exports are cached under ONNX_CACHE_DIR/<model>/<backend>/ and reused on the
+next start. Needs `optimum[onnxruntime]`; the registry falls back to PyTorch
+if anything here fails.
+
+    python rag/onnx_backend.py --backend onnx-int8   # pre-export every configured model
+"""
+
+import os
+import sys
+import json
+import glob
+import platform
+from typing import Dict, List, Optional
+
+# task -> optimum ORTModel class name
+ORT_CLASSES = {
+    "question-answering": "ORTModelForQuestionAnswering",
+    "text2text-generation": "ORTModelForSeq2SeqLM",
+    "summarization": "ORTModelForSeq2SeqLM",
+    "feature-extraction": "ORTModelForFeatureExtraction",
+}
+BACKENDS = ("torch", "onnx", "onnx-int8")
+MARKER = "export.json"
+
+
+def artifact_dir(model_name: str, backend: str, cache_dir: Optional[str] = None) -> str:
+    from rag import config
+    slug = model_name.replace("/", "__")
+    return os.path.join(cache_dir or config.ONNX_CACHE_DIR, slug, backend)
+
+
+def _quantization_config():
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return AutoQuantizationConfig.arm64(is_static=False, per_channel=False)
+    return AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+
+
+def _quantize_dir(path: str) -> List[str]:
+    """Dynamically quantize every .onnx file in path; returns the quantized file names."""
+    from optimum.onnxruntime import ORTQuantizer
+    qconfig = _quantization_config()
+    out = []
+    for f in sorted(glob.glob(os.path.join(path, "*.onnx"))):
+        name = os.path.basename(f)
+        if name.endswith("_quantized.onnx"):
+            continue
+        ORTQuantizer.from_pretrained(path, file_name=name).quantize(save_dir=path, quantization_config=qconfig)
+        out.append(name.replace(".onnx", "_quantized.onnx"))
+    return out
+
+
+def _write_marker(path: str, info: Dict):
+    with open(os.path.join(path, MARKER), "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=1)
+
+
+def _read_marker(path: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(path, MARKER), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def export_pipeline_model(task: str, model_name: str, backend: str, cache_dir: Optional[str] = None) -> str:
+    """Export (and optionally quantize) a transformers model once; returns the artifact directory."""
+    path = artifact_dir(model_name, backend, cache_dir)
+    if _read_marker(path):
+        return path
+    import optimum.onnxruntime as ort
+    from transformers import AutoTokenizer
+    print(f"[onnx] exporting {model_name} ({task}, {backend}) to {path} ...")
+    model = getattr(ort, ORT_CLASSES[task]).from_pretrained(model_name, export=True)
+    model.save_pretrained(path)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(path)
+    files = _quantize_dir(path) if backend == "onnx-int8" else []
+    _write_marker(path, {"model": model_name, "task": task, "backend": backend, "quantized_files": files})
+    return path
+
+
+def load_pipeline(task: str, model_name: str, backend: str, **kwargs):
+    """A transformers pipeline backed by ONNX Runtime (same call interface as the PyTorch one)."""
+    import optimum.onnxruntime as ort
+    from optimum.pipelines import pipeline as ort_pipeline
+    from transformers import AutoTokenizer
+    path = export_pipeline_model(task, model_name, backend)
+    files = _read_marker(path).get("quantized_files", [])
+    cls = getattr(ort, ORT_CLASSES[task])
+    load_kw = {}
+    if files and cls.__name__ == "ORTModelForSeq2SeqLM":
+        load_kw["encoder_file_name"] = "encoder_model_quantized.onnx"
+        # newer optimum exports a single merged decoder instead of decoder + decoder_with_past
+        merged = "decoder_model_merged_quantized.onnx"
+        if merged in files:
+            load_kw["decoder_file_name"] = merged
+        else:
+            load_kw["decoder_file_name"] = "decoder_model_quantized.onnx"
+            if "decoder_with_past_model_quantized.onnx" in files:
+                load_kw["decoder_with_past_file_name"] = "decoder_with_past_model_quantized.onnx"
+            else:
+                load_kw["use_cache"] = False
+    elif files:
+        load_kw["file_name"] = files[0]
+    model = cls.from_pretrained(path, **load_kw)
+    kwargs.pop("tokenizer", None)  # the exported tokenizer is saved next to the model
+    kwargs.pop("device", None)     # ONNX Runtime picks its own execution provider
+    return ort_pipeline(task, model=model, tokenizer=AutoTokenizer.from_pretrained(path), accelerator="ort", **kwargs)
+
+
+def load_embedder(model_name: str, backend: str, cache_dir: Optional[str] = None):
+    """SentenceTransformer on its ONNX backend (sentence-transformers >= 3.2); int8 weights are exported once."""
+    from sentence_transformers import SentenceTransformer
+    path = artifact_dir(model_name, backend, cache_dir)
+    info = _read_marker(path)
+    if info is None:
+        print(f"[onnx] exporting embedder {model_name} ({backend}) to {path} ...")
+        model = SentenceTransformer(model_name, backend="onnx")
+        model.save_pretrained(path)
+        file_name = "onnx/model.onnx"
+        if backend == "onnx-int8":
+            from sentence_transformers import export_dynamic_quantized_onnx_model
+            qconfig = "arm64" if platform.machine().lower() in ("arm64", "aarch64") else "avx512_vnni"
+            export_dynamic_quantized_onnx_model(model, qconfig, path)
+            file_name = f"onnx/model_qint8_{qconfig}.onnx"
+        info = {"model": model_name, "task": "sentence-embedding", "backend": backend, "file_name": file_name}
+        _write_marker(path, info)
+    return SentenceTransformer(path, backend="onnx", model_kwargs={"file_name": info["file_name"]})
+
+
+if __name__ == "__main__":
+    import argparse
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+    from rag import config
+    parser = argparse.ArgumentParser(description="Export the configured models to ONNX (cached under ONNX_CACHE_DIR)")
+    parser.add_argument("--backend", choices=BACKENDS[1:], default="onnx-int8")
+    args = parser.parse_args()
+    load_embedder(config.EMBED_MODEL, args.backend)
+    export_pipeline_model("question-answering", config.QA_MODEL, args.backend)
+    export_pipeline_model("text2text-generation", config.SUMMARIZER_MODEL, args.backend)
+    print(f"✅ Exported to {config.ONNX_CACHE_DIR}/")
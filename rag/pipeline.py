@@ -0,0 +1,770 @@
+# rag/pipeline.py
+"""
+Retriever/reader pipeline shared by every entry point (Streamlit apps, Flask webhook, eval scripts).
+
+    query -> embed (cached) -> FAQ question match -> retriever.search (dense [+ BM25])
+          -> [cross-encoder rerank] -> reader.read -> answer
+
+The retriever backend ("chroma", "local", "pinecone", "langchain") and the reader
+("extractive", "summarize", "retrieval") are chosen by rag.config / env vars or
+by arguments to get_pipeline(). Every answer carries per-stage timings, and the
+exact + semantic answer caches sit in front of the whole pipeline. Queries that
+closely match a question from a Q/A-formatted doc get its stored answer directly.
+"""
+
+import os
+import time
+import hashlib
+import atexit
+import threading
+from typing import Dict, Iterator, List, Optional
+
+from rag import config, answer_cache, semantic_cache
+from rag.cache import LRUCache
+from rag.metrics import (REQUESTS, LATENCY, EMBED_CACHE_EVENTS, EMBED_CACHE_ENTRIES, EMBED_CACHE_BYTES,
+                         ANSWER_CACHE_EVENTS, SEMANTIC_CACHE_EVENTS, FAQ_DIRECT_EVENTS, RERANK_CACHE_EVENTS,
+                         GENERATION_TTFT, GENERATION_TOKENS_PER_SECOND)
+from rag.model_registry import (get_embedder, get_pipeline as get_hf_pipeline, get_chroma_client, get_or_load,
+                                get_or_load_optional, get_versioned, get_cross_encoder)
+from rag.batching import get_batcher
+from rag.tracing import trace, record, start_trace, end_trace
+from rag.retrievers import ChromaRetriever, LocalRetriever, PineconeRetriever, LangChainRetriever, HybridRetriever
+
+NO_ANSWER = "Sorry — I don't have that info. Please contact support."
+MAX_CONTEXT_CHARS = 1200  # retrieval-only answers / summarizer fallback
+
+
+# --- Query embedding ---
+
+class QueryEmbedder:
+    """Encodes queries with the shared SentenceTransformer behind a bounded LRU cache."""
+
+    def __init__(self, model_name: str = config.EMBED_MODEL):
+        self.model_name = model_name
+        self.model = get_embedder(model_name)
+        self.cache = LRUCache(
+            max_entries=config.EMBED_CACHE_MAX_ENTRIES,
+            max_bytes=config.EMBED_CACHE_MAX_BYTES,
+            ttl=config.EMBED_CACHE_TTL,
+            on_event=lambda event: EMBED_CACHE_EVENTS.labels(event=event).inc(),
+        )
+        EMBED_CACHE_ENTRIES.labels(model=model_name).set_function(lambda: len(self.cache))
+        EMBED_CACHE_BYTES.labels(model=model_name).set_function(lambda: self.cache.nbytes)
+        if config.EMBED_CACHE_PATH:
+            loaded = self.cache.load(config.EMBED_CACHE_PATH)
+            print(f"Loaded {loaded} cached query embeddings from {config.EMBED_CACHE_PATH}")
+            atexit.register(self.cache.save, config.EMBED_CACHE_PATH)
+
+    @property
+    def dim(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def _encode_batch(self, texts: List[str]):
+        return list(self.model.encode(texts, convert_to_numpy=True))
+
+    def _encode(self, texts: List[str]):
+        # concurrent callers are coalesced into one encode call when micro-batching is on
+        batcher = get_batcher(f"embed:{self.model_name}", self._encode_batch)
+        return batcher.map(texts) if batcher is not None else self._encode_batch(texts)
+
+    def _key(self, text: str) -> str:
+        return f"{self.model_name}|{text.strip().lower()}"
+
+    def embed(self, text: str) -> List[float]:
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Cached vectors are reused; the misses are encoded in a single batched call."""
+        sentinel = object()
+        out = [self.cache.get(self._key(t), sentinel) for t in texts]
+        missing = [i for i, v in enumerate(out) if v is sentinel]
+        if missing:
+            vectors = self._encode([texts[i] for i in missing])
+            for i, vec in zip(missing, vectors):
+                out[i] = vec.tolist()
+                self.cache.set(self._key(texts[i]), out[i])
+        return out
+
+
+def get_query_embedder(model_name: str = config.EMBED_MODEL) -> QueryEmbedder:
+    return get_or_load(f"query_embedder:{model_name}", lambda: QueryEmbedder(model_name))
+
+
+# --- Readers ---
+
+class Reader:
+    name = "base"
+    stage = "read"  # tracing stage name for this reader's work
+
+    def read(self, query: str, docs: List[Dict]) -> Dict:
+        """Returns {"answer", "score"}; may add "fallback": True when the result should not be cached."""
+        raise NotImplementedError
+
+    def read_batch(self, queries: List[str], docs_list: List[List[Dict]]) -> List[Dict]:
+        return [self.read(q, docs) for q, docs in zip(queries, docs_list)]
+
+    def stream(self, query: str, docs: List[Dict], result: Dict) -> Iterator[str]:
+        """Yield the answer text in pieces; fills result with the read() fields. Non-generative: one piece."""
+        result.update(self.read(query, docs))
+        yield result["answer"]
+
+
+def _top_score(docs: List[Dict]) -> float:
+    return float(docs[0].get("score") or 0.0) if docs else 0.0
+
+
+def _rank_key(doc: Dict) -> float:
+    """Best-first order of a retrieved chunk: reranker score, else fused hybrid score, else dense score."""
+    return doc.get("rerank_score", doc.get("fused_score", doc.get("score") or 0.0))
+
+
+class RetrievalOnlyReader(Reader):
+    """No model: the answer is the joined top snippets."""
+    name = "retrieval"
+
+    def read(self, query: str, docs: List[Dict]) -> Dict:
+        context = "\n\n".join(d["text"] for d in docs if d.get("text"))
+        return {"answer": context[:MAX_CONTEXT_CHARS], "score": _top_score(docs)}
+
+
+# describe one run, not the answer: never stored in the answer caches
+PER_REQUEST_FIELDS = ("timings", "tokens", "tokens_per_second")
+STREAM_TIMEOUT_SECONDS = 60.0  # longest wait for the next generated piece before giving up
+
+
+def _counting_streamer(*args, **kwargs):
+    """TextIteratorStreamer that counts generated tokens and ends the stream if generate() raises."""
+    from transformers import TextIteratorStreamer
+
+    class CountingStreamer(TextIteratorStreamer):
+        def __init__(self, *a, **kw):
+            super().__init__(*a, **kw)
+            self.generated = 0
+            self.error = None
+
+        def put(self, value):
+            if not (self.skip_prompt and self.next_tokens_are_prompt):
+                self.generated += int(value.numel())
+            super().put(value)
+
+        def run(self, generate, **kwargs):
+            try:
+                generate(streamer=self, **kwargs)
+            except Exception as e:
+                self.error = e
+                self.end()
+
+    return CountingStreamer(*args, **kwargs)
+
+
+class SummarizerReader(Reader):
+    """FLAN-T5 generates a short answer from the retrieved snippets."""
+    name = "summarize"
+    stage = "summarize"
+
+    def __init__(self, model_name: str = config.SUMMARIZER_MODEL, max_new_tokens: int = 128):
+        self.model_name = model_name
+        self.max_new_tokens = max_new_tokens
+
+    @property
+    def model(self):
+        # lazy: only loaded on the first summarized answer
+        return get_hf_pipeline("text2text-generation", self.model_name, device=-1, max_new_tokens=self.max_new_tokens)
+
+    @staticmethod
+    def build_prompt(query: str, context: str) -> str:
+        return f"Use the following context to answer the question succinctly.\n\nContext:\n{context}\n\nQuestion: {query}\nAnswer:"
+
+    def _generate(self, prompts: List[str]) -> List[str]:
+        outs = self.model(prompts, max_new_tokens=self.max_new_tokens, batch_size=len(prompts))
+        return [(o[0] if isinstance(o, list) else o)["generated_text"].strip() for o in outs]
+
+    def read(self, query: str, docs: List[Dict]) -> Dict:
+        return self.read_batch([query], [docs])[0]
+
+    def stream(self, query: str, docs: List[Dict], result: Dict) -> Iterator[str]:
+        """
+        Yield text as FLAN-T5 generates it (TextIteratorStreamer, generate() on a helper
+        thread). result gets "answer", "score" and "tokens" (generated token count). If the
+        model can't stream (e.g. an ONNX pipeline) or fails before the first piece, this
+        falls back to the blocking read() and yields its answer in one piece.
+        """
+        context = "\n\n".join(d["text"] for d in docs if d.get("text"))
+        try:
+            pipe = self.model
+            streamer = _counting_streamer(pipe.tokenizer, skip_prompt=True, skip_special_tokens=True,
+                                         timeout=STREAM_TIMEOUT_SECONDS)
+            inputs = pipe.tokenizer(self.build_prompt(query, context), return_tensors="pt", truncation=True)
+            inputs = {k: inputs[k].to(pipe.model.device) for k in ("input_ids", "attention_mask") if k in inputs}
+            worker = threading.Thread(target=streamer.run, args=(pipe.model.generate,),
+                                      kwargs=dict(inputs, max_new_tokens=self.max_new_tokens),
+                                      name="summarize-stream", daemon=True)
+            worker.start()
+            pieces = (p for p in streamer if p)
+            first = next(pieces, None)
+        except Exception as e:
+            print(f"⚠️ Streaming generation unavailable ({e}); answering without streaming.")
+            first = None
+        if first is None:  # nothing streamed (no streaming support, error or empty output)
+            result.update(self.read(query, docs))
+            yield result["answer"]
+            return
+
+        text = [first]
+        yield first
+        try:
+            for piece in pieces:
+                text.append(piece)
+                yield piece
+        except Exception as e:  # queue.Empty after STREAM_TIMEOUT_SECONDS without a new piece
+            streamer.error = streamer.error or e
+        if streamer.error is not None:
+            print(f"⚠️ Streaming generation stopped early ({streamer.error!r}); keeping the partial answer.")
+        result.update(answer="".join(text).strip(), score=_top_score(docs), tokens=streamer.generated)
+
+    def read_batch(self, queries: List[str], docs_list: List[List[Dict]]) -> List[Dict]:
+        contexts = ["\n\n".join(d["text"] for d in docs if d.get("text")) for docs in docs_list]
+        try:
+            prompts = [self.build_prompt(q, c) for q, c in zip(queries, contexts)]
+            batcher = get_batcher(f"summarize:{self.model_name}", self._generate)
+            outs = batcher.map(prompts) if batcher is not None else self._generate(prompts)
+            return [{"answer": o, "score": _top_score(docs)} for o, docs in zip(outs, docs_list)]
+        except Exception:
+            # if summarizer fails, fallback to raw context
+            return [{"answer": c[:MAX_CONTEXT_CHARS], "score": _top_score(docs), "fallback": True}
+                    for c, docs in zip(contexts, docs_list)]
+
+
+class ExtractiveReader(Reader):
+    """
+    Extractive QA (DistilBERT SQuAD) over the retrieved chunks.
+
+    Per-chunk mode (default): every retrieved chunk above min_retrieval_score is a
+    separate element of one batched forward pass and the best span across chunks
+    wins. When the top chunk's retrieval score reaches early_exit_score it is read
+    alone first; a short answer from it ends the read. per_chunk=False restores
+    the old behaviour of answering over the concatenated chunks.
+    """
+    name = "extractive"
+    stage = "qa"
+
+    def __init__(self, model_name: str = config.QA_MODEL, per_chunk: bool = config.QA_PER_CHUNK,
+                 min_retrieval_score: float = config.QA_MIN_RETRIEVAL_SCORE,
+                 early_exit_score: float = config.QA_EARLY_EXIT_SCORE,
+                 short_answer_words: int = config.QA_SHORT_ANSWER_WORDS):
+        self.model_name = model_name
+        self.per_chunk = per_chunk
+        self.min_retrieval_score = min_retrieval_score
+        self.early_exit_score = early_exit_score
+        self.short_answer_words = short_answer_words
+        self.early_exits = 0
+        self.chunks_read = 0
+        self.chunks_skipped = 0
+        self._stats_lock = threading.Lock()  # read_batch runs on concurrent request threads
+
+    @property
+    def model(self):
+        return get_hf_pipeline("question-answering", self.model_name, tokenizer=self.model_name, device=-1)
+
+    def read(self, query: str, docs: List[Dict]) -> Dict:
+        return self.read_batch([query], [docs])[0]
+
+    def read_batch(self, queries: List[str], docs_list: List[List[Dict]]) -> List[Dict]:
+        if not self.per_chunk:
+            inputs = [{"question": q, "context": "\n".join(d["text"] for d in docs)} for q, docs in zip(queries, docs_list)]
+            return [{"answer": o["answer"], "score": float(o["score"])} for o in self._run(inputs)]
+
+        # chunks worth reading per query, best retrieval score first; the top chunk is always kept
+        candidates, skipped = [], 0
+        for docs in docs_list:
+            # hybrid retrieval orders by the fused score; "score" stays the dense similarity
+            ranked = sorted((d for d in docs if d.get("text")), key=_rank_key, reverse=True)
+            keep = ranked[:1] + [d for d in ranked[1:] if (d.get("score") or 0.0) >= self.min_retrieval_score]
+            skipped += len(docs) - len(keep)
+            candidates.append(keep)
+
+        best: List[Optional[Dict]] = [None] * len(queries)
+        # pass 1: confident queries read only their top chunk; everything else reads all candidates
+        first = [c[:1] if c and _top_score(c) >= self.early_exit_score else c for c in candidates]
+        self._read_chunks(queries, first, best)
+        rest, early_exits = [], 0
+        for i, c in enumerate(candidates):
+            if len(first[i]) == len(c):
+                rest.append([])
+            elif best[i] is not None and len(best[i]["answer"].split()) <= self.short_answer_words:
+                early_exits += 1
+                rest.append([])
+            else:
+                rest.append(c[1:])
+        with self._stats_lock:
+            self.chunks_skipped += skipped
+            self.early_exits += early_exits
+        # pass 2: the confident queries whose top chunk gave no short answer read the remaining chunks
+        if any(rest):
+            self._read_chunks(queries, rest, best)
+        return [b if b is not None else {"answer": NO_ANSWER, "score": 0.0} for b in best]
+
+    def _read_chunks(self, queries: List[str], chunks_list: List[List[Dict]], best: List[Optional[Dict]]):
+        """One batched QA call over every (query, chunk) pair; keeps the best span per query in best."""
+        owners, inputs = [], []
+        for i, chunks in enumerate(chunks_list):
+            for d in chunks:
+                owners.append((i, d))
+                inputs.append({"question": queries[i], "context": d["text"]})
+        if not inputs:
+            return
+        with self._stats_lock:
+            self.chunks_read += len(inputs)
+        for (i, d), o in zip(owners, self._run(inputs)):
+            score = float(o["score"])
+            if o.get("answer", "").strip() and (best[i] is None or score > best[i]["score"]):
+                best[i] = {"answer": o["answer"], "score": score, "chunk_id": d.get("id")}
+
+    def _run(self, inputs: List[Dict]) -> List[Dict]:
+        batcher = get_batcher(f"qa:{self.model_name}", self._answer)
+        return batcher.map(inputs) if batcher is not None else self._answer(inputs)
+
+    def _answer(self, inputs: List[Dict]) -> List[Dict]:
+        outs = self.model(inputs, batch_size=len(inputs))
+        return [outs] if isinstance(outs, dict) else list(outs)
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            return {"chunks_read": self.chunks_read, "chunks_skipped": self.chunks_skipped,
+                    "early_exits": self.early_exits}
+
+
+READERS = {
+    "extractive": ExtractiveReader,
+    "summarize": SummarizerReader,
+    "retrieval": RetrievalOnlyReader,
+}
+
+
+# --- Reranking ---
+
+class CrossEncoderReranker:
+    """
+    Scores (query, chunk) pairs with a small cross-encoder and keeps the best top_n
+    chunks, so the reader gets one or two chunks instead of every retrieved one.
+    All pairs of a batch go through one predict call; scores are cached per
+    (query, chunk id, SHA-1 of the chunk text) so repeated and near-repeated traffic skips the model.
+    """
+    name = "rerank"
+
+    def __init__(self, model_name: str = config.RERANK_MODEL, top_n: int = config.RERANK_TOP_N,
+                 candidates: int = config.RERANK_CANDIDATES, cache_entries: int = config.RERANK_CACHE_MAX_ENTRIES):
+        self.model_name = model_name
+        self.top_n = top_n
+        self.candidates = candidates
+        self.cache = LRUCache(max_entries=cache_entries,
+                              on_event=lambda event: RERANK_CACHE_EVENTS.labels(event=event).inc())
+
+    @property
+    def model(self):
+        return get_cross_encoder(self.model_name)
+
+    def _predict(self, pairs: List[tuple]) -> List[float]:
+        return [float(s) for s in self.model.predict(pairs, batch_size=max(len(pairs), 1), show_progress_bar=False)]
+
+    @staticmethod
+    def _key(query: str, doc: Dict) -> tuple:
+        # a content digest, not hash(): no 64-bit collisions handing one chunk another's score
+        text = doc.get("text", "").encode("utf-8")
+        return (query.strip().lower(), doc.get("id"), hashlib.sha1(text).hexdigest())
+
+    def rerank_batch(self, queries: List[str], docs_list: List[List[Dict]], top_n: Optional[int] = None) -> List[List[Dict]]:
+        top_n = top_n or self.top_n
+        sentinel = object()
+        scores = [[self.cache.get(self._key(q, d), sentinel) for d in docs] for q, docs in zip(queries, docs_list)]
+        missing = [(i, j) for i, row in enumerate(scores) for j, s in enumerate(row) if s is sentinel]
+        if missing:
+            pairs = [(queries[i], docs_list[i][j].get("text", "")) for i, j in missing]
+            batcher = get_batcher(f"rerank:{self.model_name}", self._predict)
+            predicted = batcher.map(pairs) if batcher is not None else self._predict(pairs)
+            for (i, j), s in zip(missing, predicted):
+                scores[i][j] = s
+                self.cache.set(self._key(queries[i], docs_list[i][j]), s)
+        out = []
+        for docs, row in zip(docs_list, scores):
+            ranked = sorted((dict(d, rerank_score=s) for d, s in zip(docs, row)), key=lambda d: -d["rerank_score"])
+            out.append(ranked[:top_n])
+        return out
+
+
+# --- Direct FAQ answers ---
+
+class FAQMatcher:
+    """
+    Nearest-question lookup over the question index written by build_embeddings.py
+    (one row per FAQ question/paraphrase, answer in the metadata). A match at or
+    above threshold is answered with the stored answer and skips retrieval and the reader.
+    """
+
+    def __init__(self, index, threshold: float = config.FAQ_DIRECT_THRESHOLD):
+        self.index = index
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.hits = 0
+
+    def match_batch(self, vectors: List[List[float]]) -> List[Optional[Dict]]:
+        """Per query vector, a ready answer dict for a direct hit or None."""
+        out = []
+        for top in self.index.search(vectors, top_k=1):
+            row, score = top[0] if top else (None, 0.0)
+            if row is None or score < self.threshold:
+                out.append(None)
+                continue
+            m = self.index.metadata[row]
+            # Q/A docs are chunked one pair per chunk, so the pair index is also the chunk index
+            source = {"id": m["id"], "text": f"Q: {m['question']}\nA: {m['answer']}", "source": m["source"],
+                      "chunk_index": m["pair_index"], "score": score}
+            out.append({"answer": m["answer"], "score": score, "direct": True, "matched_question": m["question"],
+                        "sources": [source]})
+        hits = sum(o is not None for o in out)
+        FAQ_DIRECT_EVENTS.labels(event="hit").inc(hits)
+        FAQ_DIRECT_EVENTS.labels(event="miss").inc(len(out) - hits)
+        with self._lock:
+            self.checks += len(out)
+            self.hits += hits
+        return out
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"checks": self.checks, "hits": self.hits,
+                    "hit_rate": self.hits / self.checks if self.checks else 0.0, "questions": len(self.index)}
+
+
+def load_faq_matcher(model_name: str = config.EMBED_MODEL) -> Optional[FAQMatcher]:
+    """The question index from LOCAL_INDEX_DIR, or None when disabled, missing or built with another model."""
+    if not config.FAQ_DIRECT_ENABLED:
+        return None
+    from rag.local_index import LocalIndex
+    try:
+        index = LocalIndex.load(config.LOCAL_INDEX_DIR, config.FAQ_QA_INDEX_NAME)
+    except FileNotFoundError:
+        return None
+    if index.model and index.model != model_name:
+        print(f"⚠️ FAQ question index was built with {index.model}, queries use {model_name}; direct answers off.")
+        return None
+    return FAQMatcher(index)
+
+
+# --- Pipeline ---
+
+class RAGPipeline:
+    def __init__(self, retriever, reader: Reader, embedder: QueryEmbedder,
+                 answer_cache: Optional[answer_cache.AnswerCache] = None,
+                 semantic_cache: Optional[semantic_cache.SemanticCache] = None,
+                 faq: Optional[FAQMatcher] = None, reranker: Optional[CrossEncoderReranker] = None):
+        self.retriever = retriever
+        self.reader = reader
+        self.embedder = embedder
+        self.answer_cache = answer_cache
+        self.semantic_cache = semantic_cache
+        self.faq = faq
+        self.reranker = reranker
+        self.name = f"{retriever.name}/{reader.name}" + ("+rerank" if reranker is not None else "")
+
+    def faq_stats(self) -> Dict:
+        """How often the direct-answer fast path fired (empty when there is no question index)."""
+        return self.faq.stats() if self.faq is not None else {}
+
+    def _cache_args(self, top_k: int):
+        return {"top_k": top_k, "summarize": self.reader.name == "summarize", "variant": self.name}
+
+    def _lookup(self, query: str, top_k: int, timings: Dict) -> Optional[Dict]:
+        """Exact cache, then (after embedding) the semantic cache. Returns a cached result or None."""
+        if self.answer_cache is not None:
+            cached = self.answer_cache.get(query, **self._cache_args(top_k))
+            ANSWER_CACHE_EVENTS.labels(event="hit" if cached is not None else "miss").inc()
+            if cached is not None:
+                return dict(cached, cached=True)
+        if self.semantic_cache is not None:
+            t = time.perf_counter()
+            qv = self.embedder.embed(query)
+            timings["embed"] = time.perf_counter() - t
+            record("embed", timings["embed"])
+            hit = self.semantic_cache.lookup(qv, f"{self.name}|{top_k}")
+            SEMANTIC_CACHE_EVENTS.labels(event="hit" if hit is not None else "miss").inc()
+            if hit is not None:
+                value, similarity = hit
+                if self.answer_cache is not None:
+                    self.answer_cache.set(query, value=value, **self._cache_args(top_k))
+                return dict(value, cached=True, similarity=similarity)
+        return None
+
+    def _store(self, query: str, top_k: int, result: Dict):
+        if result.get("fallback"):
+            return
+        value = {k: v for k, v in result.items() if k not in PER_REQUEST_FIELDS}
+        if self.answer_cache is not None:
+            self.answer_cache.set(query, value=value, **self._cache_args(top_k))
+        if self.semantic_cache is not None:
+            self.semantic_cache.add(self.embedder.embed(query), f"{self.name}|{top_k}", value)
+
+    def _match_faq(self, vectors, timings: Dict) -> List[Optional[Dict]]:
+        t = time.perf_counter()
+        direct = self.faq.match_batch(vectors)
+        timings["faq_match"] = time.perf_counter() - t
+        record("faq_match", timings["faq_match"])
+        return direct
+
+    def _retrieve(self, texts: List[str], vectors, top_k: int, timings: Dict) -> List[List[Dict]]:
+        """Retriever search, then the optional rerank down to the chunks the reader will see."""
+        t = time.perf_counter()
+        if self.reranker is None:
+            docs_list = self.retriever.search_batch(vectors, top_k, texts)
+        else:
+            # wide, cheap candidate set; the cross-encoder keeps the best few for the reader
+            docs_list = self.retriever.search_batch(vectors, max(top_k, self.reranker.candidates), texts)
+        timings["retrieve"] = time.perf_counter() - t
+        record("retrieve", timings["retrieve"])
+
+        if self.reranker is not None:
+            t = time.perf_counter()
+            docs_list = self.reranker.rerank_batch(texts, docs_list, min(self.reranker.top_n, top_k))
+            timings["rerank"] = time.perf_counter() - t
+            record("rerank", timings["rerank"])
+        return docs_list
+
+    def answer(self, query: str, top_k: int = config.TOP_K) -> Dict:
+        return self.answer_batch([query], top_k)[0]
+
+    def answer_batch(self, queries: List[str], top_k: int = config.TOP_K) -> List[Dict]:
+        """
+        Answer several queries with one batched embed / search / read pass for the cache misses.
+        Each result has "answer", "score", "sources", "timings" (seconds per stage) and "request_id";
+        direct FAQ matches also have "direct": True and "matched_question".
+        """
+        with trace("answer", pipeline=self.name, queries=len(queries)) as tr:
+            results = self._answer_batch(queries, top_k)
+        for r in results:
+            r["request_id"] = tr.request_id
+        return results
+
+    def answer_stream(self, query: str, top_k: int = config.TOP_K) -> Iterator[Dict]:
+        """
+        Streaming answer as a sequence of events:
+          {"type": "sources", "sources", "request_id"}  as soon as retrieval is done
+          {"type": "token", "text"}                     per generated piece (one piece for non-generative readers,
+                                                        cached and direct FAQ answers)
+          {"type": "done", **result}                    the same dict answer() returns, plus "ttft" in
+                                                        timings and "tokens_per_second" when generated
+        """
+        tr, token = start_trace("answer_stream", pipeline=self.name)
+        try:
+            t_start = time.perf_counter()
+            REQUESTS.inc()
+            timings = {}
+            result = self._lookup(query, top_k, timings)
+            if result is None:
+                t = time.perf_counter()
+                vector = self.embedder.embed_batch([query])[0]
+                timings["embed"] = time.perf_counter() - t
+                record("embed", timings["embed"])
+                if self.faq is not None:
+                    result = self._match_faq([vector], timings)[0]
+            if result is not None:
+                yield {"type": "sources", "sources": result.get("sources", []), "request_id": tr.request_id}
+                yield {"type": "token", "text": result["answer"]}
+            else:
+                docs = self._retrieve([query], [vector], top_k, timings)[0]
+                yield {"type": "sources", "sources": docs, "request_id": tr.request_id}
+                result = {}
+                t = time.perf_counter()
+                first_at = None
+                if docs:
+                    for piece in self.reader.stream(query, docs, result):
+                        if first_at is None:
+                            first_at = time.perf_counter()
+                            timings["ttft"] = first_at - t_start
+                            GENERATION_TTFT.observe(timings["ttft"])
+                        yield {"type": "token", "text": piece}
+                else:
+                    result.update(answer=NO_ANSWER, score=0.0)
+                    yield {"type": "token", "text": NO_ANSWER}
+                timings["read"] = time.perf_counter() - t
+                record(self.reader.stage, timings["read"])
+                if result.get("tokens") and first_at is not None:
+                    gen_seconds = time.perf_counter() - first_at
+                    if gen_seconds > 0:
+                        result["tokens_per_second"] = result["tokens"] / gen_seconds
+                        GENERATION_TOKENS_PER_SECOND.observe(result["tokens_per_second"])
+                result = dict(result, sources=docs)
+                self._store(query, top_k, dict(result, timings=timings))
+            timings = dict(result.get("timings", {}), **timings)
+            timings["total"] = time.perf_counter() - t_start
+            LATENCY.observe(timings["total"])
+            yield dict(result, type="done", timings=timings, request_id=tr.request_id)
+        finally:
+            end_trace(tr, token)
+
+    def _answer_batch(self, queries: List[str], top_k: int) -> List[Dict]:
+        t_start = time.perf_counter()
+        REQUESTS.inc(len(queries))
+        results: List[Optional[Dict]] = [None] * len(queries)
+        lookup_timings = [{} for _ in queries]
+        for i, q in enumerate(queries):
+            results[i] = self._lookup(q, top_k, lookup_timings[i])
+        todo = [i for i, r in enumerate(results) if r is None]
+
+        if todo:
+            timings = {}
+            t = time.perf_counter()
+            vectors = self.embedder.embed_batch([queries[i] for i in todo])
+            timings["embed"] = time.perf_counter() - t
+            record("embed", timings["embed"])
+
+            if self.faq is not None:
+                direct = self._match_faq(vectors, timings)
+                for i, d in zip(todo, direct):
+                    if d is not None:
+                        results[i] = dict(d, timings=dict(timings))
+                vectors = [v for v, d in zip(vectors, direct) if d is None]
+                todo = [i for i, d in zip(todo, direct) if d is None]
+
+        if todo:
+            docs_list = self._retrieve([queries[i] for i in todo], vectors, top_k, timings)
+
+            t = time.perf_counter()
+            with_docs = [j for j, docs in enumerate(docs_list) if docs]
+            reads = self.reader.read_batch([queries[todo[j]] for j in with_docs], [docs_list[j] for j in with_docs]) if with_docs else []
+            read_of = dict(zip(with_docs, reads))
+            timings["read"] = time.perf_counter() - t
+            record(self.reader.stage, timings["read"])
+
+            for j, i in enumerate(todo):
+                out = read_of.get(j, {"answer": NO_ANSWER, "score": 0.0})
+                results[i] = dict(out, sources=docs_list[j], timings=dict(timings))
+                self._store(queries[i], top_k, results[i])
+
+        total = time.perf_counter() - t_start
+        for i, r in enumerate(results):
+            r.setdefault("timings", {}).update(lookup_timings[i])
+            r["timings"]["total"] = total
+            LATENCY.observe(total / len(queries))
+        return results
+
+
+# --- Factories ---
+
+def index_version_path(backend: str) -> str:
+    if backend == "local":
+        return os.path.join(config.LOCAL_INDEX_DIR, f"{config.COLLECTION_NAME}.meta.json")
+    if backend == "pinecone":
+        return config.PINECONE_VERSION_PATH
+    return os.path.join(config.CHROMA_DIR, f"{config.COLLECTION_NAME}.manifest.json")
+
+
+def build_retriever(backend: str = config.RETRIEVER_BACKEND):
+    if backend == "local":
+        from rag.local_index import LocalIndex
+        return LocalRetriever(LocalIndex.load(config.LOCAL_INDEX_DIR, config.COLLECTION_NAME))
+    if backend == "chroma":
+        client = get_chroma_client(config.CHROMA_DIR)
+        try:
+            collection = client.get_collection(name=config.COLLECTION_NAME)
+        except Exception:
+            raise ValueError(f"Collection '{config.COLLECTION_NAME}' not found. Run build_embeddings.py first.")
+        return ChromaRetriever(collection)
+    if backend == "pinecone":
+        if not config.PINECONE_API_KEY or not config.PINECONE_INDEX_NAME:
+            raise ValueError("Set PINECONE_API_KEY and PINECONE_INDEX_NAME in env or secrets.json")
+        from pinecone import Pinecone
+        pc = get_or_load(f"pinecone:{config.PINECONE_INDEX_NAME}:client", lambda: Pinecone(api_key=config.PINECONE_API_KEY))
+        index = get_or_load(f"pinecone:{config.PINECONE_INDEX_NAME}:index", lambda: pc.Index(config.PINECONE_INDEX_NAME))
+        return PineconeRetriever(index)
+    if backend == "langchain":
+        from langchain_community.embeddings import SentenceTransformerEmbeddings
+        from langchain_community.vectorstores import Chroma
+        vectordb = Chroma(
+            persist_directory=config.CHROMA_DIR,
+            embedding_function=SentenceTransformerEmbeddings(model_name=config.EMBED_MODEL),
+            collection_name=config.COLLECTION_NAME,
+            collection_metadata={"hnsw:space": "cosine"},  # same space as build_embeddings.py
+        )
+        return LangChainRetriever(vectordb)
+    raise ValueError(f"Unknown retriever backend '{backend}' (expected chroma, local, pinecone or langchain)")
+
+
+def build_hybrid(retriever, index_dir: str = config.LOCAL_INDEX_DIR):
+    """Wrap a dense retriever with the BM25 index when hybrid retrieval is on and the index exists."""
+    if not config.HYBRID_ENABLED:
+        return retriever
+    from rag.bm25_index import BM25Index
+    try:
+        lexical = BM25Index.load(index_dir, config.COLLECTION_NAME)
+    except FileNotFoundError:
+        return retriever
+    return HybridRetriever(retriever, lexical, fusion=config.HYBRID_FUSION, alpha=config.HYBRID_ALPHA,
+                           rrf_k=config.HYBRID_RRF_K, candidates=config.HYBRID_CANDIDATES)
+
+
+def build_reader(kind: str = config.READER) -> Reader:
+    if kind not in READERS:
+        raise ValueError(f"Unknown reader '{kind}' (expected one of {', '.join(READERS)})")
+    return READERS[kind]()
+
+
+def _index_version(path: str) -> str:
+    """Current version of the index behind `path` (fingerprint or mtime, see answer_cache.FileVersion)."""
+    return get_or_load(f"index_version:{path}", lambda: answer_cache.FileVersion(path))()
+
+
+def get_pipeline(backend: Optional[str] = None, reader: Optional[str] = None) -> RAGPipeline:
+    """
+    Process-wide pipeline for (backend, reader); retrievers, models and caches are shared.
+    Index-backed parts are registered under the version of their files, so after a rebuild
+    (build_embeddings.py os.replace()s the files) the next call loads the new index instead
+    of serving the old, still-mapped one.
+    """
+    backend = (backend or config.RETRIEVER_BACKEND).lower()
+    reader = (reader or config.READER).lower()
+    from rag.bm25_index import bm25_paths
+    from rag.local_index import index_paths
+    index_dir = config.LOCAL_INDEX_DIR
+    vpath = index_version_path(backend)
+    dense_v = _index_version(vpath)
+    lexical_v = _index_version(bm25_paths(index_dir, config.COLLECTION_NAME)[2]) if config.HYBRID_ENABLED else "off"
+    faq_v = _index_version(index_paths(index_dir, config.FAQ_QA_INDEX_NAME)[1]) if config.FAQ_DIRECT_ENABLED else "off"
+
+    def _build():
+        retriever = get_versioned(f"retriever:{backend}", dense_v, lambda: build_retriever(backend))
+        retriever = get_versioned(f"hybrid_retriever:{backend}", f"{dense_v}:{lexical_v}",
+                                  lambda: build_hybrid(retriever, index_dir))
+        embedder = get_query_embedder()
+        # the answer caches outlive index rebuilds; they drop stale entries themselves via the version
+        version = get_or_load(f"index_version:{vpath}", lambda: answer_cache.FileVersion(vpath))
+        exact = get_or_load_optional(f"answer_cache:{vpath}", lambda: answer_cache.from_env(version))
+        semantic = get_or_load_optional(f"semantic_cache:{vpath}",
+                                        lambda: semantic_cache.from_env(embedder.dim, version))
+        faq = get_versioned(f"faq_matcher:{index_dir}", faq_v, load_faq_matcher)
+        reranker = (get_or_load(f"reranker:{config.RERANK_MODEL}", CrossEncoderReranker)
+                    if config.RERANK_ENABLED else None)
+        return RAGPipeline(retriever, build_reader(reader), embedder, exact, semantic, faq, reranker)
+
+    return get_versioned(f"rag_pipeline:{backend}:{reader}", f"{dense_v}:{lexical_v}:{faq_v}", _build)
+
+
+def warm_up(backend: Optional[str] = None, reader: Optional[str] = None) -> RAGPipeline:
+    """Build the pipeline and load its models (embedder + reader) so the first real query doesn't pay for it."""
+    pipe = get_pipeline(backend, reader)
+    pipe.embedder.embed("warm up")
+    getattr(pipe.reader, "model", None)  # readers load their model lazily on first access
+    if pipe.reranker is not None:
+        pipe.reranker.model
+    return pipe
+
+
+def start_warmup(backend: Optional[str] = None, reader: Optional[str] = None) -> threading.Thread:
+    """warm_up() on a daemon thread; failures are printed, the first query then loads on demand."""
+    def _run():
+        try:
+            warm_up(backend, reader)
+        except Exception as e:
+            print(f"⚠️ Warm-up of {backend or config.RETRIEVER_BACKEND}/{reader or config.READER} failed: {e}")
+    t = threading.Thread(target=_run, name="rag-warmup", daemon=True)
+    t.start()
+    return t
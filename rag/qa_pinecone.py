@@ -1,112 +1,127 @@
 # rag/qa_pinecone.py
-import os
-import json
-import time
-from typing import List, Dict
-from sentence_transformers import SentenceTransformer
-from transformers import pipeline
-from pinecone import Pinecone
+"""
+Retrieval-only QA with optional FLAN-T5 summarization (Pinecone-backed by default).
+Thin wrapper over rag.pipeline; set RETRIEVER_BACKEND=local to run fully offline.
 
-# Prometheus metrics
-from prometheus_client import Counter, Histogram, start_http_server
+Importing this module has no side effects: the Pinecone client, embedder and
+summarizer are built on first use, and the metrics endpoint is started by init().
+init() is idempotent and can warm the models on a background thread:
 
-# --- Config: read secrets.json fallback to env ---
-SECRETS_PATH = os.path.join(os.path.dirname(__file__), "..", "secrets.json")
-secrets = {}
-if os.path.exists(SECRETS_PATH):
-    with open(SECRETS_PATH, "r", encoding="utf-8") as f:
-        secrets = json.load(f)
+    from rag import qa_pinecone
+    qa_pinecone.init(warm=True, background=True)
 
-PINECONE_API_KEY = os.getenv("PINECONE_API_KEY") or secrets.get("PINECONE_API_KEY")
-INDEX_NAME = os.getenv("PINECONE_INDEX_NAME") or secrets.get("PINECONE_INDEX_NAME", "faq-index")
+    python -m rag.qa_pinecone --profile-import   # import / init / first-answer timings
+"""
+import os
+import threading
+from typing import Iterator, List, Dict, Optional
+from rag import config
+from rag.metrics import start_metrics_server
+from rag.pipeline import get_pipeline, warm_up, start_warmup
+from rag.tracing import trace
 
-if not PINECONE_API_KEY or not INDEX_NAME:
-    raise ValueError("Set PINECONE_API_KEY and PINECONE_INDEX_NAME in env or secrets.json")
+# this module defaults to Pinecone; "local"/"chroma"/"langchain" also work
+RETRIEVER_BACKEND = os.getenv("RETRIEVER_BACKEND", "pinecone").lower()
 
 # --- Models & clients ---
-EMBED_MODEL = os.getenv("EMBED_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
-SUMMARIZER_MODEL = os.getenv("SUMMARIZER_MODEL", "google/flan-t5-small")  # optional summarizer
-
-# initialize Pinecone client (new SDK)
-pc = Pinecone(api_key=PINECONE_API_KEY)
-index = pc.Index(INDEX_NAME)
-
-# sentence transformer embedder
-embedder = SentenceTransformer(EMBED_MODEL)
-
-# optional summarizer (lazy init)
-_SUMMARIZER = None
+EMBED_MODEL = config.EMBED_MODEL
+SUMMARIZER_MODEL = config.SUMMARIZER_MODEL
+
+_init_lock = threading.Lock()
+_initialized = False
+_warmup_thread: Optional[threading.Thread] = None
+
+def init(warm: bool = False, background: bool = True, metrics: bool = config.ENABLE_METRICS,
+         summarize: bool = True) -> Optional[threading.Thread]:
+    """
+    Start the metrics endpoint (if enabled) and optionally warm the models. Safe to call repeatedly:
+    only the first call does anything. Returns the warm-up thread when warming in the background.
+    """
+    global _initialized, _warmup_thread
+    with _init_lock:
+        if _initialized:
+            return _warmup_thread
+        _initialized = True
+        if metrics:
+            start_metrics_server(config.METRICS_PORT)  # expose metrics on port 8000
+        if warm:
+            reader = "summarize" if summarize else "retrieval"
+            if background:
+                _warmup_thread = start_warmup(RETRIEVER_BACKEND, reader)
+            else:
+                warm_up(RETRIEVER_BACKEND, reader)
+        return _warmup_thread
+
+# retrieval-only and summarizing pipelines share the retriever, embedder and caches
+def _retrieval_pipeline():
+    return get_pipeline(RETRIEVER_BACKEND, "retrieval")
+
+def _summarize_pipeline():
+    return get_pipeline(RETRIEVER_BACKEND, "summarize")
+
+def __getattr__(name):
+    # module attributes kept for existing callers, resolved lazily
+    if name == "retriever":
+        return _retrieval_pipeline().retriever
+    if name == "embedder":
+        return _retrieval_pipeline().embedder.model
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# optional summarizer (lazy init, shared process-wide)
 def get_summarizer():
-    global _SUMMARIZER
-    if _SUMMARIZER is None:
-        _SUMMARIZER = pipeline("text2text-generation", model=SUMMARIZER_MODEL, device=-1, max_new_tokens=128)
-    return _SUMMARIZER
-
-# simple in-memory caches
-_embed_cache = {}
+    return _summarize_pipeline().reader.model
 
 def embed_text(text: str):
-    # very small cache to speed repeated queries
-    key = text.strip().lower()
-    if key in _embed_cache:
-        return _embed_cache[key]
-    vec = embedder.encode(text).tolist()
-    _embed_cache[key] = vec
-    return vec
-
-# --- Metrics ---
-REQUESTS = Counter("faq_requests_total", "Total FAQ queries")
-LATENCY = Histogram("faq_request_latency_seconds", "Latency for FAQ queries")
-
-# start prometheus metrics endpoint if enabled
-if os.getenv("ENABLE_METRICS", "true").lower() in ("1", "true", "yes"):
-    start_http_server(int(os.getenv("METRICS_PORT", 8000)))  # expose metrics on port 8000
+    # cached per normalized query to speed repeated queries
+    return _retrieval_pipeline().embedder.embed(text)
 
 # --- Retrieval + summarization functions ---
 def query_pinecone(query: str, top_k: int = 4) -> List[Dict]:
-    qv = embed_text(query)
-    # new Pinecone index.query signature - try vector= first, fallback to queries=
-    try:
-        res = index.query(vector=qv, top_k=top_k, include_metadata=True)
-    except TypeError:
-        res = index.query(queries=[qv], top_k=top_k, include_metadata=True)
-    matches = res.get("matches", []) or []
-    docs = []
-    for m in matches:
-        md = m.get("metadata", {}) or {}
-        docs.append({
-            "id": m.get("id"),
-            "score": m.get("score"),
-            "source": md.get("source", md.get("id")),
-            "chunk_index": md.get("chunk_index"),
-            "text": md.get("text", "")  # we stored snippet/text in metadata when building
-        })
-    return docs
+    """Retrieve top_k chunks from the configured backend (Pinecone or the local index)."""
+    return _retrieval_pipeline().retriever.search(embed_text(query), top_k=top_k, text=query)
 
 def answer_retrieval_only(query: str, top_k: int = 4, summarize: bool = True) -> Dict:
-    REQUESTS.inc()
-    t0 = time.time()
-    docs = query_pinecone(query, top_k=top_k)
-    if not docs:
-        LATENCY.observe(time.time() - t0)
-        return {"answer": "Sorry — I don't have that info. Please contact support.", "sources": []}
-
-    # quick retrieval-only answer: join top snippets
-    snippets = [d["text"] for d in docs if d.get("text")]
-    context = "\n\n".join(snippets)
-
-    if not summarize:
-        LATENCY.observe(time.time() - t0)
-        return {"answer": context[:1200], "sources": docs}
-
-    # summarizer
-    try:
-        summarizer = get_summarizer()
-        prompt = f"Use the following context to answer the question succinctly.\n\nContext:\n{context}\n\nQuestion: {query}\nAnswer:"
-        out = summarizer(prompt, max_new_tokens=128)[0]["generated_text"]
-        LATENCY.observe(time.time() - t0)
-        return {"answer": out.strip(), "sources": docs}
-    except Exception as e:
-        # if summarizer fails, fallback to raw context
-        LATENCY.observe(time.time() - t0)
-        return {"answer": context[:1200], "sources": docs}
+    init()
+    pipeline = _summarize_pipeline() if summarize else _retrieval_pipeline()
+    with trace("answer_retrieval_only", summarize=summarize):
+        return pipeline.answer(query, top_k=top_k)
+
+def answer_stream(query: str, top_k: int = 4, summarize: bool = True) -> Iterator[Dict]:
+    """
+    Streaming answer_retrieval_only: yields a "sources" event right after retrieval, "token"
+    events as FLAN-T5 generates, then "done" with the full result (see RAGPipeline.answer_stream).
+    """
+    init()
+    pipeline = _summarize_pipeline() if summarize else _retrieval_pipeline()
+    yield from pipeline.answer_stream(query, top_k=top_k)
+
+def _profile_import(query: str, summarize: bool):
+    """Time a cold import, init and the first answer, each in a fresh interpreter."""
+    import subprocess, sys
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    steps = {
+        "import": "import rag.qa_pinecone as m",
+        "import + init()": "import rag.qa_pinecone as m; m.init(metrics=False)",
+        "import + warm-up": f"import rag.qa_pinecone as m; m.init(warm=True, background=False, metrics=False, summarize={summarize})",
+        "import + first answer": f"import rag.qa_pinecone as m; m.answer_retrieval_only({query!r}, summarize={summarize})",
+    }
+    for label, stmt in steps.items():
+        code = f"import time; t = time.perf_counter(); {stmt}; print(time.perf_counter() - t)"
+        out = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True,
+                             env=dict(os.environ, ENABLE_METRICS="0"))
+        if out.returncode != 0:
+            print(f"{label:24s} failed: {out.stderr.strip().splitlines()[-1] if out.stderr.strip() else out.returncode}")
+        else:
+            print(f"{label:24s} {float(out.stdout.strip().splitlines()[-1]):8.3f}s")
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profile-import", action="store_true", help="measure cold import / init / first-answer time")
+    parser.add_argument("--query", default="What is your return policy?")
+    parser.add_argument("--no-summarize", action="store_true")
+    args = parser.parse_args()
+    if args.profile_import:
+        _profile_import(args.query, not args.no_summarize)
+    else:
+        print(answer_retrieval_only(args.query, summarize=not args.no_summarize)["answer"])
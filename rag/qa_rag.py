@@ -1,68 +1,60 @@
 # rag/qa_rag.py
 import os
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
-from transformers import pipeline
+from rag import config
+from rag.pipeline import get_pipeline
+from rag.tracing import trace
 
 # Paths & constants
-PERSIST_DIR = os.path.join(os.getcwd(), "chromadb_store")
-COLLECTION_NAME = "faq_collection"
-EMBEDDING_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
-QA_MODEL_NAME = "distilbert-base-uncased-distilled-squad"  # CPU-friendly
+PERSIST_DIR = os.path.abspath(config.CHROMA_DIR)
+COLLECTION_NAME = config.COLLECTION_NAME
+LOCAL_INDEX_DIR = os.path.abspath(config.LOCAL_INDEX_DIR)
+# "chroma" (default), "local", "pinecone" or "langchain" - see rag/pipeline.py
+RETRIEVER_BACKEND = config.RETRIEVER_BACKEND
+EMBEDDING_MODEL_NAME = config.EMBED_MODEL
+QA_MODEL_NAME = config.QA_MODEL  # CPU-friendly
 
 class FAQ_RAG:
-    def __init__(self):
-        # 1️⃣ Load embedding model
-        self.embedder = SentenceTransformer(EMBEDDING_MODEL_NAME)
-        
-        # 2️⃣ Initialize Chroma client
-        self.client = chromadb.PersistentClient(path=PERSIST_DIR)
-        
-        # 3️⃣ Load collection or raise error
-        try:
-            self.collection = self.client.get_collection(name=COLLECTION_NAME)
-            print(f"Loaded existing collection '{COLLECTION_NAME}'")
-        except:
-            raise ValueError(f"Collection '{COLLECTION_NAME}' not found. Run build_embeddings.py first.")
-        
-        # 4️⃣ Initialize QA pipeline
-        self.reader = pipeline(
-            "question-answering",
-            model=QA_MODEL_NAME,
-            tokenizer=QA_MODEL_NAME,
-            device=-1  # CPU
-        )
+    """Extractive-QA bot; a thin wrapper over the shared RAGPipeline for the configured backend."""
+
+    def __init__(self, backend: str = None):
+        # Models, clients and caches come from the process-wide registry, so every
+        # FAQ_RAG instance (one per Streamlit session) shares the same objects.
+        self.backend = backend or RETRIEVER_BACKEND
+        self.pipeline  # build it now, so a missing collection fails here rather than on the first question
+
+    # resolved per call rather than held: get_pipeline() hands out a new pipeline
+    # after the index is rebuilt, and a long-lived session should pick it up
+    @property
+    def pipeline(self):
+        return get_pipeline(self.backend, "extractive")
+
+    @property
+    def embedder(self):
+        return self.pipeline.embedder.model
+
+    @property
+    def retriever(self):
+        return self.pipeline.retriever
+
+    @property
+    def collection(self):
+        return getattr(self.retriever, "collection", None)
+
+    @property
+    def reader(self):
+        return self.pipeline.reader.model
+
+    @property
+    def answer_cache(self):
+        return self.pipeline.answer_cache
+
+    @property
+    def semantic_cache(self):
+        return self.pipeline.semantic_cache
 
     def answer(self, query, top_k=4):
-        # Embed query
-        query_vector = self.embedder.encode(query).tolist()
-        
-        # Retrieve top-k similar chunks
-        results = self.collection.query(
-            query_embeddings=[query_vector],
-            n_results=top_k
-        )
-        
-        # Prepare sources text
-        context_texts = []
-        sources_info = []
-        for chunk_text, chunk_meta in zip(results["documents"][0], results["metadatas"][0]):
-            context_texts.append(chunk_text)
-            sources_info.append({
-                "id": chunk_meta.get("id", ""),
-                "chunk_index": chunk_meta.get("chunk_index", 0),
-                "source": chunk_meta.get("source", "")
-            })
-        
-        # Combine retrieved chunks as context
-        context = "\n".join(context_texts)
-        
-        # Run QA
-        qa_output = self.reader(question=query, context=context)
-        
-        return {
-            "answer": qa_output["answer"],
-            "score": qa_output["score"],
-            "sources": sources_info
-        }
+        with trace("faq_rag"):
+            res = self.pipeline.answer(query, top_k=top_k)
+        sources_info = [{"id": d["id"], "chunk_index": d["chunk_index"], "source": d["source"]}
+                        for d in res["sources"]]
+        return dict(res, sources=sources_info)
@@ -0,0 +1,355 @@
+# rag/retrievers.py
+"""
+Common retriever interface over the vector stores used by the bots.
+
+Every backend takes query embeddings and returns docs in the same shape:
+{"id", "score", "source", "chunk_index", "text"} with higher score = more similar.
+The query text is passed along as well; dense backends ignore it, HybridRetriever
+uses it for the BM25 side.
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from rag.tracing import span
+
+
+class Retriever:
+    name = "base"
+
+    def search(self, query_vector, top_k: int = 4, text: Optional[str] = None) -> List[Dict]:
+        return self.search_batch([query_vector], top_k, None if text is None else [text])[0]
+
+    def search_batch(self, query_vectors, top_k: int = 4, texts: Optional[List[str]] = None) -> List[List[Dict]]:
+        return [self.search(qv, top_k) for qv in query_vectors]
+
+    def vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """Stored embeddings by chunk id (ids the backend doesn't have are left out)."""
+        return {}
+
+    def chunk_texts(self, ids: List[str]) -> Dict[str, str]:
+        """Stored chunk texts by chunk id (ids the backend doesn't have are left out)."""
+        return {}
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+
+class LocalRetriever(Retriever):
+    name = "local"
+
+    def __init__(self, local_index):
+        self.index = local_index
+
+    def search_batch(self, query_vectors, top_k: int = 4, texts: Optional[List[str]] = None) -> List[List[Dict]]:
+        out = []
+        for hits in self.index.search(query_vectors, top_k):
+            docs = []
+            for row, score in hits:
+                md = self.index.metadata[row]
+                docs.append({
+                    "id": md["id"],
+                    "score": score,
+                    "source": md.get("source", md["id"]),
+                    "chunk_index": md.get("chunk_index", 0),
+                    "text": md.get("text", ""),
+                })
+            out.append(docs)
+        return out
+
+    def vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        out = {}
+        for cid in ids:
+            vec = self.index.vector_of(cid)
+            if vec is not None:
+                out[cid] = vec
+        return out
+
+    def chunk_texts(self, ids: List[str]) -> Dict[str, str]:
+        rows = {cid: self.index.row_of(cid) for cid in ids}
+        return {cid: self.index.metadata[row].get("text", "") for cid, row in rows.items() if row is not None}
+
+    def count(self) -> int:
+        return len(self.index)
+
+
+def chroma_space(collection) -> str:
+    """Distance function of a Chroma collection ("l2" when it was created without hnsw:space)."""
+    return (getattr(collection, "metadata", None) or {}).get("hnsw:space", "l2")
+
+
+def distance_to_score(distance: float, space: str) -> float:
+    """
+    Chroma distance -> similarity on the cosine scale the reader thresholds assume.
+    cosine / ip distances are 1 - similarity; squared L2 on unnormalized embeddings has
+    no cosine equivalent, so it keeps the old 1 / (1 + d) ranking score.
+    """
+    if space in ("cosine", "ip"):
+        return 1.0 - distance
+    return 1.0 / (1.0 + distance)
+
+
+def _warn_l2(space: str, name: str):
+    if space not in ("cosine", "ip"):
+        print(f"⚠️ Chroma collection '{name}' uses {space} distance; scores are not cosine similarities and "
+              "QA_MIN_RETRIEVAL_SCORE / QA_EARLY_EXIT_SCORE won't behave as configured. "
+              "Rebuild it with: python rag/build_embeddings.py --full")
+
+
+def _chroma_vectors(collection, ids: List[str]) -> Dict[str, np.ndarray]:
+    res = collection.get(ids=list(ids), include=["embeddings"])
+    embeddings = res.get("embeddings")
+    if embeddings is None:
+        return {}
+    return {cid: np.asarray(e, dtype=np.float32) for cid, e in zip(res["ids"], embeddings)}
+
+
+def _chroma_texts(collection, ids: List[str]) -> Dict[str, str]:
+    res = collection.get(ids=list(ids), include=["documents"])
+    return {cid: text or "" for cid, text in zip(res["ids"], res.get("documents") or [])}
+
+
+class ChromaRetriever(Retriever):
+    name = "chroma"
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.space = chroma_space(collection)
+        _warn_l2(self.space, getattr(collection, "name", "?"))
+
+    def search_batch(self, query_vectors, top_k: int = 4, texts: Optional[List[str]] = None) -> List[List[Dict]]:
+        res = self.collection.query(
+            query_embeddings=[list(map(float, qv)) for qv in query_vectors],
+            n_results=top_k,
+        )
+        out = []
+        distances = res.get("distances") or [[None] * len(d) for d in res["documents"]]
+        for ids, docs_texts, metas, dists in zip(res["ids"], res["documents"], res["metadatas"], distances):
+            docs = []
+            for cid, text, md, dist in zip(ids, docs_texts, metas, dists):
+                md = md or {}
+                docs.append({
+                    "id": md.get("id", cid),
+                    # Chroma returns distances (lower = closer)
+                    "score": distance_to_score(dist, self.space) if dist is not None else 0.0,
+                    "source": md.get("source", ""),
+                    "chunk_index": md.get("chunk_index", 0),
+                    "text": text or "",
+                })
+            out.append(docs)
+        return out
+
+    def vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        return _chroma_vectors(self.collection, ids)
+
+    def chunk_texts(self, ids: List[str]) -> Dict[str, str]:
+        return _chroma_texts(self.collection, ids)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+
+class PineconeRetriever(Retriever):
+    name = "pinecone"
+
+    def __init__(self, index):
+        self.index = index
+
+    def search(self, query_vector, top_k: int = 4, text: Optional[str] = None) -> List[Dict]:
+        qv = list(map(float, query_vector))
+        # new Pinecone index.query signature - try vector= first, fallback to queries=
+        try:
+            res = self.index.query(vector=qv, top_k=top_k, include_metadata=True)
+        except TypeError:
+            res = self.index.query(queries=[qv], top_k=top_k, include_metadata=True)
+        matches = res.get("matches", []) or []
+        docs = []
+        for m in matches:
+            md = m.get("metadata", {}) or {}
+            docs.append({
+                "id": m.get("id"),
+                "score": m.get("score"),
+                "source": md.get("source", md.get("id")),
+                "chunk_index": md.get("chunk_index"),
+                "text": md.get("text", "")  # we stored snippet/text in metadata when building
+            })
+        return docs
+
+    def _fetch(self, ids: List[str]) -> Dict:
+        res = self.index.fetch(ids=list(ids))
+        return (res.vectors if hasattr(res, "vectors") else res.get("vectors", {})) or {}
+
+    def vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        return {cid: np.asarray(v.values if hasattr(v, "values") else v["values"], dtype=np.float32)
+                for cid, v in self._fetch(ids).items()}
+
+    def chunk_texts(self, ids: List[str]) -> Dict[str, str]:
+        out = {}
+        for cid, v in self._fetch(ids).items():
+            md = (v.metadata if hasattr(v, "metadata") else v.get("metadata")) or {}
+            out[cid] = md.get("text", "")
+        return out
+
+    def count(self) -> int:
+        return int(self.index.describe_index_stats().get("total_vector_count", 0))
+
+
+class LangChainRetriever(Retriever):
+    """Wraps a LangChain vector store (e.g. langchain_community Chroma) built on the same embeddings."""
+    name = "langchain"
+
+    def __init__(self, vectordb):
+        self.vectordb = vectordb
+        self.space = chroma_space(vectordb._collection)
+        _warn_l2(self.space, getattr(vectordb._collection, "name", "?"))
+
+    def search(self, query_vector, top_k: int = 4, text: Optional[str] = None) -> List[Dict]:
+        hits = self.vectordb.similarity_search_by_vector_with_relevance_scores(
+            embedding=list(map(float, query_vector)), k=top_k)
+        docs = []
+        for doc, distance in hits:
+            md = doc.metadata or {}
+            docs.append({
+                "id": md.get("id", ""),
+                "score": distance_to_score(distance, self.space),
+                "source": md.get("source", "unknown"),
+                "chunk_index": md.get("chunk_index", 0),
+                "text": doc.page_content or "",
+            })
+        return docs
+
+    def vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        return _chroma_vectors(self.vectordb._collection, ids)
+
+    def chunk_texts(self, ids: List[str]) -> Dict[str, str]:
+        return _chroma_texts(self.vectordb._collection, ids)
+
+    def count(self) -> int:
+        return self.vectordb._collection.count()
+
+
+class HybridRetriever(Retriever):
+    """
+    Dense retriever + BM25 (rag/bm25_index.py), fused per query.
+
+    Both sides return `candidates` hits; fusion is reciprocal rank fusion
+    ("rrf": sum of 1 / (rrf_k + rank)) or "weighted" (alpha * min-max dense score
+    + (1 - alpha) * min-max BM25 score). Results are ordered by "fused_score";
+    "score" stays the dense similarity so reader thresholds keep their meaning:
+    for BM25-only hits it is computed from the stored chunk vectors, fetched from the
+    dense backend in one call per batch. The BM25 sidecar holds no chunk text, so
+    the text of BM25-only hits comes from the dense backend the same way.
+    """
+
+    def __init__(self, dense: Retriever, lexical, fusion: str = "rrf", alpha: float = 0.5,
+                 rrf_k: int = 60, candidates: int = 20):
+        if fusion not in ("rrf", "weighted"):
+            raise ValueError(f"Unknown fusion '{fusion}' (expected rrf or weighted)")
+        self.dense = dense
+        self.lexical = lexical
+        self.fusion = fusion
+        self.alpha = alpha
+        self.rrf_k = rrf_k
+        self.candidates = candidates
+        self.name = f"{dense.name}+bm25"
+
+    def __getattr__(self, name):
+        # backend-specific attributes (collection, index, ...) come from the dense retriever
+        if name == "dense":
+            raise AttributeError(name)
+        return getattr(self.dense, name)
+
+    def search(self, query_vector, top_k: int = 4, text: Optional[str] = None) -> List[Dict]:
+        return self.search_batch([query_vector], top_k, None if text is None else [text])[0]
+
+    def search_batch(self, query_vectors, top_k: int = 4, texts: Optional[List[str]] = None) -> List[List[Dict]]:
+        n = max(top_k, self.candidates)
+        with span("retrieve_dense"):
+            dense = self.dense.search_batch(query_vectors, n)
+        if texts is None:
+            return [docs[:top_k] for docs in dense]
+        with span("bm25"):
+            lexical = [self.lexical.search(t, n) for t in texts]
+        with span("fuse"):
+            fused = [self._fuse(d, l, top_k) for d, l in zip(dense, lexical)]
+            self._complete_lexical_only(query_vectors, dense, fused)
+            return fused
+
+    @staticmethod
+    def _minmax(values: List[float]) -> List[float]:
+        if not values:
+            return []
+        lo, hi = min(values), max(values)
+        return [1.0 if hi == lo else (v - lo) / (hi - lo) for v in values]
+
+    def _complete_lexical_only(self, query_vectors, dense_docs: List[List[Dict]], fused: List[List[Dict]]):
+        """
+        Text and dense similarity for the fused hits that only BM25 found (their "text" and
+        "score" are None until here).
+        """
+        missing_text = sorted({d["id"] for docs in fused for d in docs if d["text"] is None})
+        if missing_text:
+            try:
+                texts = self.dense.chunk_texts(missing_text)
+            except Exception as e:
+                print(f"⚠️ Could not fetch texts for BM25-only hits from {self.dense.name}: {e}")
+                texts = {}
+            for docs in fused:
+                for d in docs:
+                    if d["text"] is None:
+                        d["text"] = texts.get(d["id"], "")  # an empty text is skipped by the readers
+        missing = {d["id"] for docs in fused for d in docs if d["score"] is None}
+        if not missing:
+            return
+        try:
+            vectors = self.dense.vectors(sorted(missing))
+        except Exception as e:
+            print(f"⚠️ Could not fetch vectors for BM25-only hits from {self.dense.name}: {e}")
+            vectors = {}
+        for qv, dense, docs in zip(query_vectors, dense_docs, fused):
+            q = np.asarray(qv, dtype=np.float32)
+            q = q / (np.linalg.norm(q) + 1e-12)
+            # no stored vector: rank it like the weakest dense candidate it displaced, so the
+            # reader's min-score filter doesn't drop every BM25-only hit
+            floor = min((d.get("score") or 0.0 for d in dense), default=0.0)
+            for d in docs:
+                if d["score"] is None:
+                    vec = vectors.get(d["id"])
+                    d["score"] = floor if vec is None else float(q @ vec / (np.linalg.norm(vec) + 1e-12))
+
+    def _fuse(self, dense_docs: List[Dict], lexical_hits: List[tuple], top_k: int) -> List[Dict]:
+        docs = {d["id"]: dict(d) for d in dense_docs}
+        fused = dict.fromkeys(docs, 0.0)
+        bm25 = {}
+        for row, score in lexical_hits:
+            md = self.lexical.docs[row]
+            bm25[md["id"]] = score
+            if md["id"] not in docs:
+                # indexes built before the sidecar dropped the text may still carry it
+                docs[md["id"]] = dict(md, text=md.get("text"), score=None)
+                fused[md["id"]] = 0.0
+
+        if self.fusion == "rrf":
+            for rank, d in enumerate(dense_docs, 1):
+                fused[d["id"]] += 1.0 / (self.rrf_k + rank)
+            for rank, (row, _) in enumerate(lexical_hits, 1):
+                fused[self.lexical.docs[row]["id"]] += 1.0 / (self.rrf_k + rank)
+        else:
+            for d, s in zip(dense_docs, self._minmax([d.get("score") or 0.0 for d in dense_docs])):
+                fused[d["id"]] += self.alpha * s
+            ids = list(bm25)
+            for cid, s in zip(ids, self._minmax([bm25[i] for i in ids])):
+                fused[cid] += (1 - self.alpha) * s
+
+        out = []
+        for cid in sorted(fused, key=lambda i: -fused[i])[:top_k]:
+            d = docs[cid]
+            d["fused_score"] = fused[cid]
+            if cid in bm25:
+                d["bm25_score"] = bm25[cid]
+            out.append(d)
+        return out
+
+    def count(self) -> int:
+        return self.dense.count()
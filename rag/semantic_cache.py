@@ -0,0 +1,111 @@
+# rag/semantic_cache.py
+"""
+Semantic (near-duplicate) answer cache.
+
+Stores the embeddings of previously answered queries in a small in-process
+matrix. A new query whose cosine similarity to a stored one is above the
+threshold reuses that answer (and its sources), skipping retrieval and the
+QA/summarizer step. Entries are scoped by a params key (top_k, summarize, ...)
+and by the index version, and evicted least-recently-used.
+"""
+
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+
+class SemanticCache:
+    def __init__(self, dim: int, threshold: float = 0.95, max_entries: int = 1024,
+                 version_fn: Callable[[], str] = lambda: "none"):
+        self.dim = dim
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.version_fn = version_fn
+        self._vectors = np.zeros((max_entries, dim), dtype=np.float32)
+        self._params = np.full(max_entries, -1, dtype=np.int64)   # params id per row, -1 = empty slot
+        self._last_used = np.zeros(max_entries, dtype=np.int64)
+        self._values = [None] * max_entries
+        self._params_ids: Dict[str, int] = {}
+        self._clock = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _normalize(vec) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(v)
+        return v / norm if norm > 0 else v
+
+    def _check_version(self):
+        version = self.version_fn()
+        if version != self._version:
+            self._params[:] = -1
+            self._values = [None] * self.max_entries
+            self._params_ids.clear()
+            self._version = version
+
+    def lookup(self, query_vector, params: str = "") -> Optional[Tuple[Dict, float]]:
+        """Return (value, similarity) of the most similar stored query above threshold, else None."""
+        q = self._normalize(query_vector)
+        with self._lock:
+            self._check_version()
+            pid = self._params_ids.get(params)
+            if pid is not None:
+                sims = self._vectors @ q
+                sims[self._params != pid] = -np.inf
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    self._clock += 1
+                    self._last_used[best] = self._clock
+                    self.hits += 1
+                    return self._values[best], float(sims[best])
+            self.misses += 1
+            return None
+
+    def add(self, query_vector, params: str, value: Dict):
+        q = self._normalize(query_vector)
+        with self._lock:
+            self._check_version()
+            pid = self._params_ids.setdefault(params, len(self._params_ids))
+            empty = np.flatnonzero(self._params == -1)
+            if empty.size:
+                slot = int(empty[0])
+            else:
+                slot = int(np.argmin(self._last_used))
+                self.evictions += 1
+            self._clock += 1
+            self._vectors[slot] = q
+            self._params[slot] = pid
+            self._last_used[slot] = self._clock
+            self._values[slot] = value
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._params != -1))
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "threshold": self.threshold,
+        }
+
+
+def from_env(dim: int, version_fn: Callable[[], str], prefix: str = "SEMANTIC_CACHE") -> Optional[SemanticCache]:
+    """Build a SemanticCache from <prefix>_ENABLED / _THRESHOLD / _MAX_ENTRIES env vars (None if disabled)."""
+    if os.getenv(f"{prefix}_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    return SemanticCache(
+        dim=dim,
+        threshold=float(os.getenv(f"{prefix}_THRESHOLD", 0.95)),
+        max_entries=int(os.getenv(f"{prefix}_MAX_ENTRIES", 1024)),
+        version_fn=version_fn,
+    )
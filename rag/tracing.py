@@ -0,0 +1,212 @@
+# rag/tracing.py
+"""
+Per-stage latency instrumentation for the answer path.
+
+    with trace("faq_rag") as t:          # one trace per request, carries t.request_id
+        with span("embed"):
+            ...
+        record("retrieve", seconds)      # for stages timed elsewhere
+
+Every stage duration goes to the faq_stage_latency_seconds Prometheus histogram
+and to an in-process exporter (percentiles + recent traces), so the numbers are
+available with the /metrics endpoint off. Traces slower than
+TRACE_SLOW_QUERY_SECONDS are written as JSON lines with their stage breakdown to
+TRACE_SLOW_QUERY_LOG. The current trace lives in a contextvar; nested trace()
+calls join the outer one.
+"""
+
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from rag import config
+from rag.metrics import STAGE_LATENCY
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+class Trace:
+    def __init__(self, name: str, request_id: Optional[str] = None, **attrs):
+        self.name = name
+        self.request_id = request_id or new_request_id()
+        self.attrs = attrs
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.spans: List[tuple] = []  # (stage, seconds) in completion order
+
+    def add(self, stage: str, seconds: float):
+        self.spans.append((stage, seconds))
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._t0
+
+    def breakdown(self) -> Dict[str, float]:
+        out: Dict[str, float] = defaultdict(float)
+        for stage, seconds in self.spans:
+            out[stage] += seconds
+        return dict(out)
+
+    def to_dict(self) -> Dict:
+        return {
+            "request_id": self.request_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "total_ms": round((self.duration or 0.0) * 1000, 3),
+            "stages_ms": {k: round(v * 1000, 3) for k, v in self.breakdown().items()},
+            "attrs": self.attrs,
+        }
+
+
+class InProcessExporter:
+    """Keeps the last N samples per stage and the most recent traces in memory."""
+
+    def __init__(self, max_samples: int = config.TRACE_SAMPLES_PER_STAGE, max_traces: int = config.TRACE_RECENT):
+        self._lock = threading.Lock()
+        self._max_samples = max_samples
+        self._samples: Dict[str, deque] = {}
+        self._counts: Dict[str, int] = defaultdict(int)
+        self._traces: deque = deque(maxlen=max_traces)
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            if stage not in self._samples:
+                self._samples[stage] = deque(maxlen=self._max_samples)
+            self._samples[stage].append(seconds)
+            self._counts[stage] += 1
+
+    def export(self, trace: Trace):
+        with self._lock:
+            self._traces.append(trace.to_dict())
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """{stage: {"count", "mean_ms", "p50_ms", "p95_ms", "p99_ms"}} over the retained samples."""
+        with self._lock:
+            samples = {k: sorted(v) for k, v in self._samples.items()}
+            counts = dict(self._counts)
+        out = {}
+        for stage, s in samples.items():
+            if not s:
+                continue
+            pct = lambda p: s[min(len(s) - 1, int(len(s) * p))] * 1000
+            out[stage] = {"count": counts[stage], "mean_ms": sum(s) / len(s) * 1000,
+                          "p50_ms": pct(0.50), "p95_ms": pct(0.95), "p99_ms": pct(0.99)}
+        return out
+
+    def recent(self, n: int = 20) -> List[Dict]:
+        with self._lock:
+            return list(self._traces)[-n:]
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+            self._traces.clear()
+
+
+exporter = InProcessExporter()
+_current: contextvars.ContextVar = contextvars.ContextVar("faq_trace", default=None)
+
+_slow_log = logging.getLogger("faq.slow_queries")
+_slow_log.propagate = False
+if not _slow_log.handlers:
+    _slow_log.addHandler(logging.FileHandler(config.TRACE_SLOW_QUERY_LOG, delay=True) if config.TRACE_SLOW_QUERY_LOG
+                         else logging.StreamHandler())
+    _slow_log.setLevel(logging.INFO)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+def current_request_id() -> Optional[str]:
+    t = _current.get()
+    return t.request_id if t is not None else None
+
+
+def record(stage: str, seconds: float):
+    """Record an already-measured stage duration (histogram, exporter, current trace)."""
+    STAGE_LATENCY.labels(stage=stage).observe(seconds)
+    exporter.observe(stage, seconds)
+    t = _current.get()
+    if t is not None:
+        t.add(stage, seconds)
+
+
+@contextmanager
+def span(stage: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - t0)
+
+
+def start_trace(name: str, request_id: Optional[str] = None, **attrs):
+    """Begin a trace; returns (trace, token) for end_trace(). Joins the current trace if there is one."""
+    parent = _current.get()
+    if parent is not None:
+        return parent, None
+    t = Trace(name, request_id, **attrs)
+    return t, _current.set(t)
+
+
+def end_trace(t: Trace, token):
+    if token is None:  # joined an outer trace; the owner finishes it
+        return
+    try:
+        _current.reset(token)
+    except ValueError:
+        # a streaming generator closed from another context (e.g. garbage-collected); the var is already gone
+        pass
+    t.finish()
+    exporter.export(t)
+    if t.duration >= config.TRACE_SLOW_QUERY_SECONDS:
+        _slow_log.info(json.dumps(t.to_dict(), default=str))
+
+
+@contextmanager
+def trace(name: str, request_id: Optional[str] = None, **attrs):
+    t, token = start_trace(name, request_id, **attrs)
+    try:
+        yield t
+    finally:
+        end_trace(t, token)
+
+
+def instrument_flask(app):
+    """One trace per Flask request (request id from / echoed in X-Request-ID) plus a GET /stages report."""
+    from flask import g, request, jsonify
+
+    @app.before_request
+    def _start_request_trace():
+        g._faq_trace = start_trace(f"{request.method} {request.path}", request.headers.get(REQUEST_ID_HEADER))
+
+    @app.after_request
+    def _tag_response(response):
+        t = getattr(g, "_faq_trace", (None, None))[0]
+        if t is not None:
+            response.headers[REQUEST_ID_HEADER] = t.request_id
+        return response
+
+    @app.teardown_request
+    def _end_request_trace(exc=None):
+        t, token = g.pop("_faq_trace", (None, None))
+        if t is not None:
+            end_trace(t, token)
+
+    @app.route("/stages", methods=["GET"])
+    def _stage_report():
+        return jsonify({"stages": exporter.snapshot(), "recent": exporter.recent(20)})
+
+    return app
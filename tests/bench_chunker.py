@@ -0,0 +1,70 @@
+# tests/bench_chunker.py
+"""
+Compare the character splitter (CHUNKER=chars) with the token-aware sentence
+chunker (CHUNKER=tokens): chunk count, tokens per chunk (and how many exceed the
+embedder's 128-token window), chunk + encode time, and retrieval recall@k on
+tests/sample_tickets.csv.
+
+    python tests/bench_chunker.py --docs docs --top-k 4 --repeat 50
+"""
+import os, sys, csv, time, argparse
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "rag")))
+
+from rapidfuzz import fuzz
+from rag import config, model_registry
+from rag.local_index import LocalIndex
+from data_prep_rag import load_documents, chunk_text, chunk_text_tokens, get_token_counter
+
+EMBED_WINDOW = 128
+MATCH_THRESHOLD = 90
+
+def load_samples(path="tests/sample_tickets.csv"):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+def make_chunks(docs, kind):
+    split = chunk_text_tokens if kind == "tokens" else chunk_text
+    return [{"id": f"{d['id']}_chunk_{i}", "text": p, "source": d["source"], "chunk_index": i}
+            for d in docs for i, p in enumerate(split(d["text"]))]
+
+def run(kind, docs, samples, top_k, count):
+    embedder = model_registry.get_embedder(config.EMBED_MODEL)
+    t0 = time.perf_counter()
+    chunks = make_chunks(docs, kind)
+    t1 = time.perf_counter()
+    vecs = embedder.encode([c["text"] for c in chunks], batch_size=64, convert_to_numpy=True)
+    t2 = time.perf_counter()
+    index = LocalIndex.build(vecs, chunks, config.EMBED_MODEL)
+    qvecs = embedder.encode([s["question"] for s in samples], convert_to_numpy=True)
+    hits = 0
+    for s, hits_for_q in zip(samples, index.search(qvecs, top_k)):
+        texts = [index.metadata[row]["text"] for row, _ in hits_for_q]
+        if any(fuzz.partial_ratio(s["expected_answer"], t) >= MATCH_THRESHOLD for t in texts):
+            hits += 1
+    tokens = [count(c["text"]) for c in chunks]
+    return {
+        "chunks": len(chunks),
+        "avg_tokens": sum(tokens) / max(len(tokens), 1),
+        "over_window": sum(1 for n in tokens if n > EMBED_WINDOW - 2),
+        "chunk_s": t1 - t0,
+        "encode_s": t2 - t1,
+        f"recall@{top_k}": hits / max(len(samples), 1),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", default="docs")
+    parser.add_argument("--samples", default="tests/sample_tickets.csv")
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=1, help="replicate the corpus to measure build time at scale")
+    args = parser.parse_args()
+
+    docs = load_documents(args.docs)
+    docs = [dict(d, id=f"{d['id']}_{r}") for r in range(args.repeat) for d in docs]
+    samples = load_samples(args.samples)
+    count = get_token_counter(config.EMBED_MODEL)
+    print(f"{len(docs)} docs, {sum(len(d['text']) for d in docs):,} chars, {len(samples)} queries")
+    for kind in ("chars", "tokens"):
+        r = run(kind, docs, samples, args.top_k, count)
+        print(f"{kind:7s} " + "  ".join(f"{k} {v:.3f}" if isinstance(v, float) else f"{k} {v}" for k, v in r.items()))
@@ -0,0 +1,89 @@
+# tests/bench_onnx.py
+"""
+PyTorch vs ONNX Runtime (fp32 / dynamic int8) for the embedder, the extractive
+reader and the FLAN-T5 summarizer: load time, resident memory, p50 per-query
+latency, and accuracy deltas (embedding cosine vs torch, QA answers that match
+torch, fuzzy accuracy on tests/sample_tickets.csv). Each backend runs in its own
+process so memory numbers don't mix.
+
+    python tests/bench_onnx.py --backends torch onnx onnx-int8 --rounds 20
+"""
+import os, sys, csv, json, time, argparse, statistics, subprocess
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+THRESHOLD = 70
+
+def load_samples(path="tests/sample_tickets.csv"):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+def p50_ms(fn, rounds):
+    out = []
+    for _ in range(rounds):
+        t = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t)
+    return statistics.median(out) * 1000
+
+def child(backend, samples_path, rounds):
+    from rag import config, model_registry
+    from rag.data_prep_rag import load_documents
+    context = "\n".join(d["text"] for d in load_documents("docs"))
+    samples = load_samples(samples_path)
+    questions = [s["question"] for s in samples]
+    rss0 = model_registry.process_rss_bytes()
+
+    t = time.perf_counter()
+    embedder = model_registry.get_embedder(config.EMBED_MODEL, backend=backend)
+    qa = model_registry.get_pipeline("question-answering", config.QA_MODEL, backend=backend, tokenizer=config.QA_MODEL, device=-1)
+    summarizer = model_registry.get_pipeline("text2text-generation", config.SUMMARIZER_MODEL, backend=backend, device=-1, max_new_tokens=64)
+    load_s = time.perf_counter() - t
+
+    embeddings = embedder.encode(questions, convert_to_numpy=True).tolist()
+    answers = [qa({"question": q, "context": context})["answer"] for q in questions]
+    prompt = f"Context:\n{context}\n\nQuestion: {questions[0]}\nAnswer:"
+    return {
+        "load_s": load_s,
+        "rss_mb": (model_registry.process_rss_bytes() - rss0) / 1e6,
+        "embed_ms": p50_ms(lambda: embedder.encode(questions[0]), rounds),
+        "qa_ms": p50_ms(lambda: qa({"question": questions[0], "context": context}), rounds),
+        "summarize_ms": p50_ms(lambda: summarizer(prompt, max_new_tokens=64), max(rounds // 4, 1)),
+        "embeddings": embeddings,
+        "answers": answers,
+    }
+
+def cosine(a, b):
+    import numpy as np
+    a, b = np.asarray(a), np.asarray(b)
+    return float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-12))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--samples", default="tests/sample_tickets.csv")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.child, args.samples, args.rounds)))
+        sys.exit(0)
+
+    from rapidfuzz import fuzz
+    samples = load_samples(args.samples)
+    results = {}
+    for backend in args.backends:
+        out = subprocess.run([sys.executable, __file__, "--child", backend, "--samples", args.samples,
+                              "--rounds", str(args.rounds)], capture_output=True, text=True, check=True)
+        results[backend] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    ref = results.get("torch")
+    for backend, r in results.items():
+        acc = sum(fuzz.token_set_ratio(s["expected_answer"], a) >= THRESHOLD for s, a in zip(samples, r["answers"])) / len(samples)
+        line = (f"{backend:10s} load {r['load_s']:6.1f}s  rss +{r['rss_mb']:7.0f} MB  embed {r['embed_ms']:6.1f} ms  "
+                f"qa {r['qa_ms']:6.1f} ms  summarize {r['summarize_ms']:7.1f} ms  qa accuracy {acc:.0%}")
+        if ref is not None and backend != "torch":
+            cos = min(cosine(a, b) for a, b in zip(r["embeddings"], ref["embeddings"]))
+            same = sum(a == b for a, b in zip(r["answers"], ref["answers"])) / len(samples)
+            line += f"  min cos vs torch {cos:.4f}  qa answers = torch {same:.0%}"
+        print(line)
@@ -0,0 +1,51 @@
+# tests/bench_reader.py
+"""
+Extractive reader: concatenated context (old behaviour) vs per-chunk batched QA,
+with and without the early exit. Reports p50/p95 read latency, chunks read and
+answer accuracy (fuzzy match against tests/sample_tickets.csv, as in evaluate.py).
+Runs against the local index (python rag/build_embeddings.py --no-chroma).
+
+    python tests/bench_reader.py --top-k 4 --rounds 5
+"""
+import os, sys, csv, time, argparse, statistics
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from rapidfuzz import fuzz
+from rag import config
+from rag.pipeline import RAGPipeline, ExtractiveReader, build_retriever, get_query_embedder
+
+THRESHOLD = 70
+
+def load_samples(path="tests/sample_tickets.csv"):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+def run(name, reader, retriever, embedder, samples, top_k, rounds):
+    pipe = RAGPipeline(retriever, reader, embedder)  # no answer caches: measure the reader every time
+    pipe.answer(samples[0]["question"], top_k)  # warm-up (model load)
+    reads, correct = [], 0
+    for r in range(rounds):
+        for s in samples:
+            out = pipe.answer(s["question"], top_k)
+            reads.append(out["timings"]["read"])
+            if r == 0 and fuzz.token_set_ratio(s["expected_answer"], out["answer"]) >= THRESHOLD:
+                correct += 1
+    reads.sort()
+    extra = reader.stats() if reader.per_chunk else {}
+    print(f"{name:22s} read p50 {statistics.median(reads) * 1000:7.1f} ms  p95 {reads[int(len(reads) * 0.95) - 1] * 1000:7.1f} ms  "
+          f"accuracy {correct / len(samples):.0%}  {extra}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="local")
+    parser.add_argument("--samples", default="tests/sample_tickets.csv")
+    parser.add_argument("--top-k", type=int, default=config.TOP_K)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples)
+    retriever = build_retriever(args.backend)
+    embedder = get_query_embedder()
+    run("concatenated", ExtractiveReader(per_chunk=False), retriever, embedder, samples, args.top_k, args.rounds)
+    run("per-chunk", ExtractiveReader(early_exit_score=float("inf")), retriever, embedder, samples, args.top_k, args.rounds)
+    run("per-chunk + early exit", ExtractiveReader(), retriever, embedder, samples, args.top_k, args.rounds)
@@ -0,0 +1,82 @@
+# tests/bench_redact.py
+"""
+Single-pass PII redaction (rag/utils_redact.py) vs the old three sequential
+substitutions (email -> id -> phone), on typical queries and adversarial inputs:
+long digit runs, digit groups that almost form phone numbers, long [\\w.-] runs
+without an "@" (the old email pattern rescans them from every position), and
+text dense with real matches. Also checks that both give identical output on
+the benchmark inputs plus --fuzz random strings, and times redact_many /
+redact_file on a synthetic log.
+
+    python tests/bench_redact.py --fuzz 20000
+"""
+import os, sys, time, random, argparse, tempfile, statistics
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from rag.utils_redact import EMAIL_RE, SA_ID_RE, PHONE_RE, redact_text, redact_many, redact_file
+
+def redact_sequential(s):
+    s = EMAIL_RE.sub("[email]", s)
+    s = SA_ID_RE.sub("[id]", s)
+    return PHONE_RE.sub("[phone]", s)
+
+def inputs():
+    return {
+        "query": "Hi, I ordered last week, my email is thandi.m@example.co.za and cell 082 123 4567 - where is it?",
+        "no pii": "What is your return policy for items bought online during the holiday sale? " * 4,
+        "digits 20k": "1" * 20000,
+        "near-phone 20k": "12 345 6789 " * 1700,
+        "plus-groups 20k": "+27-" * 5000,
+        "word run 20k": "a." * 10000,
+        "dense pii": "a@b.co 8001015009087 +27 821234567 " * 500,
+    }
+
+def fuzz_strings(n, seed=0):
+    rnd = random.Random(seed)
+    parts = ["1", "0", "27", "+", "-", " ", "\n", ".", "@", "a", "_", "x.co", "@mail.com", "+27 ", "082",
+             "1234567", "8001015009087", "123456789012", "é"]
+    for _ in range(n):
+        yield "".join(rnd.choice(parts) for _ in range(rnd.randint(1, 30)))
+
+def best_ms(fn, s, rounds):
+    out = []
+    for _ in range(rounds):
+        t = time.perf_counter()
+        fn(s)
+        out.append(time.perf_counter() - t)
+    return min(out) * 1000
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--fuzz", type=int, default=20000, help="random strings checked against the old behaviour")
+    parser.add_argument("--log-lines", type=int, default=100000)
+    args = parser.parse_args()
+
+    mismatches = [s for s in list(inputs().values()) + list(fuzz_strings(args.fuzz))
+                  if redact_text(s) != redact_sequential(s)]
+    print(f"equivalence: {len(mismatches)} mismatches over {args.fuzz + len(inputs())} inputs")
+    for s in mismatches[:5]:
+        print(f"  {s!r}: {redact_sequential(s)!r} != {redact_text(s)!r}")
+
+    for name, s in inputs().items():
+        old, new = best_ms(redact_sequential, s, args.rounds), best_ms(redact_text, s, args.rounds)
+        print(f"{name:16s} {len(s):6d} chars  three-pass {old:9.2f} ms  single-pass {new:8.2f} ms  ({old / max(new, 1e-9):6.1f}x)")
+
+    samples = list(inputs().values())[:3]
+    lines = [samples[i % 2] + f" #{i}\n" for i in range(args.log_lines)]
+    t = time.perf_counter()
+    reference = [redact_sequential(l) for l in lines]
+    t_old = time.perf_counter() - t
+    t = time.perf_counter()
+    redacted = list(redact_many(lines))
+    t_many = time.perf_counter() - t
+    assert redacted == reference
+    with tempfile.TemporaryDirectory() as d:
+        src, dst = os.path.join(d, "in.log"), os.path.join(d, "out.log")
+        with open(src, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        t = time.perf_counter()
+        redact_file(src, dst)
+        t_file = time.perf_counter() - t
+    print(f"{args.log_lines} log lines: three-pass {t_old:.2f}s  redact_many {t_many:.2f}s  redact_file {t_file:.2f}s")
@@ -0,0 +1,70 @@
+# tests/bench_rerank.py
+"""
+End-to-end latency and accuracy with and without the cross-encoder reranking
+stage: "wide" reads all --top-k retrieved chunks, "rerank" retrieves the same
+--top-k candidates and passes only the best --top-n to the reader. Reports p50/p95
+end-to-end, rerank and read latency, accuracy (fuzzy match against
+tests/sample_tickets.csv, as in evaluate.py) and the rerank score-cache hit rate
+(rounds after the first hit the cache). Runs against the local index
+(python rag/build_embeddings.py --no-chroma).
+
+    python tests/bench_rerank.py --top-k 8 --top-n 2 --rounds 5
+"""
+import os, sys, csv, argparse, statistics
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from rapidfuzz import fuzz
+from rag import config
+from rag.pipeline import RAGPipeline, CrossEncoderReranker, build_retriever, build_hybrid, build_reader, get_query_embedder
+
+THRESHOLD = 70
+
+def load_samples(path="tests/sample_tickets.csv"):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+def pct(values, p):
+    s = sorted(values)
+    return s[min(len(s) - 1, int(len(s) * p))] * 1000 if s else 0.0
+
+def run(name, pipe, samples, top_k, rounds):
+    pipe.answer(samples[0]["question"], top_k)  # warm-up (model loads)
+    if pipe.reranker is not None:
+        pipe.reranker.cache.clear()
+        pipe.reranker.cache.hits = pipe.reranker.cache.misses = 0
+    timings, correct, chunks = {}, 0, 0
+    for r in range(rounds):
+        for s in samples:
+            out = pipe.answer(s["question"], top_k)
+            for stage in ("total", "rerank", "read"):
+                if stage in out["timings"]:
+                    timings.setdefault(stage, []).append(out["timings"][stage])
+            if r == 0:
+                chunks += len(out["sources"])
+                correct += fuzz.token_set_ratio(s["expected_answer"], out["answer"]) >= THRESHOLD
+    line = f"{name:8s} " + "  ".join(f"{stage} p50 {pct(v, 0.5):7.1f} / p95 {pct(v, 0.95):7.1f} ms"
+                                     for stage, v in timings.items())
+    line += f"  chunks/query {chunks / len(samples):.1f}  accuracy {correct / len(samples):.0%}"
+    if pipe.reranker is not None:
+        line += f"  score cache hit rate {pipe.reranker.cache.stats()['hit_rate']:.0%}"
+    print(line)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="local")
+    parser.add_argument("--reader", default=config.READER)
+    parser.add_argument("--samples", default="tests/sample_tickets.csv")
+    parser.add_argument("--model", default=config.RERANK_MODEL)
+    parser.add_argument("--top-k", type=int, default=8, help="chunks retrieved (the app's slider maximum)")
+    parser.add_argument("--top-n", type=int, default=config.RERANK_TOP_N, help="chunks kept after reranking")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples)
+    retriever = build_hybrid(build_retriever(args.backend))
+    embedder = get_query_embedder()
+    # no answer caches or direct FAQ answers: every query runs retrieve (+ rerank) + read
+    run("wide", RAGPipeline(retriever, build_reader(args.reader), embedder), samples, args.top_k, args.rounds)
+    reranker = CrossEncoderReranker(args.model, top_n=args.top_n, candidates=args.top_k)
+    run("rerank", RAGPipeline(retriever, build_reader(args.reader), embedder, reranker=reranker),
+        samples, args.top_k, args.rounds)
@@ -0,0 +1,104 @@
+# tests/bench_ticket_api.py
+"""
+Load test for api/ticket_api.py: p50/p99 latency of GET /tickets (keyset pages,
+with and without filters) and POST /tickets/batch at 100k and 1M tickets.
+
+Requests go over HTTP to a threaded server (a new thread per request, like
+app.run(threaded=True)) from --concurrency client threads, so the connection
+pool is exercised the way it is in production; the number of sqlite
+connections the pool opened is reported at the end.
+
+    python tests/bench_ticket_api.py --sizes 100000 1000000 --requests 500 --concurrency 8
+"""
+import os, sys, json, time, logging, random, sqlite3, argparse, tempfile, threading, statistics, urllib.request
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+STATUSES = ["open", "closed", "pending"]
+CHANNELS = ["web", "whatsapp", "email"]
+
+def populate(db_path, n, batch=50000):
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    have = conn.execute("SELECT COUNT(*) FROM tickets").fetchone()[0]
+    rnd = random.Random(42)
+    for start in range(have, n, batch):
+        rows = [(f"2025-01-01T00:00:{i % 60:02d}", f"user{rnd.randrange(5000)}", rnd.choice(CHANNELS),
+                 f"question {i}", rnd.choice(STATUSES), "") for i in range(start, min(start + batch, n))]
+        conn.executemany("INSERT INTO tickets (ts,user,channel,question,status,metadata) VALUES (?,?,?,?,?,?)", rows)
+        conn.commit()
+    conn.close()
+
+def percentiles(samples):
+    s = sorted(samples)
+    return {"p50_ms": statistics.median(s) * 1000, "p99_ms": s[min(len(s) - 1, int(len(s) * 0.99))] * 1000}
+
+def timed(fn, n, concurrency):
+    def one(_):
+        t = time.perf_counter()
+        fn()
+        return time.perf_counter() - t
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return percentiles(list(pool.map(one, range(n))))
+
+def request(base, path, body=None):
+    data = None if body is None else json.dumps(body).encode("utf-8")
+    req = urllib.request.Request(base + path, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req) as resp:
+        resp.read()
+        return resp.status
+
+def run(size, n_requests, workdir, concurrency):
+    db_path = os.path.join(workdir, f"tickets_{size}.db")
+    os.environ["TICKET_DB"] = db_path
+    import importlib
+    import api.ticket_api as ticket_api
+    ticket_api = importlib.reload(ticket_api)  # re-init against this size's DB
+    t = time.perf_counter()
+    populate(db_path, size)
+    print(f"\n== {size:,} tickets (populated in {time.perf_counter() - t:.1f}s)")
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # no access log per request
+    server = make_server("127.0.0.1", 0, ticket_api.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    max_id = size
+
+    def first_page():
+        assert request(base, "/tickets?limit=100") == 200
+
+    def deep_page():
+        request(base, f"/tickets?limit=100&before_id={random.randint(100, max_id)}")
+
+    def filtered_page():
+        request(base, f"/tickets?limit=100&status={random.choice(STATUSES)}&channel={random.choice(CHANNELS)}"
+                      f"&before_id={random.randint(100, max_id)}")
+
+    def user_page():
+        request(base, f"/tickets?limit=50&user=user{random.randrange(5000)}")
+
+    def batch_insert():
+        assert request(base, "/tickets/batch", [{"user": "bench", "question": "q"}] * 100) == 201
+
+    try:
+        for name, fn in [("first page", first_page), ("deep page (cursor)", deep_page),
+                         ("status+channel filter", filtered_page), ("user filter", user_page),
+                         ("POST /tickets/batch x100", batch_insert)]:
+            r = timed(fn, n_requests, concurrency)
+            print(f"{name:28s} p50 {r['p50_ms']:8.2f} ms   p99 {r['p99_ms']:8.2f} ms")
+    finally:
+        server.shutdown()
+        ticket_api.pool.close()
+    print(f"sqlite connections opened: {ticket_api.pool.opened} (pool size {ticket_api.pool.size}, "
+          f"{5 * n_requests} requests)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads")
+    parser.add_argument("--workdir", default=tempfile.gettempdir())
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.requests, args.workdir, args.concurrency)
@@ -0,0 +1,60 @@
+# tests/conftest.py
+"""Shared fixtures: a deterministic hashing embedder and a tiny local index, so pipeline tests run offline."""
+import os, sys, hashlib
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+import pytest
+from rag import config, model_registry
+
+class HashingEmbedder:
+    """Bag-of-words vectors: texts sharing words are similar, identical word sets are identical."""
+    dim = 64
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, convert_to_numpy=True, normalize_embeddings=False, **kwargs):
+        single = isinstance(texts, str)
+        out = []
+        for text in [texts] if single else texts:
+            v = np.zeros(self.dim, dtype=np.float32)
+            for word in text.lower().replace("?", " ").replace(".", " ").split():
+                v[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % self.dim] += 1.0
+            if normalize_embeddings and np.linalg.norm(v) > 0:
+                v /= np.linalg.norm(v)
+            out.append(v)
+        return out[0] if single else np.stack(out)
+
+CHUNKS = [
+    {"id": "refunds.txt_chunk_0", "source": "refunds.txt", "chunk_index": 0,
+     "text": "Refunds are paid back to your card within 5 working days."},
+    {"id": "shipping.txt_chunk_0", "source": "shipping.txt", "chunk_index": 0,
+     "text": "We ship worldwide. Standard shipping takes 5 days."},
+    {"id": "orders.txt_chunk_0", "source": "orders.txt", "chunk_index": 0,
+     "text": "Track order ORD-48213 from the orders page."},
+]
+
+@pytest.fixture
+def embedder(monkeypatch):
+    """Registers the hashing embedder as the process-wide embedder; the registry is cleared afterwards."""
+    model_registry.clear()
+    monkeypatch.setattr(config, "INFERENCE_BACKEND", "torch")
+    monkeypatch.setattr(config, "MICROBATCH_ENABLED", False)
+    fake = HashingEmbedder()
+    model_registry._entries[f"embedder:{config.EMBED_MODEL}"] = fake
+    yield fake
+    model_registry.clear()
+
+@pytest.fixture
+def local_index_dir(tmp_path, monkeypatch, embedder):
+    """A local index over CHUNKS in tmp_path, set as config.LOCAL_INDEX_DIR; hybrid / FAQ / rerank off."""
+    from rag.local_index import LocalIndex
+    meta = [dict(c, hash=c["id"]) for c in CHUNKS]
+    LocalIndex.build(embedder.encode([c["text"] for c in CHUNKS]), meta, model=config.EMBED_MODEL).save(
+        str(tmp_path), config.COLLECTION_NAME)
+    monkeypatch.setattr(config, "LOCAL_INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "HYBRID_ENABLED", False)
+    monkeypatch.setattr(config, "FAQ_DIRECT_ENABLED", False)
+    monkeypatch.setattr(config, "RERANK_ENABLED", False)
+    return str(tmp_path)
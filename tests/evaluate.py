@@ -1,32 +1,176 @@
 # tests/evaluate.py
-import csv
+"""
+Offline evaluation / benchmark of the RAG pipeline on a sample CSV (id, question, expected_answer).
+
+Reports answer accuracy (fuzzy match), retrieval recall@k and MRR (a retrieved
+chunk is relevant when it contains the expected answer), p50/p95/p99 latency per
+stage, throughput and the share of queries answered directly from the FAQ
+question index, and writes everything as JSON so runs can be compared.
+
+    # fully offline: local index + small models
+    python rag/build_embeddings.py --no-chroma
+    python tests/evaluate.py --backend local --reader extractive --concurrency 4 --batch-size 2 --repeat 5 \
+        --output eval_results.json --compare eval_baseline.json
+"""
+import os, sys, csv, json, time, argparse, platform
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
 from rapidfuzz import fuzz
-from rag.qa_pinecone import answer_query
+from rag import config
+from rag.pipeline import (RAGPipeline, CrossEncoderReranker, build_retriever, build_hybrid, build_reader,
+                          get_query_embedder, get_pipeline, load_faq_matcher)
 
-THRESHOLD = 70
+THRESHOLD = 70           # token_set_ratio for a correct answer
+RELEVANCE_THRESHOLD = 90  # partial_ratio for a retrieved chunk to count as containing the answer
+# metrics where a lower value is better (everything else: higher is better)
+LOWER_IS_BETTER = ("latency",)
 
 def load_samples(path="tests/sample_tickets.csv"):
     with open(path, newline='', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         return list(reader)
 
-def evaluate(samples):
-    total = len(samples)
-    correct = 0
-    for s in samples:
-        q = s['question']
-        expected = s['expected_answer']
-        out = answer_query(q, top_k=4)
-        pred = out.get('answer','').strip()
-        score = fuzz.token_set_ratio(expected, pred)
-        ok = score >= THRESHOLD
-        print(f"Q: {q}\nExpected: {expected}\nPred: {pred}\nSim: {score} -> {'OK' if ok else 'MISS'}\n---")
-        if ok:
-            correct += 1
-    acc = correct / total if total else 0
-    print(f"Accuracy: {acc:.2%} ({correct}/{total})")
-    return acc
+def percentiles(values):
+    s = sorted(values)
+    if not s:
+        return {}
+    pick = lambda p: s[min(len(s) - 1, int(len(s) * p))] * 1000
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "mean_ms": sum(s) / len(s) * 1000}
+
+def first_relevant_rank(expected, sources):
+    for rank, d in enumerate(sources, 1):
+        if fuzz.partial_ratio(expected, d.get("text", "")) >= RELEVANCE_THRESHOLD:
+            return rank
+    return None
+
+def make_pipeline(backend, reader, use_cache, hybrid=True):
+    if use_cache:
+        return get_pipeline(backend, reader)
+    # no answer caches: every query exercises embed / retrieve / read
+    retriever = build_retriever(backend)
+    if hybrid:
+        retriever = build_hybrid(retriever)
+    reranker = CrossEncoderReranker() if config.RERANK_ENABLED else None
+    return RAGPipeline(retriever, build_reader(reader), get_query_embedder(), faq=load_faq_matcher(),
+                       reranker=reranker)
+
+def evaluate(samples, pipeline, top_k=4, concurrency=1, batch_size=1, repeat=1, verbose=False):
+    queries = [s for _ in range(repeat) for s in samples]
+    batches = [queries[i:i + batch_size] for i in range(0, len(queries), batch_size)]
+
+    def run_batch(batch):
+        t = time.perf_counter()
+        outs = pipeline.answer_batch([s["question"] for s in batch], top_k=top_k)
+        wall = time.perf_counter() - t
+        return [(s, o, wall) for s, o in zip(batch, outs)]
+
+    pipeline.answer(samples[0]["question"], top_k=top_k)  # warm-up: model loads are not benchmarked
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = [r for rs in pool.map(run_batch, batches) for r in rs]
+    wall = time.perf_counter() - t0
+
+    per_sample, stage_times = [], {}
+    for n, (s, out, batch_wall) in enumerate(results):
+        for stage, sec in out.get("timings", {}).items():
+            stage_times.setdefault(stage, []).append(sec)
+        stage_times.setdefault("request", []).append(batch_wall)
+        if n >= len(samples):
+            continue  # quality is scored on the first pass only
+        pred = out.get("answer", "").strip()
+        sim = fuzz.token_set_ratio(s["expected_answer"], pred)
+        rank = first_relevant_rank(s["expected_answer"], out.get("sources", [])[:top_k])
+        per_sample.append({"id": s.get("id"), "question": s["question"], "expected": s["expected_answer"],
+                           "answer": pred, "similarity": sim, "correct": sim >= THRESHOLD, "relevant_rank": rank,
+                           "score": out.get("score"), "direct": bool(out.get("direct"))})
+        if verbose:
+            print(f"Q: {s['question']}\nExpected: {s['expected_answer']}\nPred: {pred}\n"
+                  f"Sim: {sim} -> {'OK' if sim >= THRESHOLD else 'MISS'}  (relevant rank: {rank})\n---")
+
+    n = len(per_sample) or 1
+    metrics = {
+        "accuracy": sum(p["correct"] for p in per_sample) / n,
+        f"recall@{top_k}": sum(p["relevant_rank"] is not None for p in per_sample) / n,
+        "mrr": sum(1.0 / p["relevant_rank"] for p in per_sample if p["relevant_rank"]) / n,
+        "direct_rate": sum(p["direct"] for p in per_sample) / n,
+        "qps": len(results) / wall if wall > 0 else 0.0,
+        "queries": len(results),
+        "wall_seconds": wall,
+        "latency": {stage: percentiles(v) for stage, v in stage_times.items()},
+    }
+    return metrics, per_sample
+
+def flatten(metrics, prefix=""):
+    out = {}
+    for k, v in metrics.items():
+        if isinstance(v, dict):
+            out.update(flatten(v, f"{prefix}{k}."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[f"{prefix}{k}"] = v
+    return out
+
+def compare(current, baseline_path, tolerance):
+    """Print metric deltas against a previous results file; returns the regressed metric names."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        base = flatten(json.load(f)["metrics"])
+    cur = flatten(current)
+    regressions = []
+    print(f"\nComparison with {baseline_path} (tolerance {tolerance:.0%}):")
+    for key in sorted(set(base) & set(cur)):
+        b, c = base[key], cur[key]
+        if key in ("queries", "wall_seconds") or not b:
+            continue
+        change = (c - b) / abs(b)
+        worse = change > tolerance if key.startswith(LOWER_IS_BETTER) else change < -tolerance
+        if worse:
+            regressions.append(key)
+        print(f"  {key:32s} {b:10.3f} -> {c:10.3f} ({change:+.1%}){'  REGRESSION' if worse else ''}")
+    return regressions
 
 if __name__ == "__main__":
-    samples = load_samples()
-    evaluate(samples)
+    parser = argparse.ArgumentParser(description="Evaluate accuracy, retrieval quality and latency of the RAG pipeline")
+    parser.add_argument("--samples", default="tests/sample_tickets.csv")
+    parser.add_argument("--backend", default=os.getenv("RETRIEVER_BACKEND", "local"),
+                        help="local (offline), chroma, pinecone or langchain")
+    parser.add_argument("--reader", default=config.READER, help="extractive, summarize or retrieval")
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=1, help="parallel client threads")
+    parser.add_argument("--batch-size", type=int, default=1, help="queries per answer_batch call")
+    parser.add_argument("--repeat", type=int, default=1, help="passes over the samples (for latency/QPS)")
+    parser.add_argument("--with-cache", action="store_true", help="use the shared pipeline with answer caches")
+    parser.add_argument("--dense-only", action="store_true", help="don't fuse BM25 scores (compare recall@k)")
+    parser.add_argument("--output", help="write JSON results here")
+    parser.add_argument("--compare", help="previous JSON results to diff against")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="relative change counted as a regression")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples)
+    pipeline = make_pipeline(args.backend, args.reader, args.with_cache, hybrid=not args.dense_only)
+    metrics, per_sample = evaluate(samples, pipeline, args.top_k, args.concurrency, args.batch_size,
+                                   args.repeat, verbose=not args.quiet)
+
+    print(f"Accuracy: {metrics['accuracy']:.2%}  recall@{args.top_k}: {metrics[f'recall@{args.top_k}']:.2%}  "
+          f"MRR: {metrics['mrr']:.3f}  direct: {metrics['direct_rate']:.0%}  QPS: {metrics['qps']:.1f} ({metrics['queries']} queries)")
+    for stage, p in metrics["latency"].items():
+        print(f"  {stage:10s} p50 {p['p50_ms']:8.1f} ms  p95 {p['p95_ms']:8.1f} ms  p99 {p['p99_ms']:8.1f} ms")
+
+    results = {
+        "config": {"samples": args.samples, "backend": args.backend, "reader": args.reader, "top_k": args.top_k,
+                   "concurrency": args.concurrency, "batch_size": args.batch_size, "repeat": args.repeat,
+                   "with_cache": args.with_cache, "dense_only": args.dense_only, "pipeline": pipeline.name,
+                   "embed_model": config.EMBED_MODEL,
+                   "qa_model": config.QA_MODEL, "inference_backend": config.INFERENCE_BACKEND,
+                   "python": platform.python_version(), "timestamp": time.time()},
+        "metrics": metrics,
+        "per_sample": per_sample,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        regressions = compare(metrics, args.compare, args.tolerance)
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,47 @@
+# tests/test_batching.py
+"""Request coalescing (rag/batching.py): results go back to their own callers, a bad item fails only its caller."""
+import threading
+import pytest
+from rag.batching import MicroBatcher
+
+def run_concurrently(batcher, items):
+    """Submit every item from its own thread; returns {item: result or exception}."""
+    out, start = {}, threading.Barrier(len(items))
+    def call(item):
+        start.wait()
+        try:
+            out[item] = batcher(item, timeout=5)
+        except Exception as e:
+            out[item] = e
+    threads = [threading.Thread(target=call, args=(i,)) for i in items]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return out
+
+def test_concurrent_items_are_batched_and_answered_in_order():
+    calls = []
+    def double(items):
+        calls.append(list(items))
+        return [i * 2 for i in items]
+    batcher = MicroBatcher(double, "test-double", max_batch_size=8, max_wait_ms=100)
+    assert run_concurrently(batcher, list(range(6))) == {i: i * 2 for i in range(6)}
+    assert max(len(c) for c in calls) > 1  # coalesced
+    assert batcher.map([5, 6]) == [10, 12]
+
+def test_failing_item_only_fails_its_own_caller():
+    calls = []
+    def invert(items):
+        calls.append(list(items))
+        return [1 / i for i in items]  # 0 raises ZeroDivisionError for the whole batch
+    batcher = MicroBatcher(invert, "test-invert", max_batch_size=8, max_wait_ms=100)
+    out = run_concurrently(batcher, [1, 2, 0, 4])
+    assert isinstance(out[0], ZeroDivisionError)
+    assert {k: v for k, v in out.items() if k} == {1: 1.0, 2: 0.5, 4: 0.25}
+    assert [0] in calls  # the retry ran item by item
+
+def test_wrong_result_count_is_an_error():
+    batcher = MicroBatcher(lambda items: [], "test-empty", max_wait_ms=1)
+    with pytest.raises(RuntimeError):
+        batcher("x", timeout=5)
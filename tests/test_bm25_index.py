@@ -0,0 +1,73 @@
+# tests/test_bm25_index.py
+"""BM25 inverted index (rag/bm25_index.py) on a tiny corpus: tokenizer, ranking, save/load, hybrid fusion."""
+import json
+import numpy as np
+import pytest
+from rag.bm25_index import BM25Index, tokenize
+from rag.local_index import LocalIndex
+from rag.retrievers import HybridRetriever, LocalRetriever
+
+CORPUS = [
+    {"id": "orders.txt_chunk_0", "source": "orders.txt", "chunk_index": 0,
+     "text": "Track order ORD-48213 from the orders page."},
+    {"id": "shipping.txt_chunk_0", "source": "shipping.txt", "chunk_index": 0,
+     "text": "We ship worldwide. Shipping shipping shipping takes 5 days."},
+    {"id": "shipping.txt_chunk_1", "source": "shipping.txt", "chunk_index": 1,
+     "text": "Express shipping is available in most countries for an extra fee, delivered the next working day."},
+    {"id": "refunds.txt_chunk_0", "source": "refunds.txt", "chunk_index": 0,
+     "text": "Refunds are paid back to your card within 5 working days."},
+]
+
+def test_tokenize_keeps_codes_and_their_parts():
+    assert tokenize("Order ORD-48213, v2.1!") == ["order", "ord-48213", "ord", "48213", "v2.1", "v2", "1"]
+
+def test_exact_code_ranks_its_chunk_first():
+    index = BM25Index.build(CORPUS)
+    hits = index.search("where is ORD-48213")
+    assert hits[0][0] == 0
+    assert [row for row, _ in index.search("48213")] == [0]  # the part alone matches too
+
+def test_ranking_prefers_term_frequency_and_short_docs():
+    index = BM25Index.build(CORPUS)
+    rows = [row for row, _ in index.search("shipping")]
+    assert rows == [1, 2]
+    scores = [s for _, s in index.search("shipping")]
+    assert scores == sorted(scores, reverse=True)
+
+def test_rare_terms_outweigh_common_ones():
+    index = BM25Index.build(CORPUS)
+    # "working" is in two chunks, "refunds" in one
+    assert index.search("refunds working")[0][0] == 3
+    assert index.scores("refunds")[3] > index.scores("working")[3]
+
+def test_no_shared_terms_no_hits():
+    index = BM25Index.build(CORPUS)
+    assert index.search("warranty") == []
+    assert BM25Index.build([]).search("anything") == []
+
+def test_save_load_round_trip(tmp_path):
+    built = BM25Index.build(CORPUS)
+    built.save(str(tmp_path), "faq")
+    loaded = BM25Index.load(str(tmp_path), "faq")
+    assert isinstance(loaded.postings, np.memmap)
+    assert loaded.fingerprint == built.fingerprint and len(loaded) == len(CORPUS)
+    np.testing.assert_allclose(loaded.scores("5 days shipping"), built.scores("5 days shipping"))
+
+def test_sidecar_stores_no_chunk_text(tmp_path):
+    BM25Index.build(CORPUS).save(str(tmp_path), "faq")
+    sidecar = json.loads((tmp_path / "faq.bm25.json").read_text(encoding="utf-8"))
+    assert sidecar["docs"][0] == {"id": "orders.txt_chunk_0", "source": "orders.txt", "chunk_index": 0}
+    assert "ORD-48213" not in json.dumps(sidecar["docs"])
+
+def test_hybrid_takes_text_of_bm25_only_hits_from_the_dense_index(tmp_path):
+    vectors = np.eye(len(CORPUS), dtype=np.float32)
+    LocalIndex.build(vectors, CORPUS).save(str(tmp_path), "faq")
+    BM25Index.build(CORPUS).save(str(tmp_path), "faq")
+    hybrid = HybridRetriever(LocalRetriever(LocalIndex.load(str(tmp_path), "faq")),
+                             BM25Index.load(str(tmp_path), "faq"), candidates=1)
+    # the query vector points at the refunds chunk; only BM25 finds the order number
+    docs = hybrid.search(vectors[3], top_k=2, text="ORD-48213")
+    by_id = {d["id"]: d for d in docs}
+    assert set(by_id) == {"refunds.txt_chunk_0", "orders.txt_chunk_0"}
+    assert by_id["orders.txt_chunk_0"]["text"] == CORPUS[0]["text"]
+    assert by_id["orders.txt_chunk_0"]["score"] == pytest.approx(0.0)  # orthogonal stored vector
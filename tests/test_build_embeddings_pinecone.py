@@ -0,0 +1,61 @@
+# tests/test_build_embeddings_pinecone.py
+"""Batching and retry behaviour of rag/build_embeddings_pinecone.py against a RecordingIndex (no network)."""
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "rag")))
+
+import numpy as np
+import pytest
+import build_embeddings_pinecone as bep
+from build_embeddings_pinecone import RecordingIndex, build_index, _upsert_with_retry
+
+class FakeEncoder:
+    def __init__(self):
+        self.batches = []
+
+    def encode(self, texts, batch_size=64, convert_to_numpy=True):
+        self.batches.append(len(texts))
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+def make_chunks(n):
+    return [{"id": f"doc_chunk_{i}", "source": "doc.txt", "chunk_index": i, "text": f"chunk {i}"} for i in range(n)]
+
+def test_build_index_batches_encodes_and_upserts():
+    index, encoder = RecordingIndex(), FakeEncoder()
+    stats = build_index(batch_size=10, index=index, encoder=encoder, chunks=make_chunks(95),
+                        encode_batch_size=40, max_workers=3, version_path=None)
+    assert stats["chunks"] == stats["upserted"] == 95
+    assert encoder.batches == [40, 40, 15]
+    # each encode batch is split into upserts of at most batch_size vectors
+    assert sorted(len(u) for u in index.upserts) == [5] + [10] * 9
+    assert set(index.vectors) == {f"doc_chunk_{i}" for i in range(95)}
+    assert index.vectors["doc_chunk_7"]["metadata"] == {"source": "doc.txt", "chunk_index": 7, "id": "doc_chunk_7",
+                                                        "text": "chunk 7"}
+
+def test_build_index_retries_failed_upserts():
+    index = RecordingIndex(fail_first=3)
+    stats = build_index(batch_size=10, index=index, encoder=FakeEncoder(), chunks=make_chunks(30),
+                        max_workers=1, backoff=0, version_path=None)
+    assert stats["upserted"] == 30
+    assert index.calls == len(index.upserts) + 3
+    assert len(index.vectors) == 30
+
+def test_build_index_raises_when_retries_are_exhausted():
+    index = RecordingIndex(fail_first=100)
+    with pytest.raises(ConnectionError):
+        build_index(batch_size=10, index=index, encoder=FakeEncoder(), chunks=make_chunks(10),
+                    max_workers=1, max_retries=2, backoff=0, version_path=None)
+    assert index.calls == 3  # first attempt + 2 retries
+    assert index.upserts == []
+
+def test_upsert_retry_backs_off_exponentially(monkeypatch):
+    delays = []
+    monkeypatch.setattr(bep.time, "sleep", delays.append)
+    monkeypatch.setattr(bep.random, "random", lambda: 0.0)  # no jitter
+    index = RecordingIndex(fail_first=3)
+    assert _upsert_with_retry(index, [{"id": "a", "values": [0.0]}], max_retries=5, backoff=0.5) == 1
+    assert delays == [0.5, 1.0, 2.0]
+    assert list(index.vectors) == ["a"]
+
+def test_build_index_rejects_empty_input():
+    with pytest.raises(ValueError):
+        build_index(index=RecordingIndex(), encoder=FakeEncoder(), chunks=[], version_path=None)
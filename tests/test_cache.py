@@ -0,0 +1,60 @@
+# tests/test_cache.py
+"""Bounded LRU cache (rag/cache.py): recency order, TTL expiry, byte budget, persistence."""
+from rag import cache as cache_mod
+from rag.cache import LRUCache
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def test_evicts_least_recently_used_beyond_max_entries():
+    events = []
+    c = LRUCache(max_entries=2, on_event=events.append)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1  # "b" is now the oldest
+    c.set("c", 3)
+    assert "b" not in c and "a" in c and "c" in c
+    assert c.evictions == 1 and events.count("evict") == 1
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_mod.time, "time", clock)
+    events = []
+    c = LRUCache(ttl=10, on_event=events.append)
+    c.set("q", [0.1, 0.2])
+    clock.now += 9
+    assert c.get("q") == [0.1, 0.2]
+    clock.now += 2  # 11s after it was stored
+    assert "q" not in c
+    assert c.get("q", "gone") == "gone"
+    assert events == ["hit", "expire", "miss"]
+    assert len(c) == 0 and c.nbytes == 0
+
+def test_byte_budget_evicts_oldest_and_skips_oversized_values():
+    c = LRUCache(max_entries=100, max_bytes=300, sizeof=lambda v: 100 if isinstance(v, str) else v)
+    c.set("a", 0)   # 100 (key) + 0
+    c.set("b", 50)  # 150
+    c.set("c", 40)  # 140 -> 390 > 300, "a" goes
+    assert "a" not in c and c.nbytes == 290
+    c.set("d", 500)  # bigger than the whole budget: not cached, nothing else evicted
+    assert "d" not in c and len(c) == 2 and c.nbytes == 290
+    c.set("b", 10)  # replacing a key releases its old size
+    assert c.nbytes == 250
+
+def test_save_and_load_keep_order_and_skip_expired(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_mod.time, "time", clock)
+    path = str(tmp_path / "cache.json")
+    c = LRUCache(ttl=60)
+    c.set("old", 1)
+    clock.now += 50
+    c.set("new", 2)
+    c.save(path)
+    clock.now += 20  # "old" is now 70s old
+    restored = LRUCache(max_entries=1, ttl=60)
+    assert restored.load(path) == 1
+    assert restored.get("new") == 2 and "old" not in restored
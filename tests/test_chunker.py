@@ -0,0 +1,68 @@
+# tests/test_chunker.py
+"""Token-aware chunker and Q/A splitting (rag/data_prep_rag.py), with the regex token counter (no tokenizer download)."""
+import pytest
+from rag import data_prep_rag
+from rag.data_prep_rag import chunk_text_tokens, iter_chunks_from_docs, parse_qa_pairs
+
+def count_words(text):
+    return len(data_prep_rag._WORD_RE.findall(text))
+
+@pytest.fixture(autouse=True)
+def regex_token_counter(monkeypatch):
+    monkeypatch.setattr(data_prep_rag, "get_token_counter", lambda model_name=None: count_words)
+
+PROSE = " ".join(f"Sentence number {i} talks about topic {i}." for i in range(40))  # 7 tokens each
+
+def test_chunks_stay_within_the_token_budget():
+    chunks = list(chunk_text_tokens(PROSE, max_tokens=30, overlap_tokens=0))
+    assert len(chunks) > 1
+    assert all(count_words(c) <= 30 for c in chunks)
+    assert " ".join(chunks) == PROSE  # whole sentences, nothing dropped or duplicated without overlap
+
+def test_chunks_end_on_sentence_boundaries_and_overlap():
+    chunks = list(chunk_text_tokens(PROSE, max_tokens=30, overlap_tokens=8))
+    assert all(c.endswith(".") for c in chunks)
+    for prev, cur in zip(chunks, chunks[1:]):
+        last_sentence = prev[prev.rindex("Sentence"):]
+        assert cur.startswith(last_sentence)  # one 7-token sentence fits the 8-token overlap
+        assert count_words(cur) <= 30
+
+def test_overlong_sentence_is_split_on_words():
+    long_sentence = " ".join(f"w{i}" for i in range(50)) + "."
+    chunks = list(chunk_text_tokens("Intro. " + long_sentence, max_tokens=12, overlap_tokens=0))
+    assert chunks[0] == "Intro."
+    assert all(count_words(c) <= 12 for c in chunks)
+    assert " ".join(chunks[1:]) == long_sentence
+
+def test_paragraph_breaks_are_kept_inside_a_chunk():
+    assert list(chunk_text_tokens("First line.\nSecond line.", max_tokens=50)) == ["First line.\nSecond line."]
+
+FAQ = """Q: How long do refunds take?
+Q: When will I get my money back?
+A: Refunds are paid within 5 working days.
+Q: Do you ship abroad?
+A: Yes, we ship worldwide.
+Delivery takes up to 10 days.
+"""
+
+def test_parse_qa_pairs_groups_paraphrases_and_multiline_answers():
+    pairs = parse_qa_pairs(FAQ)
+    assert pairs == [
+        {"questions": ["How long do refunds take?", "When will I get my money back?"],
+         "answer": "Refunds are paid within 5 working days."},
+        {"questions": ["Do you ship abroad?"], "answer": "Yes, we ship worldwide. Delivery takes up to 10 days."},
+    ]
+    assert parse_qa_pairs("Some prose.\nMore prose.\nAnd more.\nQ: stray\nA: line") == []  # mostly not Q/A
+
+def test_qa_documents_get_one_pair_per_chunk(tmp_path):
+    (tmp_path / "faq.txt").write_text(FAQ, encoding="utf-8")
+    (tmp_path / "policy.txt").write_text(PROSE, encoding="utf-8")
+    chunks = list(iter_chunks_from_docs(str(tmp_path), chunker="tokens", workers=1))
+    faq = [c for c in chunks if c["source"] == "faq.txt"]
+    assert [c["text"] for c in faq] == [
+        "Q: How long do refunds take?\nA: Refunds are paid within 5 working days.",
+        "Q: Do you ship abroad?\nA: Yes, we ship worldwide. Delivery takes up to 10 days.",
+    ]
+    assert [c["id"] for c in faq] == ["faq.txt_chunk_0", "faq.txt_chunk_1"]
+    policy = [c for c in chunks if c["source"] == "policy.txt"]
+    assert len(policy) > 1 and all(count_words(c["text"]) <= data_prep_rag.CHUNK_MAX_TOKENS for c in policy)
@@ -0,0 +1,55 @@
+# tests/test_local_index.py
+"""In-process vector index (rag/local_index.py): save/load round trip, search order, vector_of, float16 blocks."""
+import numpy as np
+import pytest
+from rag import local_index
+from rag.local_index import LocalIndex
+
+META = [{"id": f"doc.txt_chunk_{i}", "source": "doc.txt", "chunk_index": i, "text": f"chunk {i}"} for i in range(4)]
+VECTORS = np.array([[1, 0, 0], [0, 1, 0], [0, 0, 2], [1, 1, 0]], dtype=np.float32)
+
+def test_save_load_round_trip(tmp_path):
+    built = LocalIndex.build(VECTORS, META, model="m")
+    built.save(str(tmp_path), "faq")
+    loaded = LocalIndex.load(str(tmp_path), "faq")
+    assert isinstance(loaded.vectors, np.memmap)
+    assert loaded.metadata == META and loaded.model == "m" and loaded.fingerprint == built.fingerprint
+    np.testing.assert_allclose(loaded.vectors, built.vectors)
+    assert not list(tmp_path.glob("*.tmp*"))
+
+def test_search_returns_rows_by_descending_cosine(tmp_path):
+    LocalIndex.build(VECTORS, META).save(str(tmp_path), "faq")
+    index = LocalIndex.load(str(tmp_path), "faq")
+    hits = index.search([[1, 0.2, 0], [0, 0, 1]], top_k=2)
+    assert [row for row, _ in hits[0]] == [0, 3]
+    assert hits[1][0][0] == 2 and hits[1][0][1] == pytest.approx(1.0)  # rows are normalized on build
+    assert len(index.search([[1, 0, 0]], top_k=10)[0]) == len(META)
+
+def test_vector_of_returns_the_normalized_row():
+    index = LocalIndex.build(VECTORS, META)
+    np.testing.assert_allclose(index.vector_of("doc.txt_chunk_3"), [2 ** -0.5, 2 ** -0.5, 0], rtol=1e-6)
+    assert index.vector_of("missing") is None
+    assert index.row_of("doc.txt_chunk_2") == 2
+
+def test_fingerprint_tracks_content():
+    a = LocalIndex.build(VECTORS, META, model="m").fingerprint
+    assert LocalIndex.build(VECTORS, META, model="other").fingerprint != a
+    changed = [dict(m, text="new") if i == 1 else m for i, m in enumerate(META)]
+    assert LocalIndex.build(VECTORS, changed, model="m").fingerprint != a
+
+def test_float16_index_scores_match_float32_across_blocks(monkeypatch):
+    monkeypatch.setattr(local_index, "SEARCH_BLOCK_ROWS", 3)
+    rng = np.random.default_rng(0)
+    vecs = rng.normal(size=(10, 8)).astype(np.float32)
+    meta = [{"id": str(i)} for i in range(10)]
+    q = rng.normal(size=(2, 8))
+    np.testing.assert_allclose(LocalIndex.build(vecs, meta, dtype="float16").scores(q),
+                               LocalIndex.build(vecs, meta).scores(q), atol=2e-3)
+
+def test_load_missing_index_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        LocalIndex.load(str(tmp_path), "faq")
+
+def test_mismatched_lengths_are_rejected():
+    with pytest.raises(ValueError):
+        LocalIndex(VECTORS, META[:2])
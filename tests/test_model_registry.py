@@ -0,0 +1,40 @@
+# tests/test_model_registry.py
+"""Process-wide registry (rag/model_registry.py): one load per key, optional loaders that may return None."""
+import pytest
+from rag import model_registry
+from rag.model_registry import get_or_load, get_or_load_optional
+from rag.cache import LRUCache
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    model_registry.clear()
+    yield
+    model_registry.clear()
+
+def test_get_or_load_loads_once():
+    calls = []
+    for _ in range(3):
+        obj = get_or_load("test:obj", lambda: calls.append(1) or object())
+    assert len(calls) == 1 and get_or_load("test:obj", object) is obj
+
+def test_optional_keeps_empty_falsy_objects():
+    cache = LRUCache(max_entries=4)
+    assert len(cache) == 0 and not cache
+    assert get_or_load_optional("test:cache", lambda: cache) is cache
+
+def test_optional_caches_none():
+    calls = []
+    for _ in range(3):
+        assert get_or_load_optional("test:none", lambda: calls.append(1)) is None
+    assert len(calls) == 1
+
+def test_get_versioned_reloads_and_drops_old_versions():
+    loads = []
+    def loader(tag):
+        return lambda: loads.append(tag) or {"tag": tag}
+    v1 = model_registry.get_versioned("idx", "v1", loader("v1"))
+    assert model_registry.get_versioned("idx", "v1", loader("again")) is v1
+    v2 = model_registry.get_versioned("idx", "v2", loader("v2"))
+    assert v2["tag"] == "v2" and loads == ["v1", "v2"]
+    assert not model_registry.is_loaded("idx@v1") and model_registry.is_loaded("idx@v2")
+    assert model_registry.get_versioned("idx", "v3", lambda: None) is None
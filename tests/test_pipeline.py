@@ -0,0 +1,71 @@
+# tests/test_pipeline.py
+"""The shared RAGPipeline from get_pipeline() over a tiny local index (hashing embedder, retrieval-only reader)."""
+from rag import config
+from rag.pipeline import get_pipeline, index_version_path, RAGPipeline, RetrievalOnlyReader, PER_REQUEST_FIELDS
+
+def test_get_pipeline_has_a_working_semantic_cache(local_index_dir, monkeypatch):
+    monkeypatch.setenv("ANSWER_CACHE_ENABLED", "true")
+    monkeypatch.setenv("SEMANTIC_CACHE_ENABLED", "true")
+    monkeypatch.setenv("SEMANTIC_CACHE_THRESHOLD", "0.9")
+    pipe = get_pipeline("local", "retrieval")
+    assert pipe.answer_cache is not None
+    assert pipe.semantic_cache is not None  # an empty cache must not be mistaken for "disabled"
+
+    first = pipe.answer("How long do refunds take", top_k=1)
+    assert not first.get("cached")
+    assert first["sources"][0]["id"] == "refunds.txt_chunk_0"
+    # different wording (exact cache miss), same meaning for the embedder
+    again = pipe.answer("How long do refunds usually take", top_k=1)
+    assert again.get("cached") and again["similarity"] >= 0.9
+    assert again["answer"] == first["answer"]
+    assert pipe.semantic_cache.stats()["hits"] == 1
+
+def test_semantic_cache_can_be_disabled(local_index_dir, monkeypatch):
+    monkeypatch.setenv("SEMANTIC_CACHE_ENABLED", "false")
+    assert get_pipeline("local", "retrieval").semantic_cache is None
+
+def test_rebuilt_local_index_is_picked_up(local_index_dir, embedder):
+    from rag import model_registry
+    from rag.local_index import LocalIndex
+    pipe = get_pipeline("local", "retrieval")
+    old_version = pipe.retriever.index.fingerprint
+    assert pipe.answer("warranty period", top_k=1)["sources"][0]["id"] != "warranty.txt_chunk_0"
+
+    # what build_embeddings.py does: write new files and os.replace() them over the old ones
+    chunk = {"id": "warranty.txt_chunk_0", "source": "warranty.txt", "chunk_index": 0, "hash": "w",
+             "text": "The warranty period is two years."}
+    LocalIndex.build(embedder.encode([chunk["text"]]), [chunk], model=config.EMBED_MODEL).save(
+        local_index_dir, config.COLLECTION_NAME)
+    model_registry._entries[f"index_version:{index_version_path('local')}"]._checked_at = 0.0  # skip the 1s recheck
+
+    rebuilt = get_pipeline("local", "retrieval")
+    assert rebuilt is not pipe
+    assert rebuilt.answer("warranty period", top_k=1)["sources"][0]["id"] == "warranty.txt_chunk_0"
+    assert rebuilt.answer_cache is pipe.answer_cache  # caches are shared and invalidate by version
+    assert not model_registry.is_loaded(f"retriever:local@{old_version}")  # the old mapping is released
+
+class CountingStreamReader(RetrievalOnlyReader):
+    """Streams the retrieval-only answer word by word and reports a token count, like SummarizerReader."""
+    name = "counting"
+
+    def stream(self, query, docs, result):
+        result.update(self.read(query, docs))
+        words = result["answer"].split()
+        for w in words:
+            yield w + " "
+        result["tokens"] = len(words)
+
+def test_streamed_answers_are_cached_without_per_request_fields(local_index_dir, monkeypatch):
+    monkeypatch.setenv("ANSWER_CACHE_ENABLED", "true")
+    monkeypatch.setenv("SEMANTIC_CACHE_ENABLED", "true")
+    base = get_pipeline("local", "retrieval")
+    pipe = RAGPipeline(base.retriever, CountingStreamReader(), base.embedder, base.answer_cache, base.semantic_cache)
+
+    done = list(pipe.answer_stream("How long do refunds take", top_k=1))[-1]
+    assert done["tokens"] > 0 and "ttft" in done["timings"]
+    cached = pipe.answer_cache.get("How long do refunds take", **pipe._cache_args(1))
+    assert cached["answer"] == done["answer"]
+    assert not set(PER_REQUEST_FIELDS) & set(cached)
+
+    again = list(pipe.answer_stream("How long do refunds take", top_k=1))[-1]
+    assert again["cached"] and "tokens" not in again and "tokens_per_second" not in again
@@ -0,0 +1,42 @@
+# tests/test_semantic_cache.py
+"""Near-duplicate answer cache (rag/semantic_cache.py): threshold, params scoping, version invalidation, LRU slots."""
+import numpy as np
+from rag.semantic_cache import SemanticCache
+
+def unit(*xs):
+    return np.array(xs, dtype=np.float32)
+
+def test_hit_above_threshold_and_miss_below():
+    c = SemanticCache(dim=2, threshold=0.9)
+    c.add(unit(1, 0), "k=4", {"answer": "refunds"})
+    value, sim = c.lookup(unit(1, 0.1), "k=4")  # cos ~0.995, not normalized on input
+    assert value == {"answer": "refunds"} and sim > 0.99
+    assert c.lookup(unit(1, 1), "k=4") is None  # cos ~0.707
+    assert c.stats()["hits"] == 1 and c.stats()["misses"] == 1
+
+def test_entries_are_scoped_by_params():
+    c = SemanticCache(dim=2, threshold=0.9)
+    c.add(unit(1, 0), "k=4", {"answer": "a"})
+    assert c.lookup(unit(1, 0), "k=2") is None
+    c.add(unit(1, 0), "k=2", {"answer": "b"})
+    assert c.lookup(unit(1, 0), "k=2")[0] == {"answer": "b"}
+    assert c.lookup(unit(1, 0), "k=4")[0] == {"answer": "a"}
+
+def test_index_version_change_drops_everything():
+    version = ["v1"]
+    c = SemanticCache(dim=2, threshold=0.9, version_fn=lambda: version[0])
+    c.add(unit(1, 0), "", {"answer": "old"})
+    assert c.lookup(unit(1, 0))[0] == {"answer": "old"}
+    version[0] = "v2"
+    assert c.lookup(unit(1, 0)) is None
+    assert len(c) == 0
+
+def test_full_cache_evicts_least_recently_used():
+    c = SemanticCache(dim=3, threshold=0.9, max_entries=2)
+    c.add(unit(1, 0, 0), "", {"answer": "x"})
+    c.add(unit(0, 1, 0), "", {"answer": "y"})
+    c.lookup(unit(1, 0, 0))  # x used more recently than y
+    c.add(unit(0, 0, 1), "", {"answer": "z"})
+    assert c.lookup(unit(0, 1, 0)) is None
+    assert c.lookup(unit(1, 0, 0))[0] == {"answer": "x"}
+    assert c.evictions == 1 and len(c) == 2
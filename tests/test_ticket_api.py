@@ -0,0 +1,62 @@
+# tests/test_ticket_api.py
+"""Ticket API (api/ticket_api.py) through the Flask test client, on a fresh sqlite file per test."""
+import importlib
+import pytest
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv("TICKET_DB", str(tmp_path / "tickets.db"))
+    monkeypatch.setenv("ENABLE_METRICS", "false")
+    import api.ticket_api as ticket_api
+    ticket_api = importlib.reload(ticket_api)  # DB path and pool are read at import
+    yield ticket_api.app.test_client()
+    ticket_api.pool.close()
+
+def create(client, n, **fields):
+    resp = client.post("/tickets/batch", json=[dict(fields, question=f"q{i}") for i in range(n)])
+    assert resp.status_code == 201
+    return resp.get_json()["ticket_ids"]
+
+def test_keyset_pages_follow_the_next_cursor(client):
+    ids = create(client, 7)
+    seen, cursor = [], None
+    while True:
+        url = "/tickets?limit=3" + (f"&before_id={cursor}" if cursor else "")
+        resp = client.get(url)
+        assert resp.status_code == 200
+        seen.append([t["id"] for t in resp.get_json()])
+        cursor = resp.headers.get("X-Next-Before-Id")
+        if cursor is None:
+            break
+    assert seen == [sorted(ids, reverse=True)[i:i + 3] for i in (0, 3, 6)]
+
+def test_filters_apply_within_pages(client):
+    create(client, 3, channel="web")
+    whatsapp = create(client, 2, channel="whatsapp")
+    resp = client.get("/tickets?channel=whatsapp")
+    assert [t["id"] for t in resp.get_json()] == sorted(whatsapp, reverse=True)
+    assert "X-Next-Before-Id" not in resp.headers
+
+@pytest.mark.parametrize("query", ["limit=abc", "before_id=abc", "before_id=", "limit=1.5"])
+def test_bad_limit_or_cursor_is_rejected(client, query):
+    create(client, 2)
+    assert client.get(f"/tickets?{query}").status_code == 400
+
+def test_limit_is_clamped(client):
+    create(client, 3)
+    assert len(client.get("/tickets?limit=0").get_json()) == 1
+
+@pytest.mark.parametrize("item", ["text", 3, [1, 2], None])
+def test_batch_rejects_non_object_items_without_inserting(client, item):
+    resp = client.post("/tickets/batch", json=[{"question": "ok"}, item])
+    assert resp.status_code == 400
+    assert client.get("/tickets").get_json() == []
+
+def test_batch_rejects_empty_and_wrong_shapes(client):
+    assert client.post("/tickets/batch", json=[]).status_code == 400
+    assert client.post("/tickets/batch", json={"tickets": "nope"}).status_code == 400
+
+def test_batch_accepts_wrapped_list(client):
+    resp = client.post("/tickets/batch", json={"tickets": [{"question": "a", "user": "u1"}]})
+    assert resp.status_code == 201
+    assert client.get("/tickets?user=u1").get_json()[0]["question"] == "a"
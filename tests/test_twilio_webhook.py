@@ -0,0 +1,22 @@
+# tests/test_twilio_webhook.py
+"""WhatsApp webhook (api/twilio_webhook.py): warm-up is deferred from import to the first request."""
+import importlib
+import pytest
+
+pytest.importorskip("twilio")
+
+def test_warmup_starts_on_first_request_not_at_import(monkeypatch, tmp_path):
+    from rag import config, pipeline
+    monkeypatch.setattr(config, "WARMUP", True)
+    monkeypatch.setattr(config, "ENABLE_METRICS", False)
+    monkeypatch.setenv("TICKET_DB", str(tmp_path / "tickets.db"))
+    started = []
+    monkeypatch.setattr(pipeline, "start_warmup", lambda *a, **kw: started.append(1) or object())
+    import api.twilio_webhook as webhook
+    webhook = importlib.reload(webhook)
+    assert started == []
+
+    client = webhook.app.test_client()
+    client.get("/queue")
+    client.get("/queue")
+    assert started == [1]